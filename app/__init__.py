@@ -1,11 +1,86 @@
 # ticketing/app/__init__.py
 
+import os
+
 from flask import Flask
 from flask_login import LoginManager
 
 # ۱. نمونه اپلیکیشن همینجا یک بار برای همیشه ساخته می‌شود
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'a-very-secret-key-that-you-should-change'
+app.config['SECRET_KEY'] = os.environ.get('TICKETING_SECRET_KEY', 'a-very-secret-key-that-you-should-change')
+# تعداد پاسخ‌ها و رویدادهایی که در هر صفحه از رشته تیکت بارگذاری می‌شوند
+app.config['THREAD_PAGE_SIZE'] = 50
+# تعداد تیکت‌های هر صفحه در فهرست تیکت‌ها
+app.config['TICKETS_PAGE_SIZE'] = 25
+# حداکثر تعداد تیکت‌های یک عملیات دسته‌ای (/tickets/bulk)؛ همه با یک بار گرفتن قفل نوشتن یا در یک تراکنش اعمال می‌شوند
+app.config['BULK_MAX_TICKETS'] = int(os.environ.get('TICKETING_BULK_MAX_TICKETS', 5000))
+# حداکثر تعداد نتایج جستجوی متن کامل
+app.config['SEARCH_RESULTS'] = 50
+# حداکثر تعداد قطعه‌های رندرشده (ردیف تیکت، رشته پاسخ‌ها، کارت‌های داشبورد) در کش LRU هر کارگر (0 یعنی غیرفعال)؛
+# ETag و پاسخ 304 صفحات تیکت، فهرست و داشبورد مستقل از این مقدار همیشه فعال است
+app.config['RENDER_CACHE_SIZE'] = int(os.environ.get('TICKETING_RENDER_CACHE_SIZE', 4096))
+# ورود دسته‌ای: تعداد ردیف‌هایی که با یک بار گرفتن قفل نوشتن ثبت می‌شوند؛ خروجی: تعداد تیکت‌های هر تکه
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('TICKETING_IMPORT_BATCH_SIZE', 500))
+app.config['EXPORT_CHUNK_SIZE'] = int(os.environ.get('TICKETING_EXPORT_CHUNK_SIZE', 200))
+# تاریخچه رویدادها (audit) در بخش‌های زمانی به طول AUDIT_SEGMENT_HOURS نگه داشته می‌شود؛ بخش‌های قدیمی‌تر از
+# AUDIT_RETENTION_DAYS (0 یعنی نگهداری همیشگی) در AUDIT_ARCHIVE_DIR بایگانی (در صورت تعیین) و حذف می‌شوند
+app.config['AUDIT_SEGMENT_HOURS'] = float(os.environ.get('TICKETING_AUDIT_SEGMENT_HOURS', 24))
+app.config['AUDIT_RETENTION_DAYS'] = float(os.environ.get('TICKETING_AUDIT_RETENTION_DAYS', 365))
+app.config['AUDIT_ARCHIVE_DIR'] = os.environ.get('TICKETING_AUDIT_ARCHIVE_DIR', os.path.join(app.instance_path, 'audit'))
+app.config['AUDIT_PAGE_SIZE'] = 100
+# لایه سرد (فقط backend حافظه): تیکت‌های با وضعیت ARCHIVE_STATUSES که ARCHIVE_AFTER_DAYS روز تغییر نکرده‌اند
+# هر ARCHIVE_INTERVAL_MINUTES دقیقه به ARCHIVE_DIR منتقل می‌شوند (0 روز یا مسیر خالی یعنی غیرفعال)
+app.config['ARCHIVE_AFTER_DAYS'] = float(os.environ.get('TICKETING_ARCHIVE_AFTER_DAYS', 30))
+app.config['ARCHIVE_STATUSES'] = os.environ.get('TICKETING_ARCHIVE_STATUSES', 'CLOSED,DELETED').split(',')
+app.config['ARCHIVE_INTERVAL_MINUTES'] = float(os.environ.get('TICKETING_ARCHIVE_INTERVAL_MINUTES', 60))
+# تخصیص خودکار تیکت‌های جدید به کم‌بارترین کارشناس (پیش‌فرض 0 یعنی فقط تخصیص دستی و دسته‌ای از داشبورد)؛
+# تخصیص خودکار در تاریخچه به نام «سیستم» ثبت می‌شود. ROUTING_SKILLS به صورت JSON:
+# {"نام دسته‌بندی": ["نام کاربری کارشناس", ...]} برای محدود کردن هر دسته به کارشناسان آن
+app.config['ROUTING_AUTO_ASSIGN'] = os.environ.get('TICKETING_ROUTING_AUTO_ASSIGN', '0') == '1'
+app.config['ROUTING_SKILLS'] = os.environ.get('TICKETING_ROUTING_SKILLS', '{}')
+# به‌روزرسانی زنده (/events): هر اتصال باز یک نخ gunicorn را نگه می‌دارد، پس سقف اتصال‌های هم‌زمان هر کارگر
+# (کل و برای هر کاربر) محدود است و پیش‌فرض تعداد نخ‌ها در gunicorn.conf.py به اندازه آن بیشتر می‌شود.
+# EVENT_BACKLOG تعداد رویدادهای اخیری است که برای اتصال‌های کند یا دوباره وصل‌شده نگه داشته می‌شود
+app.config['EVENT_STREAMS_MAX'] = int(os.environ.get('TICKETING_EVENT_STREAMS_MAX', 32))
+app.config['EVENT_STREAMS_PER_USER'] = int(os.environ.get('TICKETING_EVENT_STREAMS_PER_USER', 4))
+app.config['EVENT_BACKLOG'] = int(os.environ.get('TICKETING_EVENT_BACKLOG', 1000))
+app.config['EVENT_HEARTBEAT_SECONDS'] = float(os.environ.get('TICKETING_EVENT_HEARTBEAT_SECONDS', 15))
+# API نسخه‌دار JSON (/api/v1): مدت اعتبار توکن‌ها و اندازه پیش‌فرض و حداکثر هر صفحه (و تعداد شناسه‌های ?ids=)
+app.config['API_TOKEN_MAX_AGE_DAYS'] = float(os.environ.get('TICKETING_API_TOKEN_MAX_AGE_DAYS', 30))
+app.config['API_PAGE_SIZE'] = int(os.environ.get('TICKETING_API_PAGE_SIZE', 100))
+app.config['API_MAX_PAGE_SIZE'] = int(os.environ.get('TICKETING_API_MAX_PAGE_SIZE', 500))
+# آمار تحلیلی (/analytics): روز شروع هفته در گزارش هفتگی (۰ دوشنبه ... ۵ شنبه، ۶ یکشنبه) و بازه پیش‌فرض به روز
+app.config['ANALYTICS_WEEK_START'] = int(os.environ.get('TICKETING_ANALYTICS_WEEK_START', 5))
+app.config['ANALYTICS_DEFAULT_DAYS'] = int(os.environ.get('TICKETING_ANALYTICS_DEFAULT_DAYS', 30))
+# نوع ذخیره‌سازی: 'memory' (پیش‌فرض، با ژورنال روی دیسک) یا 'sqlite'
+app.config['STORAGE_BACKEND'] = os.environ.get('TICKETING_STORAGE_BACKEND', 'memory')
+app.config['SQLITE_PATH'] = os.environ.get('TICKETING_SQLITE_PATH', os.path.join(app.instance_path, 'ticketing.db'))
+# محل ژورنال و اسنپ‌شات‌های DB؛ مقدار خالی یعنی داده‌ها فقط در حافظه بمانند
+app.config['DATA_DIR'] = os.environ.get('TICKETING_DATA_DIR', os.path.join(app.instance_path, 'data'))
+# فاصله fsync گروهی ژورنال به ثانیه (0 یعنی fsync پس از هر تغییر)
+app.config['JOURNAL_FSYNC_INTERVAL'] = float(os.environ.get('TICKETING_JOURNAL_FSYNC_INTERVAL', 0.05))
+# پس از این تعداد رکورد ژورنال، اسنپ‌شات جدید گرفته می‌شود تا بازپخش هنگام راه‌اندازی محدود بماند
+app.config['SNAPSHOT_EVERY'] = int(os.environ.get('TICKETING_SNAPSHOT_EVERY', 100000))
+# محل فایل‌های لایه سرد؛ بدون DATA_DIR بایگانی غیرفعال است
+app.config['ARCHIVE_DIR'] = os.environ.get('TICKETING_ARCHIVE_DIR', os.path.join(app.config['DATA_DIR'], 'cold')
+                                           if app.config['DATA_DIR'] else '')
+
+# پارامترهای هش رمز عبور؛ با تغییر آن‌ها هش هر کاربر در ورود بعدی به‌روز می‌شود
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('TICKETING_PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+app.config['PASSWORD_SALT_LENGTH'] = int(os.environ.get('TICKETING_PASSWORD_SALT_LENGTH', 16))
+# تعداد پروسه‌های بررسی رمز در هر کارگر (0 یعنی بررسی در همان نخ درخواست)
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('TICKETING_PASSWORD_HASH_WORKERS', 2))
+
+# زمان‌سنجی درخواست‌ها همیشه فعال است؛ نمونه‌برداری از پشته درخواست‌های کندتر از این آستانه (میلی‌ثانیه)
+# اختیاری است (0 یعنی غیرفعال) و خلاصه آن در لاگ و در صورت تعیین PROFILE_DIR به قالب folded ذخیره می‌شود
+app.config['PROFILE_SLOW_MS'] = float(os.environ.get('TICKETING_PROFILE_SLOW_MS', 0))
+app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('TICKETING_PROFILE_INTERVAL_MS', 5))
+app.config['PROFILE_DIR'] = os.environ.get('TICKETING_PROFILE_DIR', '')
+# دسترسی به /metrics بدون ورود: با توکن (Authorization: Bearer <METRICS_TOKEN>، مثل bearer_token در Prometheus)
+# یا از نشانی‌های METRICS_ALLOW؛ مدیران وارد شده همیشه دسترسی دارند. پیش‌فرض هر دو خالی است چون پشت
+# reverse proxy همه درخواست‌ها از 127.0.0.1 می‌رسند و فهرست نشانی فقط برای اجرای بدون proxy معنا دارد
+app.config['METRICS_TOKEN'] = os.environ.get('TICKETING_METRICS_TOKEN', '')
+app.config['METRICS_ALLOW'] = [addr for addr in os.environ.get('TICKETING_METRICS_ALLOW', '').split(',') if addr]
 
 # ۲. لاگین منیجر روی همین نمونه app تنظیم می‌شود
 login_manager = LoginManager()
@@ -19,6 +94,35 @@ def load_user(user_id):
     from .services import get_user_by_id
     return get_user_by_id(int(user_id))
 
-# ۳. در انتها، فایل routes را وارد می‌کنیم تا مسیرها روی همین نمونه app ثبت شوند
+# ۳. بارگذاری داده‌های ذخیره‌شده از دیسک و ساخت داده‌های اولیه در صورت خالی بودن
+from . import analytics, audit, cache, coldstore, events, metrics, passwords, persistence, routing, services, transfer
+passwords.init_app(app)
+audit.init_app(app)
+analytics.init_app(app)
+cache.init_app(app)
+events.init_app(app)
+routing.init_app(app)
+transfer.init_app(app)
+metrics.init_app(app)
+backends = []
+if app.config['STORAGE_BACKEND'] == 'sqlite':
+    from . import sqlite_store
+    sqlite_store.init_app(app)
+    services.use_storage_backend(sqlite_store)
+    backends.append(sqlite_store)
+else:
+    # لایه سرد پیش از بارگذاری ژورنال، چون بازپخش ممکن است تیکتی را از آن برگرداند
+    coldstore.init_app(app)
+    persistence.init_app(app, services.DB)
+
+    @app.before_request
+    def start_archiver():
+        coldstore.ensure_archiver(services.archive_tickets)
+    services.rebuild_derived_state()
+services.create_initial_data()
+# زمان‌سنجی توابع services باید پیش از import شدن routes انجام شود
+metrics.instrument(services, backends)
+
+# ۴. در انتها، فایل routes را وارد می‌کنیم تا مسیرها روی همین نمونه app ثبت شوند
 # این خط باید بعد از ساختن app باشد
-from . import routes
\ No newline at end of file
+from . import routes, api, commands
\ No newline at end of file
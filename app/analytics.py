@@ -0,0 +1,261 @@
+# ticketing/app/analytics.py
+
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+
+from .models import TicketStatus
+
+# آمار تحلیلی (SLA و روند زمانی) به صورت خلاصه‌های روزانه که همراه با هر رویداد به‌روز می‌شوند.
+# هر خلاصه یک سطر (روز، معیار، کلید) -> (تعداد، مجموع ثانیه‌ها) است:
+#   created / closed: کلید شناسه دسته‌بندی؛ closed_by: شناسه کارشناس تیکت هنگام بستن؛
+#   replies_by: شناسه کاربر غیرمشتری که پاسخ داده؛
+#   first_response / close_time: کلید شماره خانه نمودار توزیع (BOUNDS) و مجموع زمان‌ها به ثانیه.
+# زمان اولین پاسخ از ایجاد تیکت تا اولین پاسخ کاربر غیرمشتری و زمان بستن از ایجاد تا هر بار بسته شدن است.
+# گزارش هر بازه از جمع سطرهای روزهای آن ساخته می‌شود و هفته‌ها از روزها؛ هزینه آن به تعداد روزهاست نه تیکت‌ها.
+# backend حافظه سطرها را در ROLLUPS نگه می‌دارد؛ افزایش‌های هر رویداد در ژورنال و کل ROLLUPS در اسنپ‌شات
+# ذخیره می‌شود (ر.ک. persistence) تا راه‌اندازی همان اعداد را بدون پیمایش تاریخچه برگرداند.
+# sqlite آن‌ها را در جدول rollups و در همان تراکنش تغییر می‌نویسد. replay برای هر دو از روی لاگ‌ها بازسازی می‌کند
+# (فرمان analytics-backfill و یک بار برای داده‌های نسخه‌های پیشین که خلاصه‌ها را ندارند).
+SETTINGS = {"week_start": 5}    # شنبه (date.weekday)
+
+# مرز خانه‌های نمودار توزیع زمان‌ها به ساعت؛ خانه آخر بیشتر از آخرین مرز است
+BOUNDS = (0.25, 0.5, 1, 2, 4, 8, 24, 48, 72, 168, 336, 720)
+NO_KEY = 0      # تیکت بدون دسته‌بندی یا بدون کارشناس
+
+ROLLUPS = {}    # روز ('YYYY-MM-DD') -> {(معیار، کلید): [تعداد، مجموع]}
+# شناسه تیکت‌هایی که پاسخ غیرمشتری دارند تا اولین پاسخ بدون پیمایش رشته پاسخ‌ها تشخیص داده شود (backend حافظه)؛
+# از پاسخ‌های DB ساخته می‌شود و تیکت برگشته از لایه سرد با track_responses اضافه می‌شود
+RESPONDED = set()
+
+
+def init_app(app):
+    SETTINGS["week_start"] = app.config["ANALYTICS_WEEK_START"]
+
+def _day(ts):
+    return datetime.fromtimestamp(ts).date().isoformat()
+
+def _bucket(seconds):
+    return bisect_left(BOUNDS, seconds / 3600)
+
+
+# --- سطرهای هر رویداد (مشترک بین backendها و بازسازی) ---
+def created_rows(ticket):
+    return [(_day(ticket.created_ts), "created", ticket.category.id if ticket.category else NO_KEY, 1, 0.0)]
+
+def closed_rows(ticket, ts):
+    day, elapsed = _day(ts), max(0.0, ts - ticket.created_ts)
+    return [
+        (day, "closed", ticket.category.id if ticket.category else NO_KEY, 1, 0.0),
+        (day, "closed_by", ticket.assigned_to.id if ticket.assigned_to else NO_KEY, 1, 0.0),
+        (day, "close_time", _bucket(elapsed), 1, elapsed),
+    ]
+
+def reply_rows(ticket, reply, first):
+    # فقط پاسخ‌های کاربران غیرمشتری؛ first یعنی اولین پاسخ غیرمشتری این تیکت است
+    day = _day(reply.created_ts)
+    rows = [(day, "replies_by", reply.user.id, 1, 0.0)]
+    if first:
+        elapsed = max(0.0, reply.created_ts - ticket.created_ts)
+        rows.append((day, "first_response", _bucket(elapsed), 1, elapsed))
+    return rows
+
+def closed(old_status, new_status):
+    return new_status == TicketStatus.CLOSED and old_status != TicketStatus.CLOSED
+
+
+# --- backend حافظه ---
+# توابع رویدادها سطرهای اعمال‌شده را برمی‌گردانند تا services آن‌ها را در ژورنال ثبت کند
+def apply(rows, rollups=None):
+    rollups = ROLLUPS if rollups is None else rollups
+    for day, metric, key, count, total in rows:
+        cell = rollups.setdefault(day, {}).setdefault((metric, key), [0, 0.0])
+        cell[0] += count
+        cell[1] += total
+    return rows
+
+def ticket_created(ticket):
+    return apply(created_rows(ticket))
+
+def ticket_changed(ticket, old_keys):
+    # old_keys همان خروجی repository.reindex_ticket است
+    if closed(old_keys[2], ticket.status):
+        return apply(closed_rows(ticket, datetime.now().timestamp()))
+    return []
+
+def is_first_response(ticket, user):
+    return user.role != 'customer' and ticket.id not in RESPONDED
+
+def reply_added(ticket, reply, first):
+    if reply.user.role != 'customer':
+        RESPONDED.add(ticket.id)
+        return apply(reply_rows(ticket, reply, first))
+    return []
+
+def track_responses(tickets):
+    for ticket in tickets:
+        if any(reply.user.role != 'customer' for reply in ticket.replies):
+            RESPONDED.add(ticket.id)
+
+def rebuild_responses(tickets):
+    RESPONDED.clear()
+    track_responses(tickets)
+
+def rows_between(start, end):
+    # start و end از نوع date (هر دو شامل)
+    day = start
+    while day <= end:
+        for (metric, key), (count, total) in ROLLUPS.get(day.isoformat(), {}).items():
+            yield day.isoformat(), metric, key, count, total
+        day += timedelta(days=1)
+
+def all_rows():
+    # همه سطرهای ROLLUPS به همان شکل ورودی apply (برای ثبت خلاصه‌های بازسازی‌شده در ژورنال)
+    for day, cells in ROLLUPS.items():
+        for (metric, key), (count, total) in cells.items():
+            yield day, metric, key, count, total
+
+def rebuild(rows, roles, ticket_info):
+    ROLLUPS.clear()
+    return replay(rows, roles, ticket_info, ROLLUPS)
+
+def state():
+    return ROLLUPS
+
+def restore(saved):
+    ROLLUPS.clear()
+    ROLLUPS.update(saved)
+
+
+# --- بازسازی از لاگ‌ها در یک پیمایش ---
+CREATE_ACTION, REPLY_ACTION, CLOSE_ACTION, STATUS_ACTION = "ایجاد تیکت", "ثبت پاسخ", "بستن تیکت", "تغییر وضعیت تیکت"
+# عملیات‌هایی که تیکت بسته را دوباره باز می‌کنند (تخصیص وضعیت را «در حال انجام» می‌کند)
+REOPEN_ACTIONS = {"حذف تیکت", "تخصیص کارشناس", "تخصیص خودکار", "توزیع مجدد"}
+
+# اشیای حداقلی برای توابع *_rows
+class _Ref:
+    __slots__ = ("id",)
+
+    def __init__(self, item_id):
+        self.id = item_id
+
+class _Replayed:
+    __slots__ = ("id", "created_ts", "category", "assigned_to")
+
+class _Reply:
+    __slots__ = ("user", "created_ts")
+
+    def __init__(self, user_id, ts):
+        self.user, self.created_ts = _Ref(user_id), ts
+
+def replay(rows, roles, ticket_info, rollups):
+    # rows: (شناسه، زمان، شناسه تیکت، شناسه کاربر، عملیات، توضیحات) به ترتیب ثبت؛ roles: شناسه کاربر -> نقش؛
+    # ticket_info(شناسه تیکت) -> (زمان ایجاد، شناسه دسته‌بندی، شناسه کارشناس فعلی) یا None.
+    # دسته‌بندی و کارشناس فعلی تیکت برای همه رویدادهای گذشته آن به کار می‌رود. خروجی: تعداد لاگ‌های پیمایش‌شده
+    tickets = {}    # شناسه تیکت -> [تیکت، پاسخ داده شده، بسته]
+    closed_value = f"'{TicketStatus.CLOSED.value}'"
+    processed = 0
+    for _, ts, ticket_id, user_id, action, details in rows:
+        processed += 1
+        state = tickets.get(ticket_id)
+        if state is None:
+            info = ticket_info(ticket_id)
+            if info is None:
+                tickets[ticket_id] = state = [None, True, True]
+            else:
+                ticket = _Replayed()
+                ticket.id, (ticket.created_ts, category_id, assignee_id) = ticket_id, info
+                ticket.category = _Ref(category_id) if category_id else None
+                ticket.assigned_to = _Ref(assignee_id) if assignee_id else None
+                # اگر لاگ ایجاد تیکت (به خاطر نگهداری محدود تاریخچه) نباشد، اولین پاسخ آن معلوم نیست
+                tickets[ticket_id] = state = [ticket, action != CREATE_ACTION, False]
+        ticket = state[0]
+        if ticket is None:
+            continue
+        if action == CREATE_ACTION:
+            apply(created_rows(ticket), rollups)
+        elif action == REPLY_ACTION:
+            role = roles.get(user_id)
+            if role is not None and role != 'customer':
+                apply(reply_rows(ticket, _Reply(user_id, ts), not state[1]), rollups)
+                state[1] = True
+        elif action == CLOSE_ACTION or (action == STATUS_ACTION and details.rstrip().endswith(f"{closed_value} تغییر یافت.")):
+            if not state[2]:
+                apply(closed_rows(ticket, ts), rollups)
+                state[2] = True
+        elif action == STATUS_ACTION or action in REOPEN_ACTIONS:
+            state[2] = False
+    return processed
+
+
+# --- گزارش ---
+def _distribution(cells):
+    # cells: خانه نمودار -> [تعداد، مجموع ثانیه‌ها]
+    count = sum(c for c, _ in cells.values())
+    total = sum(t for _, t in cells.values())
+    histogram = [cells.get(i, [0, 0.0])[0] for i in range(len(BOUNDS) + 1)]
+
+    def percentile(share):
+        if not count:
+            return None
+        seen = 0
+        for i, bucket_count in enumerate(histogram):
+            seen += bucket_count
+            if seen >= share * count:
+                return BOUNDS[i] if i < len(BOUNDS) else None
+        return None
+
+    within, seen = [], 0
+    for bound, bucket_count in zip(BOUNDS, histogram):
+        seen += bucket_count
+        within.append((bound, round(seen / count, 4) if count else None))
+    return {
+        "count": count,
+        "average_hours": round(total / count / 3600, 2) if count else None,
+        # مرز بالای خانه‌ای که صدک در آن است (None یعنی بیشتر از آخرین مرز)
+        "p50_hours": percentile(0.5),
+        "p90_hours": percentile(0.9),
+        "within": within,
+    }
+
+def week_of(day):
+    return day - timedelta(days=(day.weekday() - SETTINGS["week_start"]) % 7)
+
+def report(rows, start, end):
+    daily = {}
+    weekly = {}
+    categories, agents = {}, {}
+    first_response, close_time = {}, {}
+    for day, metric, key, count, total in rows:
+        if metric in ("created", "closed"):
+            column = 0 if metric == "created" else 1
+            daily.setdefault(day, [0, 0])[column] += count
+            weekly.setdefault(week_of(date.fromisoformat(day)).isoformat(), [0, 0])[column] += count
+            categories.setdefault(key, [0, 0])[column] += count
+        elif metric in ("closed_by", "replies_by"):
+            agents.setdefault(key, [0, 0])[0 if metric == "closed_by" else 1] += count
+        elif metric in ("first_response", "close_time"):
+            cell = (first_response if metric == "first_response" else close_time).setdefault(key, [0, 0.0])
+            cell[0] += count
+            cell[1] += total
+    days = []
+    day = start
+    while day <= end:
+        days.append((day.isoformat(), *daily.get(day.isoformat(), (0, 0))))
+        day += timedelta(days=1)
+    return {
+        "from": start.isoformat(), "to": end.isoformat(),
+        "daily": [{"day": d, "created": created, "closed": closed_count} for d, created, closed_count in days],
+        "weekly": [{"week": w, "created": c[0], "closed": c[1]} for w, c in sorted(weekly.items())],
+        "categories": [{"id": k, "created": c[0], "closed": c[1]} for k, c in sorted(categories.items())],
+        "agents": [{"id": k, "closed": c[0], "replies": c[1]} for k, c in sorted(agents.items())],
+        "first_response": _distribution(first_response),
+        "close_time": _distribution(close_time),
+    }
+
+def with_names(result, get_user, get_category):
+    # نام کارشناس‌ها و دسته‌بندی‌ها برای نمایش؛ NO_KEY (بدون دسته‌بندی/کارشناس) None و موجودیت حذف‌شده «#شناسه» است
+    for rows, lookup, attr in ((result["categories"], get_category, "name"), (result["agents"], get_user, "username")):
+        for row in rows:
+            found = lookup(row["id"]) if row["id"] != NO_KEY else None
+            row["name"] = getattr(found, attr) if found else (None if row["id"] == NO_KEY else f"#{row['id']}")
+    return result
@@ -0,0 +1,255 @@
+# ticketing/app/api.py
+
+from bisect import bisect_right
+import functools
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+
+from flask import request, Response
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from app import app
+from .services import *
+from . import analytics
+from .models import TicketStatus
+
+# API نسخه‌دار JSON برای یکپارچه‌سازی‌ها و کلاینت‌های SPA، روی همان توابع services.
+# احراز هویت با توکن امضاشده (Authorization: Bearer <token>) که از POST /api/v1/token یا فرمان api-token گرفته می‌شود؛
+# توکن شناسه کاربر و اثر انگشت هش رمز او را دارد، پس با تغییر رمز (یا حذف کاربر) باطل می‌شود و جدولی لازم ندارد.
+# اشیای مدل بدون Jinja و فقط با فیلدهای درخواست‌شده (?fields=id,title) به دیکشنری تبدیل می‌شوند؛
+# فهرست‌ها با نشانگر (next_cursor) صفحه‌بندی می‌شوند و ?ids=1,2,3 چند تیکت را در یک درخواست برمی‌گرداند.
+API_PREFIX = '/api/v1'
+
+
+def _serializer():
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='api-token')
+
+def _fingerprint(user):
+    return hashlib.blake2b(user.password_hash.encode('utf-8'), digest_size=8).hexdigest()
+
+def issue_token(user):
+    return _serializer().dumps([user.id, _fingerprint(user)])
+
+def _token_user(header):
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        user_id, fingerprint = _serializer().loads(token.strip(), max_age=app.config['API_TOKEN_MAX_AGE_DAYS'] * 86400)
+    except (BadSignature, SignatureExpired, ValueError, TypeError):
+        return None
+    user = get_user_by_id(user_id)
+    if user is None or _fingerprint(user) != fingerprint:
+        return None
+    return user
+
+
+# --- پاسخ‌ها ---
+def _json(body, status=200):
+    return Response(json.dumps(body, ensure_ascii=False, separators=(',', ':')), status=status,
+                    mimetype='application/json')
+
+def _error(status, message):
+    return _json({"error": message}, status)
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def api_view(staff_only=False):
+    # کاربر توکن به عنوان اولین آرگومان به تابع داده می‌شود
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            user = _token_user(request.headers.get('Authorization', ''))
+            if user is None:
+                return _error(401, "توکن معتبر نیست یا منقضی شده است.")
+            if staff_only and user.role not in ['admin', 'supervisor']:
+                return _error(403, "شما دسترسی لازم برای این کار را ندارید.")
+            try:
+                return func(user, *args, **kwargs)
+            except ApiError as e:
+                return _error(e.status, str(e))
+        return wrapper
+    return decorator
+
+
+# --- تبدیل اشیای مدل ---
+# نام فیلد -> تابع خواندن آن؛ فهرست تابع‌ها یک بار برای هر درخواست انتخاب می‌شود
+def _iso(ts):
+    return datetime.fromtimestamp(ts).isoformat(timespec='seconds')
+
+def _name(obj):
+    return obj.username if obj else None
+
+TICKET_FIELDS = {
+    "id": lambda t: t.id,
+    "title": lambda t: t.title,
+    "content": lambda t: t.content,
+    "status": lambda t: t.status.name,
+    "category": lambda t: t.category.name if t.category else None,
+    "category_id": lambda t: t.category.id if t.category else None,
+    "created_by": lambda t: _name(t.created_by),
+    "assigned_to": lambda t: _name(t.assigned_to),
+    "created_at": lambda t: _iso(t.created_ts),
+}
+TICKET_DEFAULT_FIELDS = ("id", "title", "status", "category", "created_by", "assigned_to", "created_at")
+REPLY_FIELDS = {
+    "id": lambda r: r.id,
+    "user": lambda r: _name(r.user),
+    "content": lambda r: r.content,
+    "created_at": lambda r: _iso(r.created_ts),
+}
+USER_FIELDS = {
+    "id": lambda u: u.id,
+    "username": lambda u: u.username,
+    "role": lambda u: u.role,
+    "created_at": lambda u: _iso(u.created_ts),
+}
+CATEGORY_FIELDS = {
+    "id": lambda c: c.id,
+    "name": lambda c: c.name,
+}
+
+def _fields(available, default=None):
+    requested = request.args.get('fields')
+    if not requested:
+        return [(name, available[name]) for name in (default or available)]
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(400, f"فیلد نامعتبر: {', '.join(unknown)}")
+    return [(name, available[name]) for name in names]
+
+def _dump(items, getters):
+    return [{name: get(item) for name, get in getters} for item in items]
+
+def _int_arg(name, default=None, minimum=None, maximum=None):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f"مقدار '{name}' باید عدد باشد.")
+    if minimum is not None:
+        value = max(minimum, value)
+    if maximum is not None:
+        value = min(maximum, value)
+    return value
+
+def _limit():
+    return _int_arg('limit', app.config['API_PAGE_SIZE'], 1, app.config['API_MAX_PAGE_SIZE'])
+
+def _after_page(items, getters):
+    # صفحه‌بندی فهرست‌های کوچک مرتب بر اساس شناسه (کاربران و دسته‌بندی‌ها) با نشانگر ?after=<شناسه>
+    after, limit = _int_arg('after', 0), _limit()
+    start = bisect_right(items, after, key=lambda item: item.id)
+    page = items[start:start + limit + 1]
+    cursor = page[limit - 1].id if len(page) > limit else None
+    return {"items": _dump(page[:limit], getters), "next_cursor": cursor}
+
+
+# --- روت‌ها ---
+@app.route(f'{API_PREFIX}/token', methods=['POST'])
+def api_token():
+    data = request.get_json(silent=True) or request.form
+    user = authenticate_user(data.get('username'), data.get('password'))
+    if not user:
+        return _error(401, "نام کاربری یا رمز عبور اشتباه است.")
+    return _json({"token": issue_token(user), "expires_in": int(app.config['API_TOKEN_MAX_AGE_DAYS'] * 86400)})
+
+@app.route(f'{API_PREFIX}/tickets')
+@api_view()
+def api_tickets(user):
+    getters = _fields(TICKET_FIELDS, TICKET_DEFAULT_FIELDS)
+    if request.args.get('ids'):
+        # دریافت دسته‌ای؛ شناسه‌های ناموجود یا خارج از دسترسی در missing می‌آیند
+        try:
+            ids = list(dict.fromkeys(int(i) for i in request.args['ids'].split(',') if i.strip()))
+        except ValueError:
+            raise ApiError(400, "مقدار 'ids' باید فهرست اعداد باشد.")
+        if len(ids) > app.config['API_MAX_PAGE_SIZE']:
+            raise ApiError(400, f"حداکثر {app.config['API_MAX_PAGE_SIZE']} شناسه در هر درخواست مجاز است.")
+        found = get_tickets_by_ids(ids)
+        tickets = [found[i] for i in ids if i in found and can_view_ticket(user, found[i])]
+        visible = {ticket.id for ticket in tickets}
+        return _json({"items": _dump(tickets, getters), "missing": [i for i in ids if i not in visible]})
+    args = request.args
+    status = args.get('status')
+    if status and status not in TicketStatus.__members__:
+        raise ApiError(400, "وضعیت نامعتبر است.")
+    creator_id = None
+    if args.get('creator'):
+        creator = get_user_by_username(args['creator'])
+        if not creator:
+            return _json({"items": [], "next_cursor": None})
+        creator_id = creator.id
+    sort = args.get('sort', 'id')
+    if sort not in TICKET_SORTS:
+        raise ApiError(400, "مرتب‌سازی نامعتبر است.")
+    tickets, cursor = query_tickets(
+        user, status=TicketStatus[status] if status else None, category_id=_int_arg('category'),
+        assignee_id=_int_arg('assignee'), creator_id=creator_id, sort=sort, descending=args.get('order') != 'asc',
+        cursor=_int_arg('cursor'), limit=_limit(),
+    )
+    return _json({"items": _dump(tickets, getters), "next_cursor": cursor})
+
+def _visible_ticket(user, ticket_id):
+    ticket = get_ticket_by_id(ticket_id)
+    if not ticket or not can_view_ticket(user, ticket):
+        raise ApiError(404, "تیکت یافت نشد.")
+    return ticket
+
+@app.route(f'{API_PREFIX}/tickets/<int:ticket_id>')
+@api_view()
+def api_ticket(user, ticket_id):
+    ticket = _visible_ticket(user, ticket_id)
+    return _json(_dump([ticket], _fields(TICKET_FIELDS))[0])
+
+@app.route(f'{API_PREFIX}/tickets/<int:ticket_id>/replies')
+@api_view()
+def api_ticket_replies(user, ticket_id):
+    # جدیدترین پاسخ‌ها به ترتیب زمانی؛ next_cursor (شناسه) صفحه قدیمی‌تر را با ?before= می‌دهد
+    ticket = _visible_ticket(user, ticket_id)
+    getters = _fields(REPLY_FIELDS)
+    replies, cursor = get_replies_page(ticket, _int_arg('before'), _limit())
+    return _json({"items": _dump(replies, getters), "next_cursor": cursor})
+
+@app.route(f'{API_PREFIX}/stats')
+@api_view(staff_only=True)
+def api_stats(user):
+    stats = get_dashboard_stats()
+    stats["recently_updated_tickets"] = _dump(stats["recently_updated_tickets"],
+                                              _fields(TICKET_FIELDS, TICKET_DEFAULT_FIELDS))
+    return _json(stats)
+
+def _date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(400, f"مقدار '{name}' باید تاریخ YYYY-MM-DD باشد.")
+
+@app.route(f'{API_PREFIX}/analytics')
+@api_view(staff_only=True)
+def api_analytics(user):
+    end = _date_arg('to', date.today())
+    start = _date_arg('from', end - timedelta(days=app.config['ANALYTICS_DEFAULT_DAYS'] - 1))
+    if start > end or (end - start).days > 365:
+        raise ApiError(400, "بازه گزارش باید حداکثر یک سال و from پیش از to باشد.")
+    return _json(analytics.with_names(get_analytics(start, end), get_user_by_id, get_category_by_id))
+
+@app.route(f'{API_PREFIX}/users')
+@api_view(staff_only=True)
+def api_users(user):
+    return _json(_after_page(get_all_users(), _fields(USER_FIELDS)))
+
+@app.route(f'{API_PREFIX}/categories')
+@api_view()
+def api_categories(user):
+    return _json(_after_page(get_all_categories(), _fields(CATEGORY_FIELDS)))
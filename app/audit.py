@@ -0,0 +1,196 @@
+# ticketing/app/audit.py
+
+from array import array
+from bisect import bisect_left, bisect_right
+import datetime
+import gzip
+import json
+import os
+import time
+
+# ذخیره‌گاه تاریخچه رویدادها (audit log) در بخش‌های زمانی.
+# هر بخش بازه‌ای به طول segment_seconds را پوشش می‌دهد و ستون‌هایش آرایه‌های فشرده‌اند:
+# شناسه، زمان، شناسه تیکت و شناسه کاربر به صورت عدد و عنوان عملیات به صورت کد کوچک (ر.ک. ACTIONS).
+# هر بخش ایندکس تیکت و کاربر خودش را دارد، پس حذف یک بخش قدیمی هزینه‌ای برای بقیه ندارد.
+# بخش‌هایی که از retention_days قدیمی‌تر شوند در archive_dir بایگانی (gzip JSONL) و از حافظه حذف می‌شوند.
+SETTINGS = {"segment_seconds": 86400, "retention_days": 365, "archive_dir": None}
+
+SEGMENTS = []
+# عنوان عملیات‌ها مجموعه کوچکی است؛ هر عنوان یک بار نگه داشته و در بخش‌ها با کد آن ذخیره می‌شود
+ACTIONS = []
+_action_codes = {}
+
+
+class Segment:
+    __slots__ = ("start", "ids", "times", "tickets", "users", "actions", "details", "by_ticket", "by_user")
+
+    def __init__(self, start):
+        self.start = start
+        self.ids = array("q")
+        self.times = array("d")
+        self.tickets = array("q")
+        self.users = array("q")
+        self.actions = array("H")
+        self.details = []
+        # شناسه تیکت/کاربر -> موقعیت رکوردهای آن در این بخش (صعودی)
+        self.by_ticket = {}
+        self.by_user = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, log_id, ts, ticket_id, user_id, action_code, details):
+        position = len(self.ids)
+        self.ids.append(log_id)
+        self.times.append(ts)
+        self.tickets.append(ticket_id)
+        self.users.append(user_id)
+        self.actions.append(action_code)
+        self.details.append(details or "")
+        self.by_ticket.setdefault(ticket_id, array("I")).append(position)
+        self.by_user.setdefault(user_id, array("I")).append(position)
+
+    def row(self, position):
+        return (self.ids[position], self.times[position], self.tickets[position], self.users[position],
+                ACTIONS[self.actions[position]], self.details[position])
+
+
+def init_app(app):
+    SETTINGS["segment_seconds"] = int(app.config["AUDIT_SEGMENT_HOURS"] * 3600)
+    SETTINGS["retention_days"] = app.config["AUDIT_RETENTION_DAYS"]
+    SETTINGS["archive_dir"] = app.config["AUDIT_ARCHIVE_DIR"] or None
+
+def action_code(action):
+    code = _action_codes.get(action)
+    if code is None:
+        code = _action_codes[action] = len(ACTIONS)
+        ACTIONS.append(action)
+    return code
+
+def append(log_id, ts, ticket_id, user_id, action, details=""):
+    # رکوردها به ترتیب ثبت می‌رسند؛ اگر ساعت سیستم کمی عقب برود رکورد در همان بخش آخر می‌ماند
+    if not SEGMENTS or ts >= SEGMENTS[-1].start + SETTINGS["segment_seconds"]:
+        SEGMENTS.append(Segment(ts - ts % SETTINGS["segment_seconds"]))
+        prune()
+    SEGMENTS[-1].append(log_id, ts, ticket_id, user_id, action_code(action), details)
+
+def count():
+    return sum(len(segment) for segment in SEGMENTS)
+
+def last_id():
+    # شناسه‌ها به ترتیب ثبت بزرگ‌تر می‌شوند (ر.ک. persistence._apply)
+    return SEGMENTS[-1].ids[-1] if SEGMENTS else 0
+
+def iter_rows():
+    # همه رکوردها به ترتیب ثبت، بدون ساختن فهرست (بازسازی آمار تحلیلی)
+    for segment in SEGMENTS:
+        for position in range(len(segment)):
+            yield segment.row(position)
+
+def clear():
+    SEGMENTS.clear()
+    ACTIONS.clear()
+    _action_codes.clear()
+
+
+# --- نگهداری و بایگانی ---
+def prune(now=None):
+    # بخش‌هایی که کاملاً پیش از مرز نگهداری هستند حذف می‌شوند (بخش جاری هرگز)
+    if not SETTINGS["retention_days"]:
+        return 0
+    cutoff = (now or time.time()) - SETTINGS["retention_days"] * 86400
+    expired = 0
+    while len(SEGMENTS) > 1 and SEGMENTS[0].start + SETTINGS["segment_seconds"] <= cutoff:
+        segment = SEGMENTS.pop(0)
+        if SETTINGS["archive_dir"]:
+            write_archive(segment.start, (segment.row(i) for i in range(len(segment))))
+        expired += 1
+    return expired
+
+def write_archive(start, rows):
+    # یک فایل برای هر بخش؛ بازنویسی کامل (نه افزودن) تا بایگانی دوباره یک بخش پس از راه‌اندازی مجدد تکراری نسازد
+    os.makedirs(SETTINGS["archive_dir"], exist_ok=True)
+    name = datetime.datetime.fromtimestamp(start, datetime.timezone.utc).strftime("%Y%m%d-%H%M")
+    path = os.path.join(SETTINGS["archive_dir"], f"audit-{name}.jsonl.gz")
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as archive:
+        for log_id, ts, ticket_id, user_id, action, details in rows:
+            archive.write(json.dumps({"id": log_id, "ts": ts, "ticket_id": ticket_id, "user_id": user_id,
+                                      "action": action, "details": details}, ensure_ascii=False) + "\n")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+# --- اسنپ‌شات ---
+def state():
+    return {"segments": SEGMENTS, "actions": ACTIONS}
+
+def restore(saved):
+    clear()
+    ACTIONS.extend(saved["actions"])
+    _action_codes.update((action, code) for code, action in enumerate(ACTIONS))
+    SEGMENTS.extend(saved["segments"])
+
+
+# --- پرس‌وجو ---
+# خروجی‌ها ردیف‌های (شناسه، زمان، شناسه تیکت، شناسه کاربر، عملیات، توضیحات) هستند
+def ticket_page(ticket_id, before=None, limit=50):
+    # مثل services._page_before: جدیدترین رکوردهای قبل از before به ترتیب زمانی، همراه با نشانگر صفحه قدیمی‌تر
+    rows = []
+    for segment in reversed(SEGMENTS):
+        positions = segment.by_ticket.get(ticket_id)
+        if not positions:
+            continue
+        end = len(positions) if before is None else bisect_left(positions, before, key=segment.ids.__getitem__)
+        for position in reversed(positions[max(0, end - (limit + 1 - len(rows))):end]):
+            rows.append(segment.row(position))
+        if len(rows) > limit:
+            break
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = rows[-1][0]
+    return rows[::-1], cursor
+
+def rows_for_tickets(ticket_ids):
+    result = {ticket_id: [] for ticket_id in ticket_ids}
+    for segment in SEGMENTS:
+        for ticket_id, rows in result.items():
+            for position in segment.by_ticket.get(ticket_id, ()):
+                rows.append(segment.row(position))
+    return result
+
+def query(start=None, end=None, user_id=None, ticket_id=None, action=None, before=None, limit=100):
+    # «چه کسی بین T1 و T2 چه کرد»: جدیدترین رکوردها اول، با صفحه‌بندی keyset روی شناسه (before).
+    # فقط بخش‌هایی که با بازه زمانی هم‌پوشانی دارند پیمایش می‌شوند و در هر بخش از ایندکس کاربر/تیکت
+    # یا (بدون این فیلترها) از جستجوی دودویی روی زمان استفاده می‌شود.
+    code = _action_codes.get(action) if action else None
+    if action and code is None:
+        return [], None
+    rows = []
+    for segment in reversed(SEGMENTS):
+        if end is not None and segment.start > end:
+            continue
+        if start is not None and segment.start + SETTINGS["segment_seconds"] <= start:
+            break
+        if user_id is not None:
+            positions = segment.by_user.get(user_id, ())
+        elif ticket_id is not None:
+            positions = segment.by_ticket.get(ticket_id, ())
+        else:
+            times = segment.times
+            positions = range(bisect_left(times, start) if start is not None else 0,
+                              bisect_right(times, end) if end is not None else len(times))
+        if before is not None:
+            positions = positions[:bisect_left(positions, before, key=segment.ids.__getitem__)]
+        for position in reversed(positions):
+            ts = segment.times[position]
+            if (start is not None and ts < start) or (end is not None and ts > end):
+                continue
+            if ticket_id is not None and segment.tickets[position] != ticket_id:
+                continue
+            if code is not None and segment.actions[position] != code:
+                continue
+            rows.append(segment.row(position))
+            if len(rows) > limit:
+                return rows[:limit], rows[limit - 1][0]
+    return rows, None
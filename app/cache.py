@@ -0,0 +1,99 @@
+# ticketing/app/cache.py
+
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+from . import metrics
+
+# نسخه موجودیت‌ها و کش قطعه‌های رندرشده صفحات (ردیف تیکت‌ها، رشته پاسخ‌ها و تاریخچه، کارت‌های داشبورد).
+# توابع تغییردهنده services نسخه موجودیت‌هایی را که تغییر داده‌اند بالا می‌برند (bump):
+#   "ticket:<id>" برای هر تیکت، TICKETS برای هر تغییر تیکت‌ها (فهرست‌ها و داشبورد)
+#   و DIRECTORY برای کاربران و دسته‌بندی‌ها (نام‌هایشان در همه صفحات دیده می‌شود).
+# نسخه‌ها از یک ساعت یکنواخت به میکروثانیه گرفته می‌شوند و پس از راه‌اندازی مجدد تکراری نمی‌شوند.
+# با backend حافظه نسخه‌ها در VERSIONS همین پروسه‌اند؛ sqlite آن‌ها را در جدول versions نگه می‌دارد.
+SETTINGS = {"size": 4096}
+TICKETS, DIRECTORY = "tickets", "directory"
+
+STARTED = time.time()
+# نسخه کلیدهایی که از زمان شروع پروسه تغییر نکرده‌اند؛ با هر راه‌اندازی مجدد عوض می‌شود چون
+# تغییرات قبلی (مثلاً ورود داده از خط فرمان) در VERSIONS این پروسه ثبت نشده‌اند
+BOOT_VERSION = int(STARTED * 1e6)
+VERSIONS = {}               # کلید -> (نسخه، زمان تغییر)
+_clock = {"last": BOOT_VERSION}
+# کلید قطعه -> (نسخه وابستگی‌ها، کلید وابستگی‌ها، مقدار)؛ ترتیب درج همان ترتیب LRU است
+_fragments = OrderedDict()
+_dependents = {}            # کلید موجودیت -> کلید قطعه‌های وابسته به آن
+_lock = threading.Lock()
+
+
+def init_app(app):
+    SETTINGS["size"] = app.config["RENDER_CACHE_SIZE"]
+
+def ticket_key(ticket_id):
+    return f"ticket:{ticket_id}"
+
+def next_version():
+    with _lock:
+        version = _clock["last"] = max(_clock["last"] + 1, int(time.time() * 1e6))
+    return version
+
+
+# --- نسخه‌ها (backend حافظه) ---
+def bump(*keys):
+    now = time.time()
+    for key in keys:
+        VERSIONS[key] = (next_version(), now)
+    invalidate(*keys)
+
+def versions(keys):
+    return {key: VERSIONS.get(key, (BOOT_VERSION, STARTED)) for key in keys}
+
+
+# --- کش قطعه‌ها ---
+def fragment(key, current, render):
+    # key: (نام قطعه، شناسه، ...، نقش بیننده)؛ current: نسخه‌های موجودیت‌هایی که قطعه به آن‌ها وابسته است
+    # و باید پیش از خواندن داده‌ها گرفته شده باشند. render فقط وقتی اجرا می‌شود که قطعه در کش نباشد یا کهنه باشد.
+    if SETTINGS["size"] <= 0:
+        return render()
+    deps = tuple(sorted(current))
+    stamp = tuple(current[dep][0] for dep in deps)
+    with _lock:
+        entry = _fragments.get(key)
+        if entry is not None and entry[0] == stamp:
+            _fragments.move_to_end(key)
+    if entry is not None and entry[0] == stamp:
+        metrics.inc("ticketing_render_cache_total", fragment=key[0], result="hit")
+        return entry[2]
+    metrics.inc("ticketing_render_cache_total", fragment=key[0], result="miss")
+    value = render()
+    with _lock:
+        _fragments[key] = (stamp, deps, value)
+        _fragments.move_to_end(key)
+        for dep in deps:
+            _dependents.setdefault(dep, set()).add(key)
+        while len(_fragments) > SETTINGS["size"]:
+            old_key, (_, old_deps, _) = _fragments.popitem(last=False)
+            for dep in old_deps:
+                _dependents.get(dep, set()).discard(old_key)
+    return value
+
+def invalidate(*keys):
+    # قطعه‌های وابسته به این موجودیت‌ها بلافاصله حذف می‌شوند؛ در پروسه‌های دیگر (sqlite با چند کارگر)
+    # مقایسه نسخه در fragment همین کار را هنگام خواندن انجام می‌دهد
+    with _lock:
+        for key in keys:
+            for fragment_key in _dependents.pop(key, ()):
+                entry = _fragments.pop(fragment_key, None)
+                if entry is None:
+                    continue
+                for dep in entry[1]:
+                    if dep != key:
+                        _dependents.get(dep, set()).discard(fragment_key)
+
+def size():
+    return len(_fragments)
+
+def etag(*parts):
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
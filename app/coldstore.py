@@ -0,0 +1,273 @@
+# ticketing/app/coldstore.py
+
+from collections import OrderedDict
+import glob
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from .models import User, Ticket, Reply, Category, TicketStatus
+
+logger = logging.getLogger(__name__)
+
+# لایه سرد تیکت‌ها: تیکت‌های بسته/حذف‌شده‌ای که مدتی تغییر نکرده‌اند همراه با پاسخ‌هایشان از DB درون‌حافظه‌ای
+# به فایل‌های بخش‌بندی‌شده روی دیسک منتقل می‌شوند (ر.ک. services.archive_tickets).
+# هر رکورد: سرآیند (شناسه تیکت، طول) و سپس JSON فشرده‌شده با zlib. رکوردها فقط اضافه می‌شوند؛
+# اگر تیکتی دوباره بایگانی شود رکورد جدیدتر معتبر است. در حافظه فقط موقعیت هر رکورد نگه داشته می‌شود
+# (یک عدد برای هر تیکت) و تیکت هنگام درخواست از دیسک خوانده می‌شود.
+# تیکتی که با تغییر به DB برگشته (_hot) شمرده نمی‌شود، ولی رکوردش تا بایگانی دوباره می‌ماند چون بازپخش
+# رکورد «A-» ژورنال تا اسنپ‌شات بعدی به آن نیاز دارد. رکوردهای کهنه (نسخه قبلی تیکتی که دوباره بایگانی شده)
+# با compact حذف می‌شوند: بخش‌هایی که بیشتر حجمشان کهنه است بازنویسی و پاک می‌شوند.
+SETTINGS = {"directory": None, "after_days": 30, "statuses": ("CLOSED", "DELETED"), "interval": 3600,
+            "segment_bytes": 64 * 1024 * 1024, "cache_size": 256, "compact_ratio": 0.5}
+
+_HEADER = struct.Struct("<QI")
+# شناسه تیکت -> (شماره بخش << 40) | موقعیت رکورد در فایل
+_offsets = {}
+_hot = set()         # شناسه تیکت‌هایی از _offsets که به DB برگشته‌اند
+_sizes = {}          # شماره بخش -> [حجم کل، حجم رکوردهای کهنه] به بایت
+_files = {}          # شماره بخش -> فایل باز برای خواندن
+_writer = {"segment": 0, "file": None}
+_cache = OrderedDict()
+_lock = threading.Lock()
+_archiver = {"pid": None}
+
+
+def init_app(app):
+    SETTINGS["after_days"] = app.config["ARCHIVE_AFTER_DAYS"]
+    SETTINGS["statuses"] = tuple(app.config["ARCHIVE_STATUSES"])
+    SETTINGS["interval"] = app.config["ARCHIVE_INTERVAL_MINUTES"] * 60
+    SETTINGS["directory"] = app.config["ARCHIVE_DIR"] or None
+    if SETTINGS["directory"]:
+        os.makedirs(SETTINGS["directory"], exist_ok=True)
+        _scan()
+
+def enabled():
+    return SETTINGS["directory"] is not None and SETTINGS["after_days"] > 0
+
+def _path(segment):
+    return os.path.join(SETTINGS["directory"], f"cold-{segment:06d}.seg")
+
+def _scan():
+    # فقط سرآیندها خوانده می‌شوند؛ رکورد نیمه‌نوشته انتهای آخرین بخش (پس از خاموشی ناگهانی) کنار گذاشته می‌شود
+    _offsets.clear()
+    _hot.clear()
+    _sizes.clear()
+    record_sizes = {}
+    segments = sorted(int(os.path.basename(path)[5:11]) for path in glob.glob(os.path.join(SETTINGS["directory"], "cold-*.seg")))
+    for segment in segments:
+        _sizes[segment] = [0, 0]
+        with open(_path(segment), "rb") as segment_file:
+            size = os.fstat(segment_file.fileno()).st_size
+            offset = 0
+            while offset + _HEADER.size <= size:
+                ticket_id, length = _HEADER.unpack(segment_file.read(_HEADER.size))
+                if offset + _HEADER.size + length > size:
+                    break
+                if ticket_id in _offsets:
+                    _sizes[_offsets[ticket_id] >> 40][1] += record_sizes[ticket_id]
+                _offsets[ticket_id] = (segment << 40) | offset
+                record_sizes[ticket_id] = _HEADER.size + length
+                offset += _HEADER.size + length
+                segment_file.seek(offset)
+        if offset != size:
+            os.truncate(_path(segment), offset)
+        _sizes[segment][0] = offset
+    _writer["segment"] = segments[-1] if segments else 1
+
+def rescan():
+    # کارگر gunicorn که پس از کارگر قبلی fork شده، رکوردهایی را که آن کارگر نوشته از دیسک می‌خواند
+    if SETTINGS["directory"] is None:
+        return
+    with _lock:
+        _files.clear()
+        _cache.clear()
+        if _writer["file"] is not None:
+            _writer["file"].close()
+            _writer["file"] = None
+        _scan()
+
+def _open_writer():
+    if _writer["file"] is None or _writer["file"].tell() >= SETTINGS["segment_bytes"]:
+        if _writer["file"] is not None:
+            _writer["file"].flush()
+            os.fsync(_writer["file"].fileno())
+            _writer["file"].close()
+            _writer["segment"] += 1
+        _writer["file"] = open(_path(_writer["segment"]), "ab")
+        _sizes.setdefault(_writer["segment"], [0, 0])[0] = _writer["file"].tell()
+    return _writer["file"]
+
+def _segment_file(segment):
+    # زیر _lock؛ فایل‌ها بسته نمی‌شوند تا خواننده‌ای که فایل را گرفته با حذف بخش در compact خطا نگیرد
+    segment_file = _files.get(segment)
+    if segment_file is None:
+        segment_file = _files[segment] = open(_path(segment), "rb")
+    return segment_file
+
+def _record_size(position):
+    segment, offset = position >> 40, position & ((1 << 40) - 1)
+    _, length = _HEADER.unpack(os.pread(_segment_file(segment).fileno(), _HEADER.size, offset))
+    return _HEADER.size + length
+
+def _drop(ticket_id):
+    # زیر _lock؛ رکورد فعلی تیکت کهنه می‌شود
+    position = _offsets.get(ticket_id)
+    if position is not None:
+        _sizes[position >> 40][1] += _record_size(position)
+
+
+# --- نوشتن و خواندن ---
+def write(records):
+    # records: [(شناسه تیکت، دیکشنری)]؛ پیش از بازگشت روی دیسک fsync می‌شوند
+    with _lock:
+        segment_file = _open_writer()
+        positions = []
+        for ticket_id, record in records:
+            payload = zlib.compress(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            positions.append((ticket_id, (_writer["segment"] << 40) | segment_file.tell()))
+            segment_file.write(_HEADER.pack(ticket_id, len(payload)) + payload)
+        segment_file.flush()
+        os.fsync(segment_file.fileno())
+        _sizes[_writer["segment"]][0] = segment_file.tell()
+        for ticket_id, position in positions:
+            _drop(ticket_id)
+            _offsets[ticket_id] = position
+            _hot.discard(ticket_id)
+            _cache.pop(ticket_id, None)
+
+def contains(ticket_id):
+    return ticket_id in _offsets and ticket_id not in _hot
+
+def count():
+    return len(_offsets) - len(_hot)
+
+def mark_hot(ticket_id):
+    # تیکت به DB برگشته (ر.ک. services._thaw)
+    with _lock:
+        if ticket_id in _offsets:
+            _hot.add(ticket_id)
+        _cache.pop(ticket_id, None)
+
+def reconcile(hot_ids):
+    # پس از بارگذاری DB: تیکت‌هایی که هم در DB و هم در لایه سرد هستند به DB برگشته‌اند
+    with _lock:
+        _hot.clear()
+        _hot.update(ticket_id for ticket_id in _offsets if ticket_id in hot_ids)
+
+def read(ticket_id):
+    with _lock:
+        position = _offsets.get(ticket_id)
+        if position is None:
+            return None
+        record = _cache.get(ticket_id)
+        if record is not None:
+            _cache.move_to_end(ticket_id)
+            return record
+        segment, offset = position >> 40, position & ((1 << 40) - 1)
+        segment_file = _segment_file(segment)
+    header = os.pread(segment_file.fileno(), _HEADER.size, offset)
+    _, length = _HEADER.unpack(header)
+    record = json.loads(zlib.decompress(os.pread(segment_file.fileno(), length, offset + _HEADER.size)))
+    with _lock:
+        _cache[ticket_id] = record
+        if len(_cache) > SETTINGS["cache_size"]:
+            _cache.popitem(last=False)
+    return record
+
+def compact():
+    # بخش‌های بسته‌ای که حداقل compact_ratio از حجمشان کهنه است: رکوردهای معتبر به بخش جاری کپی و fsync می‌شوند
+    # و سپس فایل بخش حذف می‌شود. خاموشی در میانه کار فقط نسخه تکراری می‌گذارد که _scan نسخه جدیدتر آن را برمی‌دارد
+    with _lock:
+        segments = {segment for segment, (total, dead) in _sizes.items()
+                    if segment != _writer["segment"] and dead >= total * SETTINGS["compact_ratio"]}
+        if not segments:
+            return 0
+        live = sorted((position, ticket_id) for ticket_id, position in _offsets.items() if position >> 40 in segments)
+        moved = []
+        for position, ticket_id in live:
+            size = _record_size(position)
+            data = os.pread(_segment_file(position >> 40).fileno(), size, position & ((1 << 40) - 1))
+            segment_file = _open_writer()
+            moved.append((ticket_id, (_writer["segment"] << 40) | segment_file.tell()))
+            segment_file.write(data)
+            _sizes[_writer["segment"]][0] = segment_file.tell()
+        if moved:
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+        _offsets.update(moved)
+        for segment in segments:
+            os.remove(_path(segment))
+            _files.pop(segment, None)
+            del _sizes[segment]
+        return len(segments)
+
+
+# --- اجرای دوره‌ای ---
+def ensure_archiver(run):
+    # مثل نمونه‌بردار metrics: هر پروسه (هر کارگر gunicorn پس از fork) نخ خودش را با اولین درخواست راه می‌اندازد
+    if not enabled() or _archiver["pid"] == os.getpid():
+        return
+    with _lock:
+        if _archiver["pid"] == os.getpid():
+            return
+        _archiver["pid"] = os.getpid()
+    threading.Thread(target=_archive_loop, args=(run,), name="ticket-archiver", daemon=True).start()
+
+def _archive_loop(run):
+    while True:
+        time.sleep(SETTINGS["interval"])
+        try:
+            archived = run()
+            if archived:
+                logger.info("archived %d tickets to cold storage", archived)
+        except Exception:
+            logger.exception("ticket archival failed")
+
+
+# --- تبدیل تیکت به رکورد و برعکس ---
+# نام کاربر/دسته‌بندی هم ذخیره می‌شود تا اگر بعداً حذف شده باشند، تیکت بایگانی‌شده هنوز قابل نمایش باشد
+def pack(ticket):
+    person = lambda user: [user.id, user.username, user.role] if user else None
+    return {
+        "id": ticket.id, "title": ticket.title, "content": ticket.content, "status": ticket.status.name,
+        "created_by": person(ticket.created_by), "assigned_to": person(ticket.assigned_to),
+        "category": [ticket.category.id, ticket.category.name] if ticket.category else None,
+        "created_ts": ticket.created_ts, "updated_ts": ticket.updated_ts,
+        "replies": [[reply.id, reply.created_ts, person(reply.user), reply.content] for reply in ticket.replies],
+    }
+
+def _find(objects, cls, fields):
+    if fields is None:
+        return None
+    found = objects.get(fields[0])
+    if found is None:
+        # نمونه جدا برای کاربر/دسته‌بندی حذف‌شده؛ در ایندکس‌ها قرار نمی‌گیرد
+        found = cls.__new__(cls)
+        found.id, found.created_ts = fields[0], 0.0
+        if cls is User:
+            found.username, found.role, found.password_hash = fields[1], fields[2], None
+        else:
+            found.name = fields[1]
+    return found
+
+def unpack(record, users, categories):
+    # users و categories: دیکشنری شناسه -> شیء موجود
+    ticket = Ticket.__new__(Ticket)
+    ticket.id, ticket.title, ticket.content = record["id"], record["title"], record["content"]
+    ticket.status = TicketStatus[record["status"]]
+    ticket.created_by = _find(users, User, record["created_by"])
+    ticket.assigned_to = _find(users, User, record["assigned_to"])
+    ticket.category = _find(categories, Category, record["category"])
+    ticket.created_ts, ticket.updated_ts = record["created_ts"], record["updated_ts"]
+    ticket.replies = []
+    for reply_id, created_ts, user, content in record["replies"]:
+        reply = Reply.__new__(Reply)
+        reply.id, reply.created_ts, reply.ticket, reply.content = reply_id, created_ts, ticket, content
+        reply.user = _find(users, User, user)
+        ticket.replies.append(reply)
+    return ticket
@@ -0,0 +1,82 @@
+# ticketing/app/commands.py
+
+import json
+import sys
+
+import click
+
+from app import app
+from . import api, services, transfer
+
+# فرمان‌های خط فرمان:  flask --app run import-data tickets tickets.csv  /  flask --app run export-tickets -o out.jsonl
+# با backend حافظه، داده‌ها در ژورنال همین پروسه نوشته می‌شوند؛ پس ورود از خط فرمان باید وقتی سرویس
+# در حال اجرا نیست انجام شود (در حین اجرا از /admin/transfer استفاده کنید). با sqlite محدودیتی نیست.
+
+
+@app.cli.command("import-data")
+@click.argument("kind", type=click.Choice(transfer.KINDS))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="قالب فایل؛ پیش‌فرض از پسوند فایل")
+@click.option("--as-user", "username", default="admin", show_default=True,
+              help="کاربری که تخصیص‌ها و تاریخچه به نام او ثبت می‌شود")
+def import_data_command(kind, path, fmt, username):
+    importer = services.get_user_by_username(username)
+    if not importer or importer.role not in ['admin', 'supervisor']:
+        raise click.ClickException(f"کاربر مدیر '{username}' پیدا نشد.")
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, "rb") as stream:
+        for result in transfer.import_rows(kind, stream, fmt, importer):
+            if "error" in result:
+                click.echo(json.dumps(result, ensure_ascii=False), err=True)
+            else:
+                click.echo(f"{result['imported']} imported, {result['failed']} failed")
+
+
+@app.cli.command("export-tickets")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="jsonl", show_default=True)
+@click.option("-o", "--output", type=click.Path(dir_okay=False), default=None, help="مسیر فایل خروجی؛ پیش‌فرض stdout")
+def export_tickets_command(fmt, output):
+    target = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+    try:
+        for chunk in transfer.export_tickets(fmt):
+            target.write(chunk)
+    finally:
+        if output:
+            target.close()
+
+
+@app.cli.command("route-tickets")
+@click.option("--rebalance", is_flag=True, help="جابه‌جایی تیکت‌های شروع‌نشده از کارشناسان پربار به کم‌بار")
+@click.option("--as-user", "username", default="admin", show_default=True,
+              help="کاربری که تخصیص‌ها به نام او ثبت می‌شود")
+def route_tickets_command(rebalance, username):
+    # با backend حافظه فقط وقتی سرویس در حال اجرا نیست (مثل import-data)
+    actor = services.get_user_by_username(username)
+    if not actor or actor.role not in ['admin', 'supervisor']:
+        raise click.ClickException(f"کاربر مدیر '{username}' پیدا نشد.")
+    result = services.route_tickets(actor, rebalance=rebalance)
+    click.echo(f"{result['assigned']} assigned, {result['moved']} moved")
+
+
+@app.cli.command("api-token")
+@click.argument("username")
+def api_token_command(username):
+    # توکن API برای یکپارچه‌سازی‌ها؛ با تغییر رمز کاربر باطل می‌شود
+    user = services.get_user_by_username(username)
+    if not user:
+        raise click.ClickException(f"کاربر '{username}' پیدا نشد.")
+    click.echo(api.issue_token(user))
+
+
+@app.cli.command("analytics-backfill")
+def analytics_backfill_command():
+    # خلاصه‌های آمار تحلیلی را در یک پیمایش از لاگ‌ها از نو می‌سازد (مثلاً برای داده‌های پیش از این نسخه)؛
+    # backend حافظه این کار را هنگام هر راه‌اندازی خودش انجام می‌دهد
+    click.echo(f"{services.rebuild_analytics()} log entries replayed")
+
+
+@app.cli.command("archive-tickets")
+def archive_tickets_command():
+    # همان کار نخ بایگانی دوره‌ای؛ با backend حافظه فقط وقتی سرویس در حال اجرا نیست
+    click.echo(f"{services.archive_tickets()} tickets archived")
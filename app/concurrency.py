@@ -0,0 +1,80 @@
+# ticketing/app/concurrency.py
+
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+
+# قفل خواننده/نویسنده: خواندن‌ها هم‌زمان انجام می‌شوند و فقط نوشتن‌ها سریالی می‌شوند.
+# نویسنده‌ی منتظر اولویت دارد تا زیر بار خواندن گرسنه نماند.
+# قفل نوشتن بازگشتی است (سرویسی که سرویس دیگر را صدا می‌زند) و نخی که قفل نوشتن دارد می‌تواند بخواند.
+class RWLock:
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        depth = getattr(self._local, "reads", 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.reads = depth + 1
+            try:
+                yield
+            finally:
+                self._local.reads = depth
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.reads = 1
+        try:
+            yield
+        finally:
+            self._local.reads = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        if getattr(self._local, "reads", 0):
+            raise RuntimeError("ارتقای قفل خواندن به نوشتن پشتیبانی نمی‌شود.")
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+# قفل سراسری داده‌های درون‌حافظه‌ای services.DB و ایندکس‌ها و شمارنده‌های وابسته به آن
+STORE_LOCK = RWLock()
+
+def reads(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with STORE_LOCK.read():
+            return func(*args, **kwargs)
+    return wrapper
+
+def writes(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with STORE_LOCK.write():
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,141 @@
+# ticketing/app/events.py
+
+from collections import deque
+from itertools import islice
+import json
+import threading
+import time
+
+# گذرگاه رویدادهای درون‌پروسه‌ای برای به‌روزرسانی زنده صفحات (Server-Sent Events در /events).
+# توابع services پس از ایجاد تیکت، ثبت پاسخ، تخصیص، تغییر وضعیت و تغییر دسته‌بندی یک رویداد منتشر می‌کنند.
+# رویدادها در یک صف حلقوی مشترک با اندازه محدود (backlog) و شماره ترتیبی پشت سر هم نگه داشته می‌شوند؛
+# هر اتصال فقط نشانگر آخرین رویداد فرستاده‌شده را دارد و رویدادهای مربوط به کاربرش را از صف برمی‌دارد.
+# اتصالی که از صف عقب بماند (کلاینت کند) به‌جای صف نامحدود یک رویداد resync می‌گیرد و صفحه را تازه می‌کند.
+# رویدادها فقط در همان پروسه پخش می‌شوند؛ با sqlite و چند کارگر هر کارگر تغییرات خودش را می‌فرستد.
+SETTINGS = {"max_streams": 32, "per_user": 4, "backlog": 1000, "heartbeat": 15.0, "lifetime": 600.0}
+
+# شماره‌ها از زمان شروع پروسه آغاز می‌شوند تا Last-Event-ID مانده از پروسه قبلی به resync برسد
+_seq = {"last": int(time.time() * 1000)}
+# (شماره، شناسه تیکت، مخاطبان، نوع، داده JSON)
+_events = deque()
+_cond = threading.Condition()
+_streams = {"total": 0, "by_user": {}}
+
+
+def init_app(app):
+    SETTINGS["max_streams"] = app.config["EVENT_STREAMS_MAX"]
+    SETTINGS["per_user"] = app.config["EVENT_STREAMS_PER_USER"]
+    SETTINGS["backlog"] = app.config["EVENT_BACKLOG"]
+    SETTINGS["heartbeat"] = app.config["EVENT_HEARTBEAT_SECONDS"]
+
+
+# --- انتشار ---
+def _name(user):
+    return user.username if user else None
+
+def ticket_data(ticket):
+    return {
+        "id": ticket.id, "title": ticket.title, "status": ticket.status.name, "status_label": ticket.status.value,
+        "category": ticket.category.name if ticket.category else None,
+        "created_by": _name(ticket.created_by), "assigned_to": _name(ticket.assigned_to),
+    }
+
+def publish(kind, ticket, previous_assignee=None, reply=None):
+    # مخاطبان: ایجادکننده و کارشناس فعلی (و کارشناس قبلی در تخصیص دوباره)؛ مدیران همه رویدادها را می‌گیرند
+    data = {"type": kind, "ticket": ticket_data(ticket)}
+    if reply is not None:
+        data["reply"] = {"id": reply.id, "user": _name(reply.user), "content": reply.content,
+                         "created_at": reply.created_at.strftime('%Y-%m-%d %H:%M')}
+    audience = (ticket.created_by.id if ticket.created_by else None,
+                ticket.assigned_to.id if ticket.assigned_to else None,
+                previous_assignee.id if previous_assignee else None)
+    payload = json.dumps(data, ensure_ascii=False)
+    with _cond:
+        _seq["last"] += 1
+        _events.append((_seq["last"], ticket.id, audience, kind, payload))
+        while len(_events) > SETTINGS["backlog"]:
+            _events.popleft()
+        _cond.notify_all()
+
+
+# --- اتصال‌ها ---
+def _relevant(event, user_id, role, ticket_id):
+    _, event_ticket, (creator, assignee, previous), kind, _ = event
+    if ticket_id is not None and event_ticket != ticket_id:
+        return False
+    if role in ['admin', 'supervisor']:
+        return True
+    if role == 'customer':
+        return creator == user_id
+    if role == 'agent':
+        return user_id in (assignee, previous)
+    return False
+
+def _format(seq, kind, payload):
+    return f"id: {seq}\nevent: {kind}\ndata: {payload}\n\n"
+
+def open_stream(user_id, role, ticket_id=None, last_id=None):
+    # None یعنی سقف اتصال‌های هم‌زمان (کل یا این کاربر) پر است
+    with _cond:
+        if (_streams["total"] >= SETTINGS["max_streams"]
+                or _streams["by_user"].get(user_id, 0) >= SETTINGS["per_user"]):
+            return None
+        _streams["total"] += 1
+        _streams["by_user"][user_id] = _streams["by_user"].get(user_id, 0) + 1
+    return Stream(user_id, role, ticket_id, last_id)
+
+def stream_count():
+    return _streams["total"]
+
+
+class Stream:
+    # بدنه پاسخ text/event-stream؛ close را سرور WSGI هنگام قطع اتصال یا پایان صدا می‌زند
+    # (حتی اگر هیچ تکه‌ای خوانده نشده باشد) و جای اتصال آزاد می‌شود
+    def __init__(self, user_id, role, ticket_id, last_id):
+        self.user_id, self.role, self.ticket_id = user_id, role, ticket_id
+        self._chunks = self._run(last_id)
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._chunks.close()
+        with _cond:
+            _streams["total"] -= 1
+            remaining = _streams["by_user"].pop(self.user_id) - 1
+            if remaining:
+                _streams["by_user"][self.user_id] = remaining
+
+    def _run(self, last_id):
+        # اتصال پس از lifetime ثانیه بسته می‌شود تا خاموشی منظم سرور منتظر آن نماند؛ EventSource خودش
+        # با Last-Event-ID دوباره وصل می‌شود و رویدادهای این فاصله را از صف می‌گیرد
+        deadline = time.monotonic() + SETTINGS["lifetime"]
+        yield "retry: 3000\n\n"
+        with _cond:
+            cursor = _seq["last"] if last_id is None else last_id
+        while time.monotonic() < deadline:
+            with _cond:
+                idle = cursor == _seq["last"] and not _cond.wait(SETTINGS["heartbeat"])
+                oldest = _events[0][0] if _events else _seq["last"] + 1
+                if cursor < oldest - 1 or cursor > _seq["last"]:
+                    pending, missed = (), True
+                else:
+                    pending, missed = list(islice(_events, max(0, cursor + 1 - oldest), None)), False
+                cursor = _seq["last"]
+            if missed:
+                yield _format(cursor, "resync", "{}")
+                continue
+            chunks = [_format(event[0], event[3], event[4]) for event in pending
+                      if _relevant(event, self.user_id, self.role, self.ticket_id)]
+            if chunks:
+                yield "".join(chunks)
+            elif idle:
+                # خط توضیح (heartbeat) اتصال‌های مرده را آشکار می‌کند و پروکسی‌ها را بیدار نگه می‌دارد
+                yield ": ping\n\n"
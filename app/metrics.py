@@ -0,0 +1,225 @@
+# ticketing/app/metrics.py
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from functools import wraps
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+logger = logging.getLogger(__name__)
+
+# مرزهای هیستوگرام زمان‌ها به ثانیه
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# شمارنده‌ها و هیستوگرام‌های هر پروسه؛ در اجرای چندکارگری هر کارگر مقادیر خودش را گزارش می‌دهد
+COUNTERS = defaultdict(Counter)      # نام متریک -> {برچسب‌ها: مقدار}
+HISTOGRAMS = defaultdict(dict)       # نام متریک -> {برچسب‌ها: [شمارش هر bucket..., مجموع, تعداد]}
+HELP = {
+    "ticketing_http_requests_total": ("counter", "Requests by endpoint, method and status."),
+    "ticketing_slow_requests_total": ("counter", "Requests slower than the profiling threshold."),
+    "ticketing_http_request_duration_seconds": ("histogram", "Request latency by endpoint."),
+    "ticketing_request_service_seconds": ("histogram", "Time spent in services calls per request."),
+    "ticketing_template_render_seconds": ("histogram", "Template render time by template."),
+    "ticketing_service_call_seconds": ("histogram", "Latency of services functions."),
+    "ticketing_render_cache_total": ("counter", "Rendered fragment cache lookups by fragment and result."),
+}
+SETTINGS = {"profile_slow": 0.0, "profile_interval": 0.005, "profile_dir": None}
+# زمان شروع هر پروسه؛ کارگرهای gunicorn پس از fork مقدار خودشان را می‌گیرند
+_started = {"pid": os.getpid(), "time": time.time()}
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, **labels):
+    with _lock:
+        COUNTERS[name][_labels(**labels)] += 1
+
+def observe(name, value, **labels):
+    key = _labels(**labels)
+    with _lock:
+        histogram = HISTOGRAMS[name].get(key)
+        if histogram is None:
+            # شمارش هر bucket (آخری +Inf)، سپس مجموع و تعداد
+            histogram = HISTOGRAMS[name][key] = [0] * (len(BUCKETS) + 1) + [0.0, 0]
+        histogram[bisect_left(BUCKETS, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+# --- زمان‌سنجی توابع services ---
+def _timed(name, func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _local.depth = depth
+            observe("ticketing_service_call_seconds", elapsed, function=name)
+            # فقط فراخوانی بیرونی در زمان سرویس درخواست حساب می‌شود (سرویس‌ها یکدیگر را صدا می‌زنند)
+            if depth == 0 and has_request_context() and "service_seconds" in g:
+                g.service_seconds += elapsed
+    wrapper.__wrapped_service__ = func
+    return wrapper
+
+def instrument(module, backend_modules=()):
+    # توابع عمومی services (یا backend جایگزین آن) را با نسخه زمان‌سنج جایگزین می‌کند؛
+    # باید پیش از import شدن routes اجرا شود چون routes توابع را با import * برمی‌دارد
+    owners = {module.__name__, *(backend.__name__ for backend in backend_modules)}
+    for name, func in list(vars(module).items()):
+        if (inspect.isfunction(func) and not name.startswith("_") and func.__module__ in owners
+                and not hasattr(func, "__wrapped_service__")):
+            setattr(module, name, _timed(name, func))
+
+
+# --- نمونه‌برداری از درخواست‌های کند ---
+# نخ نمونه‌بردار هر profile_interval ثانیه پشته نخ درخواست‌هایی را که از آستانه گذشته‌اند ثبت می‌کند؛
+# درخواست‌های سریع هیچ هزینه‌ای ندارند و چند درخواست هم‌زمان هم مشکلی ایجاد نمی‌کنند
+_inflight = {}
+_sampler = {"pid": None}
+
+def _stack(frame):
+    names = []
+    while frame is not None and len(names) < 64:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def _sample_loop():
+    while True:
+        time.sleep(SETTINGS["profile_interval"])
+        now, frames = time.perf_counter(), None
+        for thread_id, state in list(_inflight.items()):
+            if now - state["started"] < SETTINGS["profile_slow"]:
+                continue
+            frames = frames or sys._current_frames()
+            frame = frames.get(thread_id)
+            if frame is not None:
+                state["samples"][_stack(frame)] += 1
+
+def _ensure_sampler():
+    # پس از fork نخ‌ها کپی نمی‌شوند، پس هر کارگر gunicorn نمونه‌بردار خودش را راه می‌اندازد
+    if _sampler["pid"] != os.getpid():
+        with _lock:
+            if _sampler["pid"] != os.getpid():
+                threading.Thread(target=_sample_loop, name="slow-request-sampler", daemon=True).start()
+                _sampler["pid"] = os.getpid()
+
+def _report_slow(endpoint, elapsed, samples):
+    top = "\n".join(f"  {count:>5} {';'.join(stack.split(';')[-3:])}" for stack, count in samples.most_common(5))
+    logger.warning("slow request %s %s %.3fs (%d samples):\n%s", request.method, request.path, elapsed,
+                   sum(samples.values()), top)
+    if SETTINGS["profile_dir"]:
+        # قالب folded؛ مستقیم با flamegraph.pl یا speedscope قابل نمایش است
+        path = os.path.join(SETTINGS["profile_dir"], f"slow-{time.strftime('%Y%m%d')}.folded")
+        with open(path, "a", encoding="utf-8") as folded:
+            for stack, count in samples.items():
+                folded.write(f"{endpoint};{stack} {count}\n")
+
+
+# --- اتصال به Flask ---
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.service_seconds = 0.0
+    g.template_started = []
+    g.metrics_recorded = False
+    if SETTINGS["profile_slow"]:
+        _ensure_sampler()
+        _inflight[threading.get_ident()] = {"started": g.request_started, "samples": Counter()}
+
+def _record(status):
+    if "request_started" not in g or g.metrics_recorded:
+        return
+    g.metrics_recorded = True
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or "<unmatched>"
+    inc("ticketing_http_requests_total", endpoint=endpoint, method=request.method, status=str(status))
+    observe("ticketing_http_request_duration_seconds", elapsed, endpoint=endpoint)
+    observe("ticketing_request_service_seconds", g.service_seconds, endpoint=endpoint)
+    state = _inflight.pop(threading.get_ident(), None)
+    if state is not None and elapsed >= SETTINGS["profile_slow"]:
+        inc("ticketing_slow_requests_total", endpoint=endpoint)
+        if state["samples"]:
+            _report_slow(endpoint, elapsed, state["samples"])
+
+def _after_request(response):
+    _record(response.status_code)
+    return response
+
+def _teardown_request(exc):
+    # درخواستی که با استثنا تمام شده به after_request نمی‌رسد
+    if exc is not None:
+        _record(500)
+    _inflight.pop(threading.get_ident(), None)
+
+def _template_started(sender, template, context, **extra):
+    if has_request_context() and "template_started" in g:
+        g.template_started.append(time.perf_counter())
+
+def _template_finished(sender, template, context, **extra):
+    if has_request_context() and g.get("template_started"):
+        observe("ticketing_template_render_seconds", time.perf_counter() - g.template_started.pop(),
+                template=template.name or "<string>")
+
+def init_app(app):
+    SETTINGS["profile_slow"] = app.config["PROFILE_SLOW_MS"] / 1000.0
+    SETTINGS["profile_interval"] = app.config["PROFILE_INTERVAL_MS"] / 1000.0
+    SETTINGS["profile_dir"] = app.config["PROFILE_DIR"] or None
+    if SETTINGS["profile_dir"]:
+        os.makedirs(SETTINGS["profile_dir"], exist_ok=True)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+
+# --- خروجی متنی به قالب Prometheus ---
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+def render(store_sizes):
+    if _started["pid"] != os.getpid():
+        _started.update(pid=os.getpid(), time=time.time())
+    lines = []
+    with _lock:
+        counters = {name: dict(values) for name, values in COUNTERS.items()}
+        histograms = {name: {key: list(value) for key, value in values.items()} for name, values in HISTOGRAMS.items()}
+    for name, values in sorted(counters.items()):
+        kind, text = HELP[name]
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in sorted(values.items())]
+    for name, values in sorted(histograms.items()):
+        kind, text = HELP[name]
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        for labels, histogram in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram[:-2]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram[-1]}")
+    lines += ["# HELP ticketing_store_items Items held by the storage backend.", "# TYPE ticketing_store_items gauge"]
+    lines += [f'ticketing_store_items{{kind="{kind}"}} {count}' for kind, count in sorted(store_sizes.items())]
+    lines += ["# HELP ticketing_process_start_time_seconds Start time of this worker process.",
+              "# TYPE ticketing_process_start_time_seconds gauge",
+              f"ticketing_process_start_time_seconds {_started['time']:.3f}"]
+    return "\n".join(lines) + "\n"
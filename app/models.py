@@ -1,32 +1,75 @@
 # ticketing/app/models.py
 
 import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import sys
+import threading
 from flask_login import UserMixin
 from enum import Enum
+from . import passwords
 
 # یک کلاس پایه برای مدیریت شناسه و زمان ایجاد به صورت خودکار
+# هر نوع موجودیت دنباله شناسه جداگانه دارد و تخصیص شناسه زیر قفل انجام می‌شود تا در حالت چندنخی تکراری نشود
+# مدل‌ها __slots__ دارند (بدون __dict__ برای هر نمونه) و زمان ایجاد به صورت timestamp عددی نگه داشته می‌شود؛
+# created_at همچنان datetime برمی‌گرداند تا قالب‌ها و سرویس‌ها تغییری نخواهند
 class Base:
-    _id_counter = 0
+    __slots__ = ("id", "created_ts")
+    _id_counters = {}
+    _id_lock = threading.Lock()
+
     def __init__(self):
-        Base._id_counter += 1
-        self.id = Base._id_counter
-        self.created_at = datetime.datetime.now()
+        self.id = type(self).next_id()
+        self.created_ts = datetime.datetime.now().timestamp()
+
+    @property
+    def created_at(self):
+        return datetime.datetime.fromtimestamp(self.created_ts)
+
+    @created_at.setter
+    def created_at(self, value):
+        self.created_ts = value.timestamp()
+
+    def __setstate__(self, state):
+        # snapshotهای قدیمی (پیش از __slots__) وضعیت را به شکل __dict__ با created_at دارند
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def next_id(cls):
+        with Base._id_lock:
+            Base._id_counters[cls.__name__] = Base._id_counters.get(cls.__name__, 0) + 1
+            return Base._id_counters[cls.__name__]
+
+    @classmethod
+    def reserve_ids(cls, last_id):
+        # پس از بارگذاری داده‌ها، دنباله را از بزرگ‌ترین شناسه موجود ادامه می‌دهد
+        with Base._id_lock:
+            Base._id_counters[cls.__name__] = max(Base._id_counters.get(cls.__name__, 0), last_id)
 
 # کلاس کاربر که از UserMixin برای سازگاری با Flask-Login ارث‌بری می‌کند
+# UserMixin خودش __slots__ ندارد، پس کاربر __dict__ دارد؛ تعداد کاربران در برابر تیکت‌ها ناچیز است
 class User(Base, UserMixin):
-    def __init__(self, username, password, role="customer"):
+    __slots__ = ("username", "password_hash", "role")
+
+    def __init__(self, username, password, role="customer", password_hash=None):
         super().__init__()
         self.username = username
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hash or passwords.hash_password(password)
         self.role = role
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
 
     def __repr__(self):
         return f"<User {self.username}>"
 
+# انجام‌دهنده رویدادهای خودکار (مثل تخصیص خودکار تیکت‌های جدید)؛ کاربر واقعی نیست و نمی‌تواند وارد شود.
+# در تاریخچه با شناسه 0 ثبت و با نام «سیستم» نمایش داده می‌شود
+SYSTEM_USER = User.__new__(User)
+SYSTEM_USER.id, SYSTEM_USER.created_ts = 0, 0.0
+SYSTEM_USER.username, SYSTEM_USER.password_hash, SYSTEM_USER.role = "سیستم", "!", "system"
+
 # تعریف Enum برای وضعیت‌های تیکت
 class TicketStatus(Enum):
     OPEN = "درحال بررسی"
@@ -37,11 +80,16 @@ class TicketStatus(Enum):
 
 # کلاس جدید برای دسته‌بندی‌های تیکت
 class Category(Base):
+    __slots__ = ("name",)
+
     def __init__(self, name):
         super().__init__()
         self.name = name
 
+# تاریخچه رویدادهای تیکت در audit نگه داشته می‌شود؛ روی خود تیکت فقط زمان آخرین رویداد (updated_ts) می‌ماند
 class Ticket(Base):
+    __slots__ = ("title", "content", "created_by", "category", "status", "assigned_to", "updated_ts", "replies")
+
     def __init__(self, title, content, created_by_user, category):
         super().__init__()
         self.title = title
@@ -50,7 +98,21 @@ class Ticket(Base):
         self.category = category  # اضافه کردن فیلد دسته‌بندی
         self.status = TicketStatus.OPEN
         self.assigned_to = None
-        self.logs = []
+        self.updated_ts = self.created_ts
+        self.replies = []
+
+    def __setstate__(self, state):
+        # snapshotهای قدیمی‌تر فهرست logs را روی تیکت داشتند (ر.ک. persistence.load)
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        logs = state.pop("logs", None)
+        super().__setstate__(state)
+        if logs is not None:
+            self.updated_ts = logs[-1].created_ts if logs else self.created_ts
+
+    @property
+    def updated_at(self):
+        return datetime.datetime.fromtimestamp(self.updated_ts)
 
     def assign_to(self, agent_user):
         if agent_user.role != "agent":
@@ -59,16 +121,30 @@ class Ticket(Base):
         self.status = TicketStatus.IN_PROGRESS
 
 class Reply(Base):
+    __slots__ = ("ticket", "user", "content")
+
     def __init__(self, ticket, user, content):
         super().__init__()
         self.ticket = ticket
         self.user = user
         self.content = content
 
+# عنوان عملیات از مجموعه کوچکی از رشته‌هاست؛ intern شدن آن باعث می‌شود رکوردهای بازخوانی‌شده
+# از ژورنال یا SQLite هم یک نسخه مشترک از هر رشته داشته باشند
 class LogEntry(Base):
+    __slots__ = ("ticket", "user", "_action", "details")
+
     def __init__(self, ticket, user, action, details=""):
         super().__init__()
         self.ticket = ticket
         self.user = user
         self.action = action
         self.details = details
+
+    @property
+    def action(self):
+        return self._action
+
+    @action.setter
+    def action(self, value):
+        self._action = sys.intern(value)
@@ -0,0 +1,69 @@
+# ticketing/app/passwords.py
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# پارامترهای هش رمز عبور؛ از app.config در init_app پر می‌شوند.
+# method همان قالب werkzeug است (مثلاً pbkdf2:sha256:600000 یا scrypt:32768:8:1)
+# و workers تعداد پروسه‌های بررسی رمز است (0 یعنی بررسی در همان نخ درخواست).
+SETTINGS = {"method": "pbkdf2:sha256:600000", "salt_length": 16, "workers": 2,
+            "prefix": "pbkdf2:sha256:600000"}
+
+# هش از پیش محاسبه‌شده رمز '123' برای کاربران اولیه، تا راه‌اندازی منتظر PBKDF2 نماند.
+# اگر تنظیمات هش متفاوت باشد، با اولین ورود هر کاربر هش تازه جایگزین می‌شود.
+SEED_PASSWORD_HASH = ("pbkdf2:sha256:600000$BSaUZMnSJp8eUtYY$"
+                      "7ad3c20ad61bb5168837474f4838ec6c747297ce73f08b6b3c8ae625806eea2e")
+
+# استخر پروسه برای هر پروسه gunicorn جداگانه و با تأخیر ساخته می‌شود (پس از fork)
+_pool = {"executor": None, "pid": None}
+_pool_lock = threading.Lock()
+
+
+def init_app(app):
+    SETTINGS["method"] = app.config["PASSWORD_HASH_METHOD"]
+    SETTINGS["salt_length"] = app.config["PASSWORD_SALT_LENGTH"]
+    SETTINGS["workers"] = app.config["PASSWORD_HASH_WORKERS"]
+    # werkzeug مقادیر پیش‌فرض را در خود هش می‌نویسد (pbkdf2 ← pbkdf2:sha256:600000)؛
+    # پیشوند واقعی یک بار محاسبه می‌شود تا مقایسه با هش‌های ذخیره‌شده دقیق باشد
+    SETTINGS["prefix"] = generate_password_hash("", SETTINGS["method"], 1).split("$", 1)[0]
+
+def hash_password(password):
+    return generate_password_hash(password, SETTINGS["method"], SETTINGS["salt_length"])
+
+def needs_rehash(password_hash):
+    method, _, rest = password_hash.partition("$")
+    salt = rest.partition("$")[0]
+    return method != SETTINGS["prefix"] or len(salt) != SETTINGS["salt_length"]
+
+def _executor():
+    # fork به‌جای spawn: spawn ماژول اصلی (run.py/wsgi) را دوباره import می‌کند و کل برنامه و ژورنال را بالا می‌آورد.
+    # پروسه‌های استخر فقط هش را بررسی می‌کنند و به قفل‌ها و داده‌های برنامه دست نمی‌زنند.
+    with _pool_lock:
+        if _pool["executor"] is None or _pool["pid"] != os.getpid():
+            _pool["executor"] = ProcessPoolExecutor(max_workers=SETTINGS["workers"],
+                                                    mp_context=multiprocessing.get_context("fork"))
+            _pool["pid"] = os.getpid()
+        return _pool["executor"]
+
+def start_pool():
+    # پروسه‌های استخر را پیش از راه افتادن نخ‌های کارگر می‌سازد (در post_fork در gunicorn)
+    if SETTINGS["workers"]:
+        _executor().submit(int).result()
+
+def verify_password(password_hash, password):
+    # بررسی رمز CPU سنگینی دارد؛ در استخر محدود اجرا می‌شود تا هجوم ورودها نخ‌های دیگر را گرسنه نگذارد
+    if not password_hash or password is None:
+        return False
+    if not SETTINGS["workers"]:
+        return check_password_hash(password_hash, password)
+    return _executor().submit(check_password_hash, password_hash, password).result()
+
+def hash_many(passwords):
+    # هش دسته‌ای برای ورود کاربران از فایل؛ هر رمز در یکی از پروسه‌های استخر محاسبه می‌شود
+    if not SETTINGS["workers"]:
+        return [hash_password(password) for password in passwords]
+    return list(_executor().map(generate_password_hash, passwords, [SETTINGS["method"]] * len(passwords),
+                                [SETTINGS["salt_length"]] * len(passwords)))
@@ -0,0 +1,432 @@
+# ticketing/app/persistence.py
+
+import atexit
+from bisect import insort
+import glob
+import json
+import os
+import pickle
+import threading
+import time
+
+from . import analytics, audit, coldstore
+from .models import Base, User, Ticket, Reply, LogEntry, Category, TicketStatus
+
+# ژورنال فقط-افزودنی تغییرات DB همراه با اسنپ‌شات‌های دوره‌ای.
+# اسنپ‌شات snapshot-N وضعیت DB را درست پیش از شروع ژورنال journal-N نگه می‌دارد؛
+# هنگام راه‌اندازی آخرین اسنپ‌شات بارگذاری و فقط ژورنال‌های بعد از آن بازپخش می‌شوند.
+
+SNAPSHOT_FORMAT_VERSION = 4
+
+# آمار آخرین بارگذاری هنگام راه‌اندازی (برای لاگ و مانیتورینگ)
+LOAD_STATS = {}
+
+# هر چند رکورد ژورنال یک اسنپ‌شات گرفته شود؛ با init_app از تنظیمات برنامه پر می‌شود
+SNAPSHOT_SETTINGS = {"every": 100000, "db": None}
+
+_journal = None
+
+
+class Journal:
+    def __init__(self, directory, segment, fsync_interval):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.records = 0
+        self.snapshot_pid = None
+        self.fork_point = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._open_segment(segment)
+        self.start_flusher()
+
+    def start_flusher(self):
+        # group commit: یک fsync برای همه رکوردهایی که در این بازه نوشته شده‌اند
+        if self.fsync_interval > 0:
+            flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+            flusher.start()
+
+    def _open_segment(self, segment):
+        self.segment = segment
+        self.file = open(_path(self.directory, "journal", segment), "a", encoding="utf-8")
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self.file.write(line + "\n")
+            self.records += 1
+            if self.fsync_interval > 0:
+                self._dirty = True
+            else:
+                self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._dirty = False
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if self._dirty:
+                    self._sync()
+
+    def rotate(self):
+        # ژورنال فعلی را می‌بندد و شماره بخش جدید را برمی‌گرداند
+        with self._lock:
+            self._sync()
+            self.file.close()
+            self._open_segment(self.segment + 1)
+            self.records = 0
+            return self.segment
+
+    def close(self):
+        with self._lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+
+def _path(directory, kind, segment):
+    extension = "pkl" if kind == "snapshot" else "log"
+    return os.path.join(directory, f"{kind}-{segment:06d}.{extension}")
+
+def _segments(directory, kind):
+    segments = []
+    for path in glob.glob(os.path.join(directory, f"{kind}-*")):
+        name = os.path.basename(path).split(".")[0]
+        if name.count("-") == 1 and name.split("-")[1].isdigit() and not path.endswith(".tmp"):
+            segments.append(int(name.split("-")[1]))
+    return sorted(segments)
+
+
+# --- ثبت تغییرات در ژورنال ---
+def record(*fields):
+    if _journal is None:
+        return
+    _journal.write(fields)
+    if _journal.records >= SNAPSHOT_SETTINGS["every"]:
+        snapshot()
+
+def record_user(user):
+    record("U", user.id, user.username, user.password_hash, user.role, user.created_ts)
+
+def record_user_deleted(user):
+    record("U-", user.id)
+
+def record_category(category):
+    record("C", category.id, category.name, category.created_ts)
+
+def record_category_deleted(category):
+    record("C-", category.id)
+
+def record_ticket(ticket):
+    record("T", ticket.id, ticket.title, ticket.content, ticket.created_by.id,
+           ticket.category.id if ticket.category else None, ticket.status.name,
+           ticket.assigned_to.id if ticket.assigned_to else None, ticket.created_ts)
+
+def record_reply(reply):
+    record("R", reply.id, reply.ticket.id, reply.user.id, reply.content, reply.created_ts)
+
+def record_archived(ticket):
+    record("A", ticket.id)
+
+def record_restored(ticket):
+    record("A-", ticket.id)
+
+def record_log(log):
+    record("L", log.id, log.ticket.id, log.user.id, log.action, log.details, log.created_ts)
+
+def record_rollups(rows):
+    # افزایش‌های آمار تحلیلی (ر.ک. analytics.apply)؛ پس از اعمال در ROLLUPS ثبت می‌شوند
+    if rows:
+        record("Y", rows)
+
+def record_rollups_rebuilt(rows):
+    # کل خلاصه‌های بازسازی‌شده؛ در بازپخش جای همه افزایش‌های پیشین را می‌گیرند
+    record("Y=", rows)
+
+
+# --- بازپخش ژورنال ---
+# نوع موجودیت هر رکورد ژورنال، برای ادامه دنباله شناسه‌ها پس از بازپخش
+RECORD_TYPES = {"U": User, "C": Category, "T": Ticket, "R": Reply, "L": LogEntry}
+
+def _new(cls, item_id, created_at):
+    # ساخت شیء بدون __init__ تا شناسه و زمان ایجاد از ژورنال حفظ شود
+    obj = cls.__new__(cls)
+    obj.id = item_id
+    obj.created_ts = created_at
+    return obj
+
+def _resolve(refs, item_id, current):
+    # کاربر/دسته‌بندی حذف‌شده ممکن است هنوز از تیکت ارجاع داده شود
+    if item_id is None:
+        return None
+    if current is not None and current.id == item_id:
+        return current
+    return refs.get(item_id)
+
+def _apply(db, refs, entry):
+    kind = entry[0]
+    if kind == "U":
+        _, user_id, username, password_hash, role, created_at = entry
+        user = refs["users"].get(user_id)
+        if user is None:
+            user = refs["users"][user_id] = _new(User, user_id, created_at)
+            db["users"].append(user)
+        user.username, user.password_hash, user.role = username, password_hash, role
+    elif kind == "U-":
+        user = refs["users"].get(entry[1])
+        if user in db["users"]:
+            db["users"].remove(user)
+    elif kind == "C":
+        _, category_id, name, created_at = entry
+        category = refs["categories"].get(category_id)
+        if category is None:
+            category = refs["categories"][category_id] = _new(Category, category_id, created_at)
+            db["categories"].append(category)
+        category.name = name
+    elif kind == "C-":
+        category = refs["categories"].get(entry[1])
+        if category in db["categories"]:
+            db["categories"].remove(category)
+    elif kind == "T":
+        _, ticket_id, title, content, creator_id, category_id, status, assignee_id, created_at = entry
+        ticket = refs["tickets"].get(ticket_id)
+        if ticket is None:
+            ticket = refs["tickets"][ticket_id] = _new(Ticket, ticket_id, created_at)
+            ticket.created_by = ticket.category = ticket.assigned_to = None
+            ticket.updated_ts, ticket.replies = created_at, []
+            db["tickets"].append(ticket)
+        ticket.title, ticket.content = title, content
+        ticket.created_by = _resolve(refs["users"], creator_id, ticket.created_by)
+        ticket.category = _resolve(refs["categories"], category_id, ticket.category)
+        ticket.assigned_to = _resolve(refs["users"], assignee_id, ticket.assigned_to)
+        ticket.status = TicketStatus[status]
+    elif kind == "R":
+        _, reply_id, ticket_id, user_id, content, created_at = entry
+        if reply_id <= refs["last_reply"]:
+            # رکوردی که پس از چرخش ژورنال نوشته شده ولی خودش در اسنپ‌شات هست (اسنپ‌شات وسط یک عملیات)
+            return kind, reply_id
+        refs["last_reply"] = reply_id
+        reply = _new(Reply, reply_id, created_at)
+        reply.ticket, reply.user, reply.content = refs["tickets"][ticket_id], refs["users"][user_id], content
+        reply.ticket.replies.append(reply)
+        db["replies"].append(reply)
+    elif kind == "L":
+        _, log_id, ticket_id, user_id, action, details, created_at = entry
+        if log_id <= refs["last_log"]:
+            return kind, log_id
+        refs["last_log"] = log_id
+        audit.append(log_id, created_at, ticket_id, user_id, action, details)
+        refs["tickets"][ticket_id].updated_ts = created_at
+    elif kind == "Y":
+        analytics.apply(entry[1])
+        refs["rollups"] += 1
+        return None
+    elif kind == "Y=":
+        analytics.ROLLUPS.clear()
+        analytics.apply(entry[1])
+        refs["rollups"] += 1
+        refs["rollups_rebuilt"] = True
+        return None
+    elif kind == "A":
+        # تیکت به لایه سرد منتقل شده؛ حذف از لیست‌های db در پایان load یک‌جا انجام می‌شود
+        refs["archived"].add(entry[1])
+        return "T", entry[1]
+    elif kind == "A-":
+        ticket_id = entry[1]
+        if ticket_id in refs["archived"]:
+            refs["archived"].discard(ticket_id)
+        else:
+            ticket = coldstore.unpack(coldstore.read(ticket_id), refs["users"], refs["categories"])
+            refs["tickets"][ticket_id] = ticket
+            insort(db["tickets"], ticket, key=lambda t: t.id)
+            for reply in ticket.replies:
+                insort(db["replies"], reply, key=lambda r: r.id)
+        return "T", ticket_id
+    return kind[0], entry[1]
+
+def _references(db):
+    refs = {
+        "users": {u.id: u for u in db["users"]},
+        "categories": {c.id: c for c in db["categories"]},
+        "tickets": {t.id: t for t in db["tickets"]},
+        "archived": set(),
+        "rollups": 0,
+        "rollups_rebuilt": False,
+        # پاسخ‌ها و لاگ‌ها به ترتیب شناسه ثبت می‌شوند، پس رکورد با شناسه‌ای نه بزرگ‌تر از این‌ها تکراری است
+        "last_reply": max((r.id for r in db["replies"]), default=0),
+        "last_log": audit.last_id(),
+    }
+    # کاربران حذف‌شده‌ای که هنوز در تیکت‌ها ارجاع دارند هم باید قابل یافتن باشند
+    for ticket in db["tickets"]:
+        for user in (ticket.created_by, ticket.assigned_to):
+            if user is not None:
+                refs["users"].setdefault(user.id, user)
+    return refs
+
+def _replay(db, refs, path):
+    count, max_ids = 0, {}
+    with open(path, encoding="utf-8") as journal_file:
+        for line in journal_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # رکورد نیمه‌کاره در انتهای ژورنال پس از خاموشی ناگهانی
+                break
+            applied = _apply(db, refs, entry)
+            if applied is not None:
+                kind, item_id = applied
+                max_ids[kind] = max(max_ids.get(kind, 0), item_id)
+            count += 1
+    return count, max_ids
+
+
+# --- اسنپ‌شات ---
+def _write_snapshot(directory, segment, db, id_counters):
+    path = _path(directory, "snapshot", segment)
+    with open(path + ".tmp", "wb") as snapshot_file:
+        pickle.dump({"version": SNAPSHOT_FORMAT_VERSION, "id_counters": id_counters, "db": db, "audit": audit.state(),
+                     "analytics": analytics.state()}, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(path + ".tmp", path)
+    # اسنپ‌شات‌ها و ژورنال‌های قدیمی‌تر دیگر لازم نیستند
+    for kind in ("snapshot", "journal"):
+        for old in _segments(directory, kind):
+            if old < segment:
+                os.remove(_path(directory, kind, old))
+
+def snapshot():
+    # مثل BGSAVE در Redis: فرزند fork شده از حافظه copy-on-write اسنپ‌شات می‌گیرد
+    # و پروسه اصلی بدون توقف به ژورنال جدید ادامه می‌دهد
+    journal = _journal
+    if journal.snapshot_pid is not None:
+        pid, _ = os.waitpid(journal.snapshot_pid, os.WNOHANG)
+        if pid == 0:
+            return
+        journal.snapshot_pid = None
+    segment = journal.rotate()
+    db = SNAPSHOT_SETTINGS["db"]
+    if not hasattr(os, "fork"):
+        _write_snapshot(journal.directory, segment, db, dict(Base._id_counters))
+        return
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _write_snapshot(journal.directory, segment, db, dict(Base._id_counters))
+        finally:
+            os._exit(0)
+    journal.snapshot_pid = pid
+
+def save_snapshot():
+    # اسنپ‌شات خارج از نوبت تا بازپخش بعدی کوتاه بماند (مثلاً پس از رکورد بزرگ Y=)؛ اگر اسنپ‌شات قبلی هنوز
+    # در حال نوشتن باشد انجام نمی‌شود، پس هر تغییری باید پیش از آن در ژورنال ثبت شده باشد
+    if _journal is not None:
+        snapshot()
+
+
+def load(directory, db):
+    started = time.perf_counter()
+    snapshots = _segments(directory, "snapshot")
+    base = snapshots[-1] if snapshots else 0
+    id_counters = {}
+    for key in db:
+        db[key] = []
+    audit.clear()
+    analytics.ROLLUPS.clear()
+    rollups_saved = False
+    if snapshots:
+        with open(_path(directory, "snapshot", base), "rb") as snapshot_file:
+            data = pickle.load(snapshot_file)
+        db.clear()
+        db.update(data["db"])
+        if data["version"] == 1:
+            # نسخه قدیمی یک شمارنده مشترک برای همه موجودیت‌ها داشت
+            id_counters = {cls.__name__: data["id_counter"] for cls in RECORD_TYPES.values()}
+        else:
+            id_counters = data["id_counters"]
+        if "audit" in data:
+            audit.restore(data["audit"])
+        else:
+            # تا نسخه ۲ تاریخچه در db["logs"] و روی هر تیکت نگه داشته می‌شد
+            for log in db.pop("logs", []):
+                audit.append(log.id, log.created_ts, log.ticket.id, log.user.id, log.action, log.details)
+        if "analytics" in data:
+            analytics.restore(data["analytics"])
+            rollups_saved = True
+    snapshot_seconds = time.perf_counter() - started
+    replayed = 0
+    journals = [s for s in _segments(directory, "journal") if s >= base]
+    refs = _references(db)
+    for segment in journals:
+        count, max_ids = _replay(db, refs, _path(directory, "journal", segment))
+        replayed += count
+        for kind, max_id in max_ids.items():
+            name = RECORD_TYPES[kind].__name__
+            id_counters[name] = max(id_counters.get(name, 0), max_id)
+    if refs["archived"]:
+        db["tickets"] = [t for t in db["tickets"] if t.id not in refs["archived"]]
+        db["replies"] = [r for r in db["replies"] if r.ticket.id not in refs["archived"]]
+    for cls in RECORD_TYPES.values():
+        cls.reserve_ids(id_counters.get(cls.__name__, 0))
+    audit.prune()
+    LOAD_STATS.update(
+        # اسنپ‌شات تا نسخه ۳ و ژورنال‌های پیش از آن خلاصه‌های آمار تحلیلی را ندارند (ر.ک. services.rebuild_derived_state)
+        # مگر این‌که پس از آن‌ها خلاصه‌های بازسازی‌شده (Y=) ثبت شده باشد
+        rollups_missing=not refs["rollups_rebuilt"] and (
+            not rollups_saved if snapshots else bool(db["tickets"]) and not refs["rollups"]),
+        snapshot_segment=base,
+        snapshot_seconds=snapshot_seconds,
+        replayed_records=replayed,
+        total_seconds=time.perf_counter() - started,
+    )
+    return max([base] + journals)
+
+def init_app(app, db):
+    global _journal
+    directory = app.config.get("DATA_DIR")
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    last_segment = load(directory, db)
+    app.logger.info(
+        "DB loaded in %.2fs (snapshot %.2fs, %d journal records replayed)",
+        LOAD_STATS["total_seconds"], LOAD_STATS["snapshot_seconds"], LOAD_STATS["replayed_records"],
+    )
+    SNAPSHOT_SETTINGS.update(every=app.config["SNAPSHOT_EVERY"], db=db)
+    # همیشه یک بخش تازه باز می‌کنیم تا به انتهای ژورنالی که ممکن است ناقص باشد چیزی اضافه نشود
+    _journal = Journal(directory, last_segment + 1, app.config["JOURNAL_FSYNC_INTERVAL"])
+    atexit.register(_journal.close)
+    if LOAD_STATS["replayed_records"] >= SNAPSHOT_SETTINGS["every"]:
+        # زمان راه‌اندازی بعدی را محدود نگه می‌داریم
+        snapshot()
+
+def before_fork():
+    # بافر ژورنال باید پیش از fork خالی شود وگرنه پروسه فرزند هم همان رکوردها را دوباره می‌نویسد.
+    # نقطه fork فقط بار اول ثبت می‌شود: master پس از آن چیزی نمی‌نویسد و حافظه‌اش در همین نقطه می‌ماند
+    if _journal is not None:
+        with _journal._lock:
+            _journal._sync()
+            if _journal.fork_point is None:
+                _journal.fork_point = (_journal.segment, os.path.getsize(_journal.file.name))
+
+def after_fork(on_reload):
+    # هر کارگر gunicorn بخش ژورنال و نخ fsync خودش را دارد (نخ‌ها در fork کپی نمی‌شوند)
+    if _journal is None:
+        return
+    _journal._lock = threading.Lock()
+    _journal.file.close()
+    segment, size = _journal.fork_point
+    path = _path(_journal.directory, "journal", segment)
+    last_segment = max(_segments(_journal.directory, "journal") + [segment])
+    if last_segment != segment or not os.path.exists(path) or os.path.getsize(path) != size:
+        # کارگر قبلی پس از fork تغییراتی ثبت کرده و حافظه master کهنه است؛ از دیسک بارگذاری می‌کنیم
+        # (لایه سرد پیش از ژورنال، چون بازپخش ممکن است تیکتی را که آن کارگر بایگانی کرده برگرداند)
+        coldstore.rescan()
+        last_segment = load(_journal.directory, SNAPSHOT_SETTINGS["db"])
+        on_reload()
+    _journal._open_segment(last_segment + 1)
+    _journal.records = 0
+    _journal.start_flusher()
@@ -0,0 +1,205 @@
+# ticketing/app/repository.py
+
+from bisect import bisect_left
+from collections import defaultdict
+import itertools
+
+from .models import TicketStatus
+
+# ایندکس‌های درون‌حافظه‌ای روی DB برای جستجوی O(1) به جای پیمایش لیست‌ها
+# ایندکس‌های ثانویه، لیست مرتب‌شده‌ای از شناسه‌ها برای هر کلید نگه می‌دارند
+INDEX = {
+    "users_by_id": {},
+    "users_by_username": {},
+    "users_by_role": defaultdict(list),
+    "categories_by_id": {},
+    "categories_by_name": {},
+    "tickets_by_id": {},
+    "tickets_by_creator": defaultdict(list),
+    "tickets_by_assignee": defaultdict(list),
+    "tickets_by_status": defaultdict(list),
+    "tickets_by_category": defaultdict(list),
+    "tickets_active": defaultdict(list),    # فقط کلید True: همه تیکت‌های حذف‌نشده
+    # جفت‌های (ترتیب به‌روزرسانی، شناسه تیکت) به ترتیب آخرین به‌روزرسانی؛
+    # ورودی‌های قدیمی هر تیکت تنبل حذف می‌شوند (ر.ک. touch_ticket)
+    "tickets_by_update": [],
+}
+
+# آخرین کلیدهای ایندکس‌شده هر موجودیت؛ برای پیدا کردن تغییرات هنگام به‌روزرسانی
+_user_keys = {}
+_category_keys = {}
+_ticket_keys = {}
+_update_seq = {}
+_update_counter = itertools.count(1)
+
+TICKET_SECONDARY_INDEXES = (
+    "tickets_by_creator", "tickets_by_assignee", "tickets_by_status", "tickets_by_category", "tickets_active",
+)
+
+
+# --- توابع کمکی لیست‌های مرتب ---
+def _sorted_add(ids, item_id):
+    # شناسه‌ها صعودی ساخته می‌شوند، پس در حالت عادی فقط به انتها اضافه می‌کنیم
+    if not ids or ids[-1] < item_id:
+        ids.append(item_id)
+        return
+    pos = bisect_left(ids, item_id)
+    if pos == len(ids) or ids[pos] != item_id:
+        ids.insert(pos, item_id)
+
+def _sorted_remove(ids, item_id):
+    pos = bisect_left(ids, item_id)
+    if pos < len(ids) and ids[pos] == item_id:
+        del ids[pos]
+
+def _move(index_name, old_key, new_key, item_id):
+    if old_key == new_key:
+        return
+    index = INDEX[index_name]
+    if old_key is not None:
+        bucket = index.get(old_key)
+        if bucket is not None:
+            _sorted_remove(bucket, item_id)
+            if not bucket:
+                del index[old_key]
+    if new_key is not None:
+        _sorted_add(index[new_key], item_id)
+
+
+# --- کاربران ---
+def index_user(user):
+    INDEX["users_by_id"][user.id] = user
+    reindex_user(user)
+
+def reindex_user(user):
+    old_username, old_role = _user_keys.get(user.id, (None, None))
+    if old_username != user.username:
+        if old_username is not None and INDEX["users_by_username"].get(old_username) is user:
+            del INDEX["users_by_username"][old_username]
+        INDEX["users_by_username"][user.username] = user
+    _move("users_by_role", old_role, user.role, user.id)
+    _user_keys[user.id] = (user.username, user.role)
+
+def unindex_user(user):
+    username, role = _user_keys.pop(user.id, (user.username, user.role))
+    INDEX["users_by_id"].pop(user.id, None)
+    if INDEX["users_by_username"].get(username) is user:
+        del INDEX["users_by_username"][username]
+    _move("users_by_role", role, None, user.id)
+
+def users_with_role(role):
+    users_by_id = INDEX["users_by_id"]
+    return [users_by_id[i] for i in INDEX["users_by_role"].get(role, ())]
+
+
+# --- دسته‌بندی‌ها ---
+def index_category(category):
+    INDEX["categories_by_id"][category.id] = category
+    reindex_category(category)
+
+def reindex_category(category):
+    old_name = _category_keys.get(category.id)
+    if old_name != category.name:
+        if old_name is not None and INDEX["categories_by_name"].get(old_name) is category:
+            del INDEX["categories_by_name"][old_name]
+        INDEX["categories_by_name"][category.name] = category
+    _category_keys[category.id] = category.name
+
+def unindex_category(category):
+    name = _category_keys.pop(category.id, category.name)
+    INDEX["categories_by_id"].pop(category.id, None)
+    if INDEX["categories_by_name"].get(name) is category:
+        del INDEX["categories_by_name"][name]
+
+
+# --- تیکت‌ها ---
+def _ticket_index_keys(ticket):
+    return (
+        ticket.created_by.id,
+        ticket.assigned_to.id if ticket.assigned_to else None,
+        ticket.status,
+        ticket.category.id if ticket.category else None,
+        True if ticket.status != TicketStatus.DELETED else None,
+    )
+
+def index_ticket(ticket):
+    INDEX["tickets_by_id"][ticket.id] = ticket
+    return reindex_ticket(ticket)
+
+def reindex_ticket(ticket):
+    # کلیدهای قبلی را برمی‌گرداند تا فراخواننده بتواند تغییرات را ببیند
+    old_keys = _ticket_keys.get(ticket.id, (None,) * len(TICKET_SECONDARY_INDEXES))
+    new_keys = _ticket_index_keys(ticket)
+    for index_name, old_key, new_key in zip(TICKET_SECONDARY_INDEXES, old_keys, new_keys):
+        _move(index_name, old_key, new_key, ticket.id)
+    _ticket_keys[ticket.id] = new_keys
+    return old_keys
+
+def unindex_ticket(ticket):
+    old_keys = _ticket_keys.pop(ticket.id, None)
+    INDEX["tickets_by_id"].pop(ticket.id, None)
+    _update_seq.pop(ticket.id, None)
+    if old_keys:
+        for index_name, old_key in zip(TICKET_SECONDARY_INDEXES, old_keys):
+            _move(index_name, old_key, None, ticket.id)
+    return old_keys
+
+def touch_ticket(ticket):
+    # تیکت را به انتهای ترتیب «آخرین به‌روزرسانی» منتقل می‌کند (O(1) سرشکن)
+    by_update = INDEX["tickets_by_update"]
+    seq = next(_update_counter)
+    _update_seq[ticket.id] = seq
+    by_update.append((seq, ticket.id))
+    if len(by_update) > 2 * len(_update_seq) + 1024:
+        _compact_update_index()
+
+def _compact_update_index():
+    INDEX["tickets_by_update"] = [(seq, tid) for seq, tid in INDEX["tickets_by_update"] if _update_seq.get(tid) == seq]
+
+def update_seq(ticket_id):
+    return _update_seq.get(ticket_id)
+
+def iter_updated(before=None, after=None, descending=True):
+    # (seq, id) تیکت‌ها را به ترتیب آخرین به‌روزرسانی، از بعد از نشانگر داده‌شده برمی‌گرداند
+    by_update = INDEX["tickets_by_update"]
+    if descending:
+        end = len(by_update) if before is None else bisect_left(by_update, (before,))
+        entries = (by_update[i] for i in range(end - 1, -1, -1))
+    else:
+        start = 0 if after is None else bisect_left(by_update, (after + 1,))
+        entries = (by_update[i] for i in range(start, len(by_update)))
+    for seq, tid in entries:
+        if _update_seq.get(tid) == seq:
+            yield seq, tid
+
+def indexed_keys(ticket_id):
+    return _ticket_keys[ticket_id]
+
+def ticket_ids_by(index_name, key):
+    return INDEX[index_name].get(key, [])
+
+def tickets_by(index_name, key):
+    tickets_by_id = INDEX["tickets_by_id"]
+    return [tickets_by_id[i] for i in ticket_ids_by(index_name, key)]
+
+
+# --- ساخت مجدد کامل ایندکس‌ها (مثلاً پس از بارگذاری داده) ---
+def clear_indexes():
+    for index in INDEX.values():
+        index.clear()
+    _user_keys.clear()
+    _category_keys.clear()
+    _ticket_keys.clear()
+    _update_seq.clear()
+    INDEX["tickets_by_update"] = []
+
+def rebuild_indexes(db):
+    clear_indexes()
+    for user in db["users"]:
+        index_user(user)
+    for category in db["categories"]:
+        index_category(category)
+    for ticket in db["tickets"]:
+        index_ticket(ticket)
+    for ticket in sorted(db["tickets"], key=lambda t: t.updated_ts):
+        touch_ticket(ticket)
@@ -1,10 +1,15 @@
 # ticketing/app/routes.py
 
-from flask import render_template, request, redirect, url_for, abort, flash
+from flask import render_template, request, redirect, url_for, abort, flash, make_response, session, Response, stream_with_context
+from markupsafe import Markup
+from . import analytics, cache, events, metrics, transfer
 from flask_login import login_user, logout_user, login_required, current_user
 from app import app
 from .services import *
 from .models import User, TicketStatus
+from datetime import date, datetime, timedelta, timezone
+import hmac
+import json
 
 # --- روت‌های احراز هویت ---
 @app.route('/login', methods=['GET', 'POST'])
@@ -12,8 +17,8 @@ def login():
     if current_user.is_authenticated:
         return redirect(url_for('list_tickets'))
     if request.method == 'POST':
-        user = get_user_by_username(request.form.get('username'))
-        if user and user.check_password(request.form.get('password')):
+        user = authenticate_user(request.form.get('username'), request.form.get('password'))
+        if user:
             login_user(user, remember=request.form.get('remember'))
             flash('شما با موفقیت وارد شدید.', 'success')
             return redirect(url_for('list_tickets'))
@@ -27,13 +32,101 @@ def logout():
     flash('شما با موفقیت خارج شدید.', 'info')
     return redirect(url_for('login'))
 
+# --- پاسخ شرطی (ETag / Last-Modified) و کش قطعه‌های رندرشده (ر.ک. cache.py) ---
+# نسخه‌ها همیشه پیش از خواندن داده‌ها گرفته می‌شوند تا صفحه یا قطعه‌ای که با آن‌ها نشانه می‌خورد کهنه‌تر از نسخه نباشد
+def _conditional(versions, render, *extra):
+    # ETag از نسخه موجودیت‌های صفحه، کاربر بیننده (نام و نقش او در نوار بالا دیده می‌شود) و آدرس کامل ساخته می‌شود؛
+    # اگر مرورگر همین نسخه را داشته باشد 304 برمی‌گردد و صفحه اصلاً رندر نمی‌شود.
+    # پیام‌های flash فقط یک بار نمایش داده می‌شوند، پس وقتی در صف هستند پاسخ کامل فرستاده می‌شود
+    tag = cache.etag(request.full_path, current_user.id, current_user.role,
+                     sorted((key, version) for key, (version, _) in versions.items()), *extra)
+    modified = datetime.fromtimestamp(int(max(ts for _, ts in versions.values())), timezone.utc)
+    fresh = False
+    if request.method in ['GET', 'HEAD'] and '_flashes' not in session:
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(tag)
+        elif request.if_modified_since:
+            fresh = modified <= request.if_modified_since
+    response = make_response('', 304) if fresh else make_response(render())
+    response.set_etag(tag, weak=True)
+    response.last_modified = modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _ticket_rows(template, tickets, versions):
+    # هر ردیف با نسخه تیکت خودش کش می‌شود؛ ردیف تیکتی که پس از خواندن نسخه فهرست تغییر کرده
+    # ممکن است داده قدیمی‌تر از نسخه‌اش داشته باشد و کش نمی‌شود
+    row_versions = get_versions([cache.ticket_key(ticket.id) for ticket in tickets])
+    rows = []
+    for ticket in tickets:
+        key = cache.ticket_key(ticket.id)
+        render = lambda ticket=ticket: Markup(render_template(template, ticket=ticket))
+        if row_versions[key][0] > versions[cache.TICKETS][0]:
+            rows.append(render())
+        else:
+            rows.append(cache.fragment((template, ticket.id, current_user.role),
+                                       {key: row_versions[key], cache.DIRECTORY: versions[cache.DIRECTORY]}, render))
+    return rows
+
+def _thread(ticket, kind, before, versions):
+    # صفحه‌ای از پاسخ‌ها یا تاریخچه تیکت به صورت HTML، همراه با نشانگر صفحه قدیمی‌تر
+    def render():
+        page_size = app.config['THREAD_PAGE_SIZE']
+        if kind == 'replies':
+            items, cursor = get_replies_page(ticket, before, page_size)
+            return Markup(render_template('partials/reply_items.html', replies=items)), cursor
+        items, cursor = get_logs_page(ticket, before, page_size)
+        return Markup(render_template('partials/log_items.html', logs=items)), cursor
+    return cache.fragment((kind, ticket.id, before, current_user.role), versions, render)
+
 # --- روت‌های اصلی تیکتینگ ---
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+def _ticket_page(template, row_template, title):
+    # فیلتر، مرتب‌سازی و صفحه‌بندی فهرست تیکت‌ها از روی پارامترهای query string
+    versions = get_versions([cache.TICKETS, cache.DIRECTORY])
+    return _conditional(versions, lambda: _render_ticket_page(template, row_template, title, versions))
+
+def _render_ticket_page(template, row_template, title, versions):
+    args = request.args
+    created_to = _parse_date(args.get('to'))
+    query = dict(
+        status=TicketStatus.__members__.get(args.get('status', '')),
+        category_id=args.get('category', type=int),
+        assignee_id=args.get('assignee', type=int),
+        created_from=_parse_date(args.get('from')),
+        created_to=created_to + timedelta(days=1) if created_to else None,
+        sort=args.get('sort') if args.get('sort') in TICKET_SORTS else 'id',
+        descending=args.get('order') != 'asc',
+        cursor=args.get('cursor', type=int),
+        limit=max(1, min(args.get('limit', app.config['TICKETS_PAGE_SIZE'], type=int), 100)),
+    )
+    tickets, next_cursor = [], None
+    creator = get_user_by_username(args['creator']) if args.get('creator') else None
+    if not args.get('creator') or creator:
+        tickets, next_cursor = query_tickets(current_user, creator_id=creator.id if creator else None, **query)
+    params = {k: v for k, v in args.items() if k != 'cursor'}
+    next_url = url_for(request.endpoint, cursor=next_cursor, **params) if next_cursor else None
+    first_url = url_for(request.endpoint, **params) if 'cursor' in args else None
+    return render_template(template, rows=_ticket_rows(row_template, tickets, versions), next_url=next_url, first_url=first_url, filters=args, statuses=TicketStatus,
+                           categories=get_all_categories(), agents=get_all_agents(), title=title)
+
 @app.route('/')
 @app.route('/tickets')
 @login_required
 def list_tickets():
-    user_tickets = get_tickets_for_user(current_user)
-    return render_template('tickets.html', tickets=user_tickets, title="لیست تیکت‌ها")
+    return _ticket_page('tickets.html', 'partials/ticket_row.html', "لیست تیکت‌ها")
+
+@app.route('/search')
+@login_required
+def search_page():
+    query = request.args.get('q', '').strip()
+    tickets, truncated = search_tickets(current_user, query, app.config['SEARCH_RESULTS']) if query else ([], False)
+    return render_template('search.html', title="جستجو", query=query, tickets=tickets, truncated=truncated)
 
 # روت اختصاصی برای کارشناسان
 @app.route('/agent/tickets')
@@ -41,8 +134,7 @@ def list_tickets():
 def agent_tickets():
     if current_user.role != 'agent':
         abort(403)
-    assigned_tickets = get_tickets_for_user(current_user)
-    return render_template('agent_dashboard.html', tickets=assigned_tickets, title="تیکت‌های اختصاصی من")
+    return _ticket_page('agent_dashboard.html', 'partials/agent_ticket_row.html', "تیکت‌های اختصاصی من")
 
 
 @app.route('/ticket/new', methods=['GET', 'POST'])
@@ -66,17 +158,70 @@ def create_ticket():
 @app.route('/ticket/<int:ticket_id>', methods=['GET', 'POST'])
 @login_required
 def ticket_detail(ticket_id):
+    versions = get_versions([cache.ticket_key(ticket_id), cache.DIRECTORY])
     ticket = get_ticket_by_id(ticket_id)
-    if not ticket or ticket not in get_tickets_for_user(current_user):
+    if not ticket or not can_view_ticket(current_user, ticket):
         abort(404)
     if request.method == 'POST':
         reply_content = request.form.get('reply_content')
         if reply_content:
             add_reply_to_ticket(ticket, current_user, reply_content)
             return redirect(url_for('ticket_detail', ticket_id=ticket.id))
-    replies = get_replies_for_ticket(ticket_id)
-    agents = get_all_agents() if current_user.role in ['admin', 'supervisor'] else None
-    return render_template('ticket_detail.html', ticket=ticket, replies=replies, agents=agents, title=ticket.title)
+
+    def render():
+        replies_html, replies_cursor = _thread(ticket, 'replies', request.args.get('replies_before', type=int), versions)
+        logs_html, logs_cursor = _thread(ticket, 'logs', request.args.get('logs_before', type=int), versions)
+        agents = get_all_agents() if current_user.role in ['admin', 'supervisor'] else None
+        return render_template('ticket_detail.html', ticket=ticket, replies_html=replies_html, replies_cursor=replies_cursor,
+                               logs_html=logs_html, logs_cursor=logs_cursor, agents=agents, title=ticket.title,
+                               archived=is_archived(ticket))
+    return _conditional(versions, render)
+
+# روت‌های بارگذاری تدریجی رشته پاسخ‌ها و تاریخچه (فقط HTML قطعه‌ی صفحه قدیمی‌تر)
+def _thread_fragment(ticket_id, kind):
+    versions = get_versions([cache.ticket_key(ticket_id), cache.DIRECTORY])
+    ticket = get_ticket_by_id(ticket_id)
+    if not ticket or not can_view_ticket(current_user, ticket):
+        abort(404)
+
+    def render():
+        html, cursor = _thread(ticket, kind, request.args.get('before', type=int), versions)
+        response = make_response(html)
+        if cursor:
+            response.headers['X-Next-Cursor'] = str(cursor)
+        return response
+    return _conditional(versions, render)
+
+@app.route('/ticket/<int:ticket_id>/replies')
+@login_required
+def ticket_replies(ticket_id):
+    return _thread_fragment(ticket_id, 'replies')
+
+@app.route('/ticket/<int:ticket_id>/logs')
+@login_required
+def ticket_logs(ticket_id):
+    return _thread_fragment(ticket_id, 'logs')
+
+# جریان رویدادهای زنده (Server-Sent Events) برای صفحه تیکت (?ticket=<id>) و فهرست تیکت‌های کارشناس؛
+# فقط رویدادهای تیکت‌هایی که کاربر اجازه دیدنشان را دارد فرستاده می‌شوند (ر.ک. events.py)
+@app.route('/events')
+@login_required
+def event_stream():
+    ticket_id = request.args.get('ticket', type=int)
+    if ticket_id is not None:
+        ticket = get_ticket_by_id(ticket_id)
+        if not ticket or not can_view_ticket(current_user, ticket):
+            abort(404)
+    stream = events.open_stream(current_user.id, current_user.role, ticket_id,
+                                request.headers.get('Last-Event-ID', type=int))
+    if stream is None:
+        response = make_response('', 503)
+        response.headers['Retry-After'] = '30'
+        return response
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/ticket/<int:ticket_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -124,21 +269,101 @@ def close_ticket_route(ticket_id):
         abort(404)
     if ticket.created_by != current_user and current_user.role not in ['admin', 'supervisor', 'agent']:
         abort(403)
-    if ticket.status != 'closed':
-        ticket.status = 'closed'
-        add_log_to_ticket(ticket, current_user, 'بستن تیکت')
+    if close_ticket(ticket, current_user):
         flash('تیکت با موفقیت بسته شد.', 'success')
     else:
         flash('این تیکت قبلاً بسته شده است.', 'info')
     return redirect(url_for('ticket_detail', ticket_id=ticket.id))
 
+@app.route('/tickets/bulk', methods=['POST'])
+@login_required
+def bulk_tickets():
+    # یک عملیات برای چند تیکت: از فرم فهرست تیکت‌ها (چند فیلد ticket_ids) یا با بدنه JSON
+    # {"ticket_ids": [...], "action": ..., "agent_id": ..., "category_id": ...}؛ پاسخ JSON نتیجه هر شناسه است
+    data = request.get_json(silent=True) if request.is_json else request.form
+    if data is None:
+        abort(400)
+    try:
+        raw_ids = data.get('ticket_ids') if request.is_json else data.getlist('ticket_ids')
+        ticket_ids = [int(ticket_id) for ticket_id in raw_ids or []]
+        agent_id, category_id = data.get('agent_id'), data.get('category_id')
+        agent = get_user_by_id(int(agent_id)) if agent_id else None
+        category = get_category_by_id(int(category_id)) if category_id else None
+    except (TypeError, ValueError):
+        abort(400)
+    if len(ticket_ids) > app.config['BULK_MAX_TICKETS']:
+        abort(413)
+    try:
+        results = bulk_update_tickets(ticket_ids, data.get('action'), current_user, agent=agent, category=category)
+    except PermissionError:
+        abort(403)
+    except ValueError as e:
+        if request.is_json:
+            return {"error": str(e)}, 400
+        flash(str(e), 'danger')
+        return redirect(url_for('list_tickets'))
+    counts = {}
+    for result in results.values():
+        counts[result] = counts.get(result, 0) + 1
+    if request.is_json:
+        return {"action": data.get('action'), "counts": counts, "results": results}
+    flash(f"{counts.get('updated', 0)} تیکت تغییر کرد، {counts.get('unchanged', 0)} تیکت از قبل در همین وضعیت بود و "
+          f"{counts.get('not_found', 0) + counts.get('forbidden', 0)} تیکت پیدا نشد یا در دسترس نبود.", 'info')
+    return redirect(url_for('list_tickets'))
+
 # --- روت‌های مدیریت و مانیتورینگ ---
+def _metrics_token_ok():
+    expected = app.config['METRICS_TOKEN']
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(expected) and scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(), expected.encode())
+
+@app.route('/metrics')
+def metrics_page():
+    # خروجی متنی Prometheus؛ برای scraper با توکن یا مدیر وارد شده
+    allowed = _metrics_token_ok() or request.remote_addr in app.config['METRICS_ALLOW']
+    if not allowed and not (current_user.is_authenticated and current_user.role in ['admin', 'supervisor']):
+        abort(403)
+    response = make_response(metrics.render(store_sizes()))
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
     if current_user.role not in ['admin', 'supervisor']: abort(403)
-    stats = get_dashboard_stats()
-    return render_template('dashboard.html', title="داشبورد مانیتورینگ", stats=stats)
+    # «تیکت‌های جدید امروز» با عوض شدن روز تغییر می‌کند، پس تاریخ هم جزء کلید است
+    versions = get_versions([cache.TICKETS, cache.DIRECTORY])
+    today = date.today()
+
+    def render():
+        cards = cache.fragment(('dashboard_cards', today, current_user.role), versions,
+                               lambda: Markup(render_template('partials/dashboard_cards.html', stats=get_dashboard_stats())))
+        return render_template('dashboard.html', title="داشبورد مانیتورینگ", cards=cards)
+    return _conditional(versions, render, today)
+
+def _analytics_range(args):
+    # بازه گزارش از پارامترهای from/to (YYYY-MM-DD)؛ پیش‌فرض ANALYTICS_DEFAULT_DAYS روز اخیر، حداکثر یک سال
+    end = _parse_date(args.get('to'))
+    end = end.date() if end else date.today()
+    start = _parse_date(args.get('from'))
+    start = start.date() if start else end - timedelta(days=app.config['ANALYTICS_DEFAULT_DAYS'] - 1)
+    return max(min(start, end), end - timedelta(days=365)), end
+
+@app.route('/analytics')
+@login_required
+def analytics_page():
+    if current_user.role not in ['admin', 'supervisor']: abort(403)
+    start, end = _analytics_range(request.args)
+    report = analytics.with_names(get_analytics(start, end), get_user_by_id, get_category_by_id)
+    return render_template('analytics.html', title="آمار تحلیلی", report=report)
+
+@app.route('/admin/routing', methods=['POST'])
+@login_required
+def route_tickets_now():
+    if current_user.role not in ['admin', 'supervisor']: abort(403)
+    result = route_tickets(current_user, rebalance=request.form.get('mode') == 'rebalance')
+    flash(f"{result['assigned']} تیکت بدون کارشناس تخصیص داده شد و {result['moved']} تیکت بین کارشناسان جابه‌جا شد.", 'info')
+    return redirect(url_for('dashboard'))
 
 @app.route('/users')
 @login_required
@@ -242,3 +467,76 @@ def delete_category_route(category_id):
     return redirect(url_for('list_categories'))
 
 
+
+# --- گزارش تاریخچه رویدادها (audit) ---
+def _parse_datetime(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M') if value else None
+    except ValueError:
+        return None
+
+@app.route('/audit')
+@login_required
+def audit_log():
+    if current_user.role not in ['admin', 'supervisor']: abort(403)
+    filters = {key: request.args.get(key, '').strip() for key in ('from', 'to', 'user', 'ticket', 'action')}
+    actor = None
+    if filters['user']:
+        actor = get_user_by_username(filters['user'])
+        if not actor:
+            flash(f"کاربر '{filters['user']}' پیدا نشد.", 'warning')
+    entries, cursor = [], None
+    if not filters['user'] or actor:
+        entries, cursor = query_audit_log(
+            start=_parse_datetime(filters['from']),
+            end=_parse_datetime(filters['to']),
+            actor=actor,
+            ticket_id=int(filters['ticket']) if filters['ticket'].isdigit() else None,
+            action=filters['action'] or None,
+            before=request.args.get('before', type=int),
+            limit=app.config['AUDIT_PAGE_SIZE'],
+        )
+    return render_template('admin/audit.html', title="تاریخچه رویدادها", entries=entries, cursor=cursor,
+                           filters=filters, actions=get_audit_actions())
+
+# --- روت‌های ورود و خروج دسته‌ای ---
+@app.route('/admin/transfer')
+@login_required
+def transfer_page():
+    if current_user.role not in ['admin', 'supervisor']: abort(403)
+    return render_template('admin/transfer.html', title="ورود و خروج داده", kinds=transfer.KINDS,
+                           sizes=store_sizes())
+
+@app.route('/admin/archive', methods=['POST'])
+@login_required
+def archive_now():
+    if current_user.role not in ['admin', 'supervisor']: abort(403)
+    archived = archive_tickets()
+    flash(f'{archived} تیکت به بایگانی منتقل شد.', 'info')
+    return redirect(url_for('transfer_page'))
+
+@app.route('/admin/import/<kind>', methods=['POST'])
+@login_required
+def import_data(kind):
+    if current_user.role not in ['admin', 'supervisor']: abort(403)
+    if kind not in transfer.KINDS: abort(404)
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        abort(400)
+    fmt = request.form.get('format') or ('csv' if upload.filename.lower().endswith('.csv') else 'jsonl')
+    if fmt not in ['csv', 'jsonl']: abort(400)
+    # نتیجه هر دسته به محض ثبت فرستاده می‌شود: یک خط JSON برای هر ردیف خطادار و در پایان خلاصه
+    results = transfer.import_rows(kind, upload.stream, fmt, current_user._get_current_object())
+    lines = (json.dumps(result, ensure_ascii=False) + "\n" for result in results)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+@app.route('/admin/export/tickets')
+@login_required
+def export_tickets():
+    if current_user.role not in ['admin', 'supervisor']: abort(403)
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in ['csv', 'jsonl']: abort(400)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(transfer.export_tickets(fmt)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=tickets-{datetime.now():%Y%m%d-%H%M}.{fmt}'
+    return response
@@ -0,0 +1,100 @@
+# ticketing/app/routing.py
+
+import heapq
+import json
+
+from .models import TicketStatus
+
+# تخصیص خودکار تیکت‌ها به کم‌بارترین کارشناس.
+# بار هر کارشناس تعداد تیکت‌های باز (OPEN_STATUSES) تخصیص‌یافته به اوست و در یک صف اولویت (heap) نگه داشته
+# می‌شود؛ انتخاب کارشناس و به‌روزرسانی بار O(log تعداد کارشناسان) است. ورودی‌های کهنه heap تنبل حذف می‌شوند.
+# اگر برای دسته‌بندی تیکت مهارتی تعریف شده باشد (SETTINGS["skills"]: نام دسته‌بندی -> نام کاربری کارشناسان)
+# فقط همان کارشناسان انتخاب می‌شوند و اگر هیچ‌کدام موجود نباشند، همه کارشناسان.
+SETTINGS = {"auto_assign": False, "skills": {}}
+OPEN_STATUSES = (TicketStatus.OPEN, TicketStatus.IN_PROGRESS, TicketStatus.ANSWERED)
+
+
+def init_app(app):
+    SETTINGS["auto_assign"] = app.config["ROUTING_AUTO_ASSIGN"]
+    SETTINGS["skills"] = {category: set(usernames) for category, usernames in json.loads(app.config["ROUTING_SKILLS"]).items()}
+
+
+class Router:
+    def __init__(self):
+        self.load = {}          # شناسه کارشناس -> تعداد تیکت‌های باز
+        self.agents = {}        # شناسه کارشناس -> نام کاربری
+        self._heaps = {None: []}    # نام دسته‌بندی دارای مهارت (None برای همه) -> [(بار، شناسه کارشناس)]
+
+    def _groups(self, agent_id):
+        username = self.agents[agent_id]
+        return [None] + [category for category, usernames in SETTINGS["skills"].items() if username in usernames]
+
+    def set_agents(self, agents):
+        # پس از افزودن/حذف کارشناس یا تغییر نام و نقش؛ heap ها از نو ساخته می‌شوند
+        self.agents = {agent.id: agent.username for agent in agents}
+        self._heaps = {None: []}
+        for category in SETTINGS["skills"]:
+            self._heaps[category] = []
+        for agent_id in self.agents:
+            for group in self._groups(agent_id):
+                self._heaps[group].append((self.load.get(agent_id, 0), agent_id))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+    def add_load(self, agent_id, delta):
+        load = self.load[agent_id] = self.load.get(agent_id, 0) + delta
+        if agent_id not in self.agents:
+            return
+        for group in self._groups(agent_id):
+            heap = self._heaps[group]
+            heapq.heappush(heap, (load, agent_id))
+            if len(heap) > 4 * len(self.agents) + 16:
+                # ورودی‌های کهنه زیاد شده‌اند
+                heap[:] = [(self.load.get(a, 0), a) for a in {a for _, a in heap} if a in self.agents]
+                heapq.heapify(heap)
+
+    def pick(self, category_name=None):
+        # شناسه کم‌بارترین کارشناس مجاز یا None
+        for group in ([category_name, None] if category_name in self._heaps else [None]):
+            heap = self._heaps[group]
+            while heap:
+                load, agent_id = heap[0]
+                if agent_id in self.agents and self.load.get(agent_id, 0) == load:
+                    return agent_id
+                heapq.heappop(heap)
+        return None
+
+    def clear(self):
+        self.load.clear()
+        self.set_agents([])
+
+
+# بار کارشناسان در backend حافظه؛ همراه با هر تغییر تیکت به‌روز می‌شود (مثل stats)
+ROUTER = Router()
+
+def _open_assignee(status, assignee_id):
+    return assignee_id if status in OPEN_STATUSES else None
+
+def ticket_changed(ticket, old_keys):
+    # old_keys همان خروجی repository.reindex_ticket است
+    old = _open_assignee(old_keys[2], old_keys[1])
+    new = _open_assignee(ticket.status, ticket.assigned_to.id if ticket.assigned_to else None)
+    if old == new:
+        return
+    if old is not None:
+        ROUTER.add_load(old, -1)
+    if new is not None:
+        ROUTER.add_load(new, +1)
+
+def ticket_removed(ticket):
+    old = _open_assignee(ticket.status, ticket.assigned_to.id if ticket.assigned_to else None)
+    if old is not None:
+        ROUTER.add_load(old, -1)
+
+def rebuild(tickets, agents):
+    ROUTER.clear()
+    for ticket in tickets:
+        assignee = _open_assignee(ticket.status, ticket.assigned_to.id if ticket.assigned_to else None)
+        if assignee is not None:
+            ROUTER.load[assignee] = ROUTER.load.get(assignee, 0) + 1
+    ROUTER.set_agents(agents)
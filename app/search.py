@@ -0,0 +1,122 @@
+# ticketing/app/search.py
+
+from collections import Counter, defaultdict
+import heapq
+import math
+import re
+
+# ایندکس معکوس جستجوی متن کامل روی عنوان، متن و پاسخ‌های تیکت‌ها
+# هر واژه -> {شناسه تیکت: وزن}؛ واژه‌های عنوان وزن بیشتری دارند
+# ایندکس همراه با ساخت/ویرایش تیکت و ثبت پاسخ به‌روز می‌شود (ر.ک. services)
+POSTINGS = defaultdict(dict)
+TITLE_WEIGHT = 3
+# سقف تیکت‌های منطبقی که امتیاز داده می‌شوند؛ برای پرسش‌هایی که فقط واژه‌های بسیار رایج دارند
+# از جدیدترین تیکت‌ها شروع می‌کنیم و پس از این تعداد می‌ایستیم تا زمان پاسخ محدود بماند؛
+# در این حالت search پرچم truncated را برمی‌گرداند تا به کاربر گفته شود نتایج کامل نیست
+SCAN_LIMIT = 5000
+# تعداد تیکت‌های ایندکس‌شده، برای محاسبه idf
+_counts = {"documents": 0}
+
+# یکسان‌سازی نویسه‌های عربی/فارسی: ی/ي و ک/ك، حذف اعراب، کشیده و نیم‌فاصله، و ارقام فارسی/عربی
+_NORMALIZE = str.maketrans({
+    "ي": "ی", "ى": "ی", "ئ": "ی", "ك": "ک", "ة": "ه", "ۀ": "ه",
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ؤ": "و",
+    "‌": None, "‍": None, "‎": None, "‏": None, "ـ": None,
+    **{chr(code): None for code in range(0x064B, 0x0660)}, "ٰ": None,
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+})
+_WORD = re.compile(r"\w+")
+
+# واژه‌های پرتکرار که در همه تیکت‌ها هستند و فقط لیست‌های بلند و بی‌فایده می‌سازند
+STOP_WORDS = frozenset("""
+و در به از که این را با است برای تا آن یک هم یا اما اگر بر هر شود شد کرد کند می نمی
+ها های ای ام ایم اید اند بود باشد بوده هست نیست دارد داریم دارم من ما شما او ایشان
+""".translate(_NORMALIZE).split())
+
+
+def normalize(text):
+    return text.translate(_NORMALIZE).lower()
+
+def tokenize(text):
+    return [word for word in _WORD.findall(normalize(text or "")) if len(word) > 1 and word not in STOP_WORDS]
+
+def _add(ticket_id, weights, sign):
+    for word, weight in weights.items():
+        postings = POSTINGS[word]
+        weight = postings.get(ticket_id, 0) + sign * weight
+        if weight > 0:
+            postings[ticket_id] = weight
+        else:
+            postings.pop(ticket_id, None)
+            if not postings:
+                del POSTINGS[word]
+
+def _ticket_weights(title, content):
+    weights = Counter(tokenize(content))
+    for word in tokenize(title):
+        weights[word] += TITLE_WEIGHT
+    return weights
+
+
+# --- به‌روزرسانی افزایشی ---
+def index_ticket(ticket):
+    _counts["documents"] += 1
+    _add(ticket.id, _ticket_weights(ticket.title, ticket.content), +1)
+
+def ticket_edited(ticket, old_title, old_content):
+    # متن قبلی دوباره واژه‌بندی و کم می‌شود، پس نیازی به نگه داشتن واژه‌های هر تیکت نیست
+    _add(ticket.id, _ticket_weights(old_title, old_content), -1)
+    _add(ticket.id, _ticket_weights(ticket.title, ticket.content), +1)
+
+def index_reply(reply):
+    _add(reply.ticket.id, Counter(tokenize(reply.content)), +1)
+
+def unindex_ticket(ticket):
+    # عکس index_ticket و index_reply برای تیکتی که از DB بیرون می‌رود
+    _counts["documents"] -= 1
+    _add(ticket.id, _ticket_weights(ticket.title, ticket.content), -1)
+    for reply in ticket.replies:
+        _add(ticket.id, Counter(tokenize(reply.content)), -1)
+
+def clear():
+    POSTINGS.clear()
+    _counts["documents"] = 0
+
+def rebuild(tickets):
+    clear()
+    for ticket in tickets:
+        index_ticket(ticket)
+        for reply in ticket.replies:
+            index_reply(reply)
+
+
+# --- جستجو ---
+def search(query, accept, within=None, limit=20):
+    # همه واژه‌های پرسش باید در تیکت باشند (AND)؛ امتیاز tf-idf است.
+    # پیمایش از کوتاه‌ترین لیست (یا within، شناسه‌های تیکت‌های قابل مشاهده کاربر، اگر کوتاه‌تر باشد) و از جدیدترین
+    # تیکت شروع می‌شود، پس هزینه به تعداد تیکت‌های نادرترین واژه (حداکثر SCAN_LIMIT) بستگی دارد نه کل تیکت‌ها.
+    # accept(شناسه تیکت) فیلتر دسترسی و حذف‌نشدن را اعمال می‌کند.
+    # خروجی (شناسه‌ها، truncated) است؛ truncated یعنی تیکت‌های منطبق قدیمی‌تری بودند که به سقف SCAN_LIMIT نرسیدند
+    words = set(tokenize(query))
+    if not words or any(word not in POSTINGS for word in words):
+        return [], False
+    lists = sorted((POSTINGS[word] for word in words), key=len)
+    total = max(_counts["documents"], 1)
+    idf = [math.log(1 + total / len(postings)) for postings in lists]
+    driver = within if within is not None and len(within) < len(lists[0]) else lists[0]
+    results, truncated = [], False
+    for ticket_id in reversed(driver):
+        score = 0.0
+        for postings, word_idf in zip(lists, idf):
+            weight = postings.get(ticket_id)
+            if weight is None:
+                break
+            score += math.log1p(weight) * word_idf
+        else:
+            if accept(ticket_id):
+                if len(results) >= SCAN_LIMIT:
+                    truncated = True
+                    break
+                results.append((score, ticket_id))
+    return [ticket_id for _, ticket_id in heapq.nlargest(limit, results)], truncated
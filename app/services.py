@@ -1,40 +1,74 @@
 # ticketing/app/services.py
 
-from .models import User, Ticket, Reply, LogEntry, Category, TicketStatus
+from .models import User, Ticket, Reply, LogEntry, Category, TicketStatus, SYSTEM_USER
+from bisect import bisect_left, bisect_right, insort
 from collections import defaultdict
 from datetime import date, datetime
-from werkzeug.security import generate_password_hash
+from . import analytics, audit, cache, coldstore, events, passwords, persistence, repository, routing, search, stats
+from .concurrency import reads, writes
+from .repository import INDEX
 
 # پایگاه داده موقت (در حافظه)
+# تغییرات با قفل نوشتن سریالی می‌شوند و خواندن‌های چندمرحله‌ای قفل خواندن می‌گیرند؛
+# جستجوهای تک‌کلیدی در ایندکس‌ها (get_*_by_id و ...) بدون قفل و اتمیک هستند
 DB = {
-    "users": [], "tickets": [], "replies": [], "logs": [], "categories": []
+    "users": [], "tickets": [], "replies": [], "categories": []
 }
+# تاریخچه رویدادها در DB نیست و در audit (بخش‌های زمانی با نگهداری محدود) ذخیره می‌شود
 
 # --- توابع مدیریت کاربران ---
 def get_user_by_id(user_id):
-    for user in DB["users"]:
-        if user.id == user_id: return user
-    return None
+    return INDEX["users_by_id"].get(user_id)
 
 def get_user_by_username(username):
-    for user in DB["users"]:
-        if user.username == username: return user
-    return None
+    return INDEX["users_by_username"].get(username)
 
+@reads
 def get_all_users():
-    return DB.get("users", [])
+    return list(DB.get("users", []))
 
+@reads
 def get_all_agents():
-    return [u for u in DB.get("users", []) if u.role == 'agent']
+    return repository.users_with_role('agent')
 
-def create_new_user(username, password, role):
+def create_new_user(username, password, role, password_hash=None):
     if get_user_by_username(username):
         raise ValueError(f"نام کاربری '{username}' قبلاً استفاده شده است.")
-    new_user = User(username=username, password=password, role=role)
+    # هش رمز عبور کند است و بیرون از قفل نوشتن محاسبه می‌شود
+    return _add_user(User(username=username, password=password, role=role, password_hash=password_hash))
+
+@writes
+def _add_user(new_user):
+    if get_user_by_username(new_user.username):
+        raise ValueError(f"نام کاربری '{new_user.username}' قبلاً استفاده شده است.")
     DB["users"].append(new_user)
+    repository.index_user(new_user)
+    persistence.record_user(new_user)
+    if new_user.role == 'agent':
+        _agents_changed()
+    cache.bump(cache.DIRECTORY)
     return new_user
 
 def update_user(user_id, new_username, new_role, new_password):
+    password_hash = passwords.hash_password(new_password) if new_password else None
+    return _update_user(user_id, new_username, new_role, password_hash)
+
+@writes
+def set_password_hash(user, password_hash):
+    user.password_hash = password_hash
+    persistence.record_user(user)
+
+def authenticate_user(username, password):
+    # بررسی رمز در استخر پروسه انجام می‌شود؛ اگر هش با تنظیمات فعلی ساخته نشده باشد، همین‌جا به‌روز می‌شود
+    user = get_user_by_username(username)
+    if not user or not user.check_password(password):
+        return None
+    if passwords.needs_rehash(user.password_hash):
+        set_password_hash(user, passwords.hash_password(password))
+    return user
+
+@writes
+def _update_user(user_id, new_username, new_role, password_hash):
     user_to_update = get_user_by_id(user_id)
     if not user_to_update:
         raise ValueError("کاربر پیدا نشد.")
@@ -43,108 +77,434 @@ def update_user(user_id, new_username, new_role, new_password):
         raise ValueError(f"نام کاربری '{new_username}' قبلاً توسط کاربر دیگری استفاده شده است.")
     user_to_update.username = new_username
     user_to_update.role = new_role
-    if new_password:
-        user_to_update.password_hash = generate_password_hash(new_password)
+    if password_hash:
+        user_to_update.password_hash = password_hash
+    repository.reindex_user(user_to_update)
+    persistence.record_user(user_to_update)
+    _agents_changed()
+    cache.bump(cache.DIRECTORY)
     return user_to_update
 
+@writes
 def delete_user(user_id):
     user_to_delete = get_user_by_id(user_id)
     if user_to_delete:
         DB["users"].remove(user_to_delete)
+        repository.unindex_user(user_to_delete)
+        persistence.record_user_deleted(user_to_delete)
+        _agents_changed()
+        cache.bump(cache.DIRECTORY)
         return True
     return False
 
 # --- توابع مدیریت تیکت ---
 def get_ticket_by_id(ticket_id):
-    for ticket in DB["tickets"]:
-        if ticket.id == ticket_id: return ticket
-    return None
+    # تیکت بایگانی‌شده از لایه سرد خوانده می‌شود (هر بار یک نمونه تازه)
+    ticket = INDEX["tickets_by_id"].get(ticket_id)
+    if ticket is None and coldstore.contains(ticket_id):
+        ticket = _archived_ticket(ticket_id)
+    return ticket
+
+def get_tickets_by_ids(ticket_ids):
+    # شناسه -> تیکت برای شناسه‌های موجود (دریافت دسته‌ای در API)
+    found = {}
+    for ticket_id in ticket_ids:
+        ticket = get_ticket_by_id(ticket_id)
+        if ticket is not None:
+            found[ticket_id] = ticket
+    return found
 
+@reads
 def get_tickets_for_user(user):
     if user.role == 'customer':
-        return [t for t in DB['tickets'] if t.created_by.id == user.id]
+        return repository.tickets_by("tickets_by_creator", user.id)
     elif user.role in ['admin', 'supervisor']:
         return DB['tickets']
     elif user.role == 'agent':
         # کارشناس فقط تیکت‌های تخصیص‌داده شده به خودش را می‌بیند
-        return [t for t in DB['tickets'] if t.assigned_to and t.assigned_to.id == user.id]
+        return repository.tickets_by("tickets_by_assignee", user.id)
     return []
 
-def create_new_ticket(title, content, creator_user, category):
+@reads
+def search_tickets(user, query, limit=20):
+    # جستجوی متن کامل با همان قواعد دسترسی get_tickets_for_user؛ تیکت‌های حذف‌شده برگردانده نمی‌شوند.
+    # خروجی (تیکت‌ها، truncated)؛ truncated یعنی فقط جدیدترین search.SCAN_LIMIT تیکت منطبق رتبه‌بندی شده‌اند
+    if user.role == 'customer':
+        position, within = 0, repository.ticket_ids_by("tickets_by_creator", user.id)
+    elif user.role == 'agent':
+        position, within = 1, repository.ticket_ids_by("tickets_by_assignee", user.id)
+    elif user.role in ['admin', 'supervisor']:
+        position, within = None, None
+    else:
+        return [], False
+    active = repository.TICKET_SECONDARY_INDEXES.index("tickets_active")
+
+    def accept(tid):
+        keys = repository.indexed_keys(tid)
+        return keys[active] is True and (position is None or keys[position] == user.id)
+
+    tickets_by_id = INDEX["tickets_by_id"]
+    ids, truncated = search.search(query, accept, within, limit)
+    return [tickets_by_id[tid] for tid in ids], truncated
+
+def _ticket_changed(ticket):
+    # ایندکس‌ها، شمارنده‌های داشبورد و بار کارشناسان را با وضعیت جدید تیکت هماهنگ می‌کند
+    old_keys = repository.reindex_ticket(ticket)
+    stats.ticket_changed(ticket, old_keys)
+    routing.ticket_changed(ticket, old_keys)
+    persistence.record_rollups(analytics.ticket_changed(ticket, old_keys))
+    persistence.record_ticket(ticket)
+
+def can_view_ticket(user, ticket):
+    # همان قواعد get_tickets_for_user، بدون ساختن لیست تیکت‌ها
+    if user.role == 'customer':
+        return ticket.created_by.id == user.id
+    elif user.role in ['admin', 'supervisor']:
+        return True
+    elif user.role == 'agent':
+        return ticket.assigned_to is not None and ticket.assigned_to.id == user.id
+    return False
+
+TICKET_SORTS = ('id', 'created_at', 'updated')
+
+@reads
+def query_tickets(user, status=None, category_id=None, assignee_id=None, creator_id=None,
+                  created_from=None, created_to=None, sort='id', descending=True, cursor=None, limit=25):
+    # جستجوی صفحه‌بندی‌شده (keyset) روی ایندکس‌ها؛ هزینه متناسب با اندازه صفحه است نه کل تیکت‌ها.
+    # خروجی: (تیکت‌های صفحه، نشانگر صفحه بعد یا None). تیکت‌های حذف‌شده هرگز برگردانده نمی‌شوند.
+    if status == TicketStatus.DELETED:
+        return [], None
+    constraints = [("tickets_active", True)]
+    if user.role == 'customer':
+        constraints.append(("tickets_by_creator", user.id))
+    elif user.role == 'agent':
+        constraints.append(("tickets_by_assignee", user.id))
+    elif user.role not in ['admin', 'supervisor']:
+        return [], None
+    # مقایسه بازه تاریخ روی timestamp ذخیره‌شده در مدل انجام می‌شود
+    created_from = created_from.timestamp() if created_from else None
+    created_to = created_to.timestamp() if created_to else None
+    if status is not None:
+        constraints.append(("tickets_by_status", status))
+    if category_id is not None:
+        constraints.append(("tickets_by_category", category_id))
+    if assignee_id is not None:
+        constraints.append(("tickets_by_assignee", assignee_id))
+    if creator_id is not None:
+        constraints.append(("tickets_by_creator", creator_id))
+
+    # کوچک‌ترین ایندکس پیمایش می‌شود و بقیه شرط‌ها روی تیکت‌ها بررسی می‌شوند
+    buckets = [repository.ticket_ids_by(name, key) for name, key in constraints]
+    driver = min(range(len(buckets)), key=lambda i: len(buckets[i]))
+    ids = buckets[driver]
+    if sort == 'updated' and driver == 0:
+        # ترتیب به‌روزرسانی روی همه تیکت‌هاست، پس شرط حذف‌نشدن هم باید بررسی شود
+        driver = None
+    checks = [(repository.TICKET_SECONDARY_INDEXES.index(name), key)
+              for i, (name, key) in enumerate(constraints) if i != driver]
+    tickets_by_id = INDEX["tickets_by_id"]
+
+    def matches(tid):
+        keys = repository.indexed_keys(tid)
+        if any(keys[pos] != key for pos, key in checks):
+            return False
+        if sort == 'updated' and (created_from or created_to):
+            created = tickets_by_id[tid].created_ts
+            return (not created_from or created >= created_from) and (not created_to or created < created_to)
+        return True
+
+    if sort == 'updated':
+        if driver is None:
+            entries = repository.iter_updated(before=cursor if descending else None,
+                                              after=cursor if not descending else None, descending=descending)
+        else:
+            entries = sorted(((repository.update_seq(tid) or 0, tid) for tid in ids), reverse=descending)
+            if cursor is not None:
+                entries = [e for e in entries if (e[0] < cursor if descending else e[0] > cursor)]
+    else:
+        # شناسه‌ها به ترتیب زمان ایجاد ساخته می‌شوند، پس بازه تاریخ با جستجوی دودویی محدود می‌شود
+        created_key = lambda tid: tickets_by_id[tid].created_ts
+        lo = bisect_left(ids, created_from, key=created_key) if created_from else 0
+        hi = bisect_left(ids, created_to, key=created_key) if created_to else len(ids)
+        if descending:
+            if cursor is not None:
+                hi = min(hi, bisect_left(ids, cursor))
+            entries = ((ids[i], ids[i]) for i in range(hi - 1, lo - 1, -1))
+        else:
+            if cursor is not None:
+                lo = max(lo, bisect_right(ids, cursor))
+            entries = ((ids[i], ids[i]) for i in range(lo, hi))
+
+    page, next_cursor = [], None
+    for key, tid in entries:
+        if not matches(tid):
+            continue
+        if len(page) == limit:
+            next_cursor = page_key
+            break
+        page.append(tickets_by_id[tid])
+        page_key = key
+    return page, next_cursor
+
+@writes
+def create_new_ticket(title, content, creator_user, category, route=True):
+    # با route و فعال بودن تخصیص خودکار، تیکت همان‌جا به کم‌بارترین کارشناس سپرده می‌شود (به نام SYSTEM_USER)
     new_ticket = Ticket(title=title, content=content, created_by_user=creator_user, category=category)
     DB["tickets"].append(new_ticket)
+    old_keys = repository.index_ticket(new_ticket)
+    stats.ticket_changed(new_ticket, old_keys)
+    routing.ticket_changed(new_ticket, old_keys)
+    search.index_ticket(new_ticket)
+    persistence.record_rollups(analytics.ticket_created(new_ticket))
+    persistence.record_ticket(new_ticket)
     add_log_to_ticket(new_ticket, creator_user, "ایجاد تیکت")
+    events.publish("created", new_ticket)
+    if route and routing.SETTINGS["auto_assign"]:
+        _route_ticket(new_ticket, SYSTEM_USER)
     return new_ticket
 
+@writes
 def edit_ticket_content(ticket, new_title, new_content, editor_user):
+    ticket = _thaw(ticket)
     details = f"موضوع از '{ticket.title}' به '{new_title}' تغییر کرد."
+    old_title, old_content = ticket.title, ticket.content
     ticket.title = new_title
     ticket.content = new_content
+    search.ticket_edited(ticket, old_title, old_content)
+    persistence.record_ticket(ticket)
     add_log_to_ticket(ticket, editor_user, "ویرایش تیکت", details)
     return True
 
+@writes
 def delete_ticket_by_id(ticket, deleter_user):
     if deleter_user.role not in ['admin', 'supervisor']:
         raise PermissionError("شما دسترسی لازم برای حذف تیکت را ندارید.")
+    ticket = _thaw(ticket)
     ticket.status = TicketStatus.DELETED
+    _ticket_changed(ticket)
     add_log_to_ticket(ticket, deleter_user, "حذف تیکت")
+    events.publish("status", ticket)
     return True
 
+@writes
 def assign_ticket_to_agent(ticket, agent, assigner):
     if assigner.role not in ['admin', 'supervisor']:
         raise PermissionError("شما دسترسی لازم برای این کار را ندارید.")
-    old_agent = ticket.assigned_to.username if ticket.assigned_to else "هیچکس"
+    ticket = _thaw(ticket)
+    previous = ticket.assigned_to
+    old_agent = previous.username if previous else "هیچکس"
     ticket.assign_to(agent)
+    _ticket_changed(ticket)
     details = f"تیکت از '{old_agent}' به '{agent.username}' تخصیص داده شد."
     add_log_to_ticket(ticket, assigner, "تخصیص کارشناس", details)
+    events.publish("assigned", ticket, previous_assignee=previous)
     return True
 
+@writes
 def update_ticket_status(ticket, user, new_status):
+    ticket = _thaw(ticket)
     old_status = ticket.status
     ticket.status = new_status
+    _ticket_changed(ticket)
     add_log_to_ticket(ticket, user, "تغییر وضعیت تیکت", f"وضعیت از '{old_status.value}' به '{new_status.value}' تغییر یافت.")
+    events.publish("status", ticket)
+
+@writes
+def close_ticket(ticket, user):
+    if ticket.status == TicketStatus.CLOSED:
+        return False
+    ticket = _thaw(ticket)
+    ticket.status = TicketStatus.CLOSED
+    _ticket_changed(ticket)
+    add_log_to_ticket(ticket, user, "بستن تیکت")
+    events.publish("status", ticket)
+    return True
+
+# --- عملیات دسته‌ای روی تیکت‌ها ---
+# یک عملیات برای فهرستی از شناسه‌ها: دسترسی و مقصد یک بار بررسی می‌شوند و همه تغییرات با یک بار گرفتن
+# قفل نوشتن اعمال می‌شوند، پس خواننده‌ها یا همه را می‌بینند یا هیچ‌کدام. نتیجه هر شناسه یکی از
+# "updated"، "unchanged" (از قبل در همان وضعیت)، "not_found" یا "forbidden" (خارج از دسترسی کاربر) است
+BULK_ACTIONS = ('close', 'delete', 'assign', 'category')
+
+def _check_bulk_action(action, user, agent, category):
+    if action not in BULK_ACTIONS:
+        raise ValueError("عملیات انتخاب شده معتبر نیست.")
+    if action != 'close' and user.role not in ['admin', 'supervisor']:
+        raise PermissionError("شما دسترسی لازم برای این کار را ندارید.")
+    if action == 'assign' and (agent is None or agent.role != 'agent'):
+        raise ValueError("لطفاً یک کارشناس انتخاب کنید.")
+    if action == 'category' and category is None:
+        raise ValueError("دسته‌بندی انتخاب شده معتبر نیست.")
+
+def _bulk_unchanged(ticket, action, agent, category):
+    # بدون تغییر دادن تیکت؛ برای تیکت بایگانی‌شده روی نسخه لایه سرد بررسی می‌شود تا بی‌جهت به DB برنگردد
+    if action == 'close':
+        return ticket.status == TicketStatus.CLOSED
+    if action == 'delete':
+        return ticket.status == TicketStatus.DELETED
+    if action == 'assign':
+        return ticket.assigned_to is not None and ticket.assigned_to.id == agent.id
+    return ticket.category is not None and ticket.category.id == category.id
+
+def _bulk_change(ticket, action, agent, category):
+    # تغییر را روی تیکت اعمال می‌کند و (عملیات، توضیحات) لاگ آن را برمی‌گرداند؛ None یعنی بدون تغییر
+    if _bulk_unchanged(ticket, action, agent, category):
+        return None
+    if action == 'close':
+        ticket.status = TicketStatus.CLOSED
+        return "بستن تیکت", ""
+    if action == 'delete':
+        ticket.status = TicketStatus.DELETED
+        return "حذف تیکت", ""
+    if action == 'assign':
+        old_agent = ticket.assigned_to.username if ticket.assigned_to else "هیچکس"
+        ticket.assign_to(agent)
+        return "تخصیص کارشناس", f"تیکت از '{old_agent}' به '{agent.username}' تخصیص داده شد."
+    old_category = ticket.category.name if ticket.category else "-"
+    ticket.category = category
+    return "تغییر دسته‌بندی", f"دسته‌بندی از '{old_category}' به '{category.name}' تغییر کرد."
+
+@writes
+def bulk_update_tickets(ticket_ids, action, user, agent=None, category=None):
+    # action یکی از BULK_ACTIONS؛ agent برای 'assign' و category برای 'category'. خروجی: شناسه -> نتیجه
+    _check_bulk_action(action, user, agent, category)
+    results, changed, logs = {}, [], []
+    for ticket_id in dict.fromkeys(ticket_ids):
+        ticket = get_ticket_by_id(ticket_id)
+        if ticket is None:
+            results[ticket_id] = "not_found"
+            continue
+        if not can_view_ticket(user, ticket):
+            results[ticket_id] = "forbidden"
+            continue
+        if _bulk_unchanged(ticket, action, agent, category):
+            results[ticket_id] = "unchanged"
+            continue
+        ticket = _thaw(ticket)
+        previous = ticket.assigned_to
+        log = _bulk_change(ticket, action, agent, category)
+        _ticket_changed(ticket)
+        results[ticket_id] = "updated"
+        changed.append((ticket, previous))
+        logs.append((ticket, *log))
+    _add_logs(user, logs)
+    for ticket, previous in changed:
+        if action == 'assign':
+            events.publish("assigned", ticket, previous_assignee=previous)
+        else:
+            events.publish("updated" if action == 'category' else "status", ticket)
+    return results
 
 # --- توابع مدیریت پاسخ و لاگ ---
+@writes
 def add_reply_to_ticket(ticket, user, content):
+    ticket = _thaw(ticket)
+    first = analytics.is_first_response(ticket, user)
     new_reply = Reply(ticket=ticket, user=user, content=content)
+    ticket.replies.append(new_reply)
     DB["replies"].append(new_reply)
+    search.index_reply(new_reply)
+    # اول R و بعد Y: اگر رکورد R اسنپ‌شات بگیرد، افزایش آمار هنوز اعمال نشده و Y در ژورنال بعدی بازپخش می‌شود
+    persistence.record_reply(new_reply)
+    persistence.record_rollups(analytics.reply_added(ticket, new_reply, first))
     if user.role != 'customer':
         if ticket.status == TicketStatus.OPEN:
             ticket.status = TicketStatus.ANSWERED
+            _ticket_changed(ticket)
     add_log_to_ticket(ticket, user, "ثبت پاسخ", f'"{content[:30]}..."')
+    events.publish("reply", ticket, reply=new_reply)
     return new_reply
 
+@reads
 def get_replies_for_ticket(ticket_id):
-    return [r for r in DB["replies"] if r.ticket.id == ticket_id]
+    ticket = get_ticket_by_id(ticket_id)
+    return list(ticket.replies) if ticket else []
+
+def _page_before(items, before, limit):
+    # items به ترتیب شناسه (زمان ثبت) مرتب است؛ صفحه‌ی جدیدترین آیتم‌های قبل از before
+    # را به ترتیب زمانی برمی‌گرداند، همراه با نشانگر صفحه‌ی قدیمی‌تر (یا None)
+    end = len(items) if before is None else bisect_left(items, before, key=lambda item: item.id)
+    start = max(0, end - limit)
+    page = items[start:end]
+    return page, (page[0].id if start > 0 else None)
+
+@reads
+def get_replies_page(ticket, before=None, limit=50):
+    return _page_before(ticket.replies, before, limit)
 
+def _log_entries(rows, ticket=None):
+    # ردیف‌های audit به LogEntry تبدیل می‌شوند؛ کاربر حذف‌شده None است و شناسه 0 همان SYSTEM_USER
+    entries = []
+    for log_id, ts, ticket_id, user_id, action, details in rows:
+        log = LogEntry.__new__(LogEntry)
+        log.id, log.created_ts, log.action, log.details = log_id, ts, action, details
+        log.ticket = ticket or get_ticket_by_id(ticket_id)
+        log.user = SYSTEM_USER if user_id == SYSTEM_USER.id else get_user_by_id(user_id)
+        entries.append(log)
+    return entries
+
+@reads
+def get_logs_page(ticket, before=None, limit=50):
+    rows, cursor = audit.ticket_page(ticket.id, before, limit)
+    return _log_entries(rows, ticket), cursor
+
+@reads
+def get_logs_for_tickets(tickets):
+    rows = audit.rows_for_tickets([ticket.id for ticket in tickets])
+    return {ticket.id: _log_entries(rows[ticket.id], ticket) for ticket in tickets}
+
+@reads
+def query_audit_log(start=None, end=None, actor=None, ticket_id=None, action=None, before=None, limit=100):
+    # start/end از نوع datetime؛ actor کاربر انجام‌دهنده
+    rows, cursor = audit.query(start.timestamp() if start else None, end.timestamp() if end else None,
+                               actor.id if actor else None, ticket_id, action, before, limit)
+    return _log_entries(rows), cursor
+
+def get_audit_actions():
+    return sorted(audit.ACTIONS)
+
+@writes
 def add_log_to_ticket(ticket, user, action, details=""):
-    log = LogEntry(ticket=ticket, user=user, action=action, details=details)
-    ticket.logs.append(log)
-    DB["logs"].append(log)
+    _add_logs(user, [(_thaw(ticket), action, details)])
+
+def _add_logs(user, entries):
+    # entries: [(تیکت، عملیات، توضیحات)]
+    keys = []
+    for ticket, action, details in entries:
+        log = LogEntry(ticket=ticket, user=user, action=action, details=details)
+        audit.append(log.id, log.created_ts, ticket.id, user.id, log.action, details)
+        ticket.updated_ts = log.created_ts
+        persistence.record_log(log)
+        repository.touch_ticket(ticket)
+        stats.ticket_touched(ticket)
+        keys.append(cache.ticket_key(ticket.id))
+    # همه تغییرات تیکت به اینجا می‌رسند؛ نسخه در انتها بالا می‌رود تا خواننده‌ای که نسخه جدید را می‌بیند داده جدید را هم ببیند
+    if keys:
+        cache.bump(*keys, cache.TICKETS)
 
 # --- توابع مدیریت دسته‌بندی‌ها ---
+@reads
 def get_all_categories():
-    return DB.get("categories", [])
+    return list(DB.get("categories", []))
 
 def get_category_by_id(category_id):
-    for category in DB["categories"]:
-        if category.id == category_id:
-            return category
-    return None
+    return INDEX["categories_by_id"].get(category_id)
 
 def get_category_by_name(name):
-    for category in DB["categories"]:
-        if category.name == name:
-            return category
-    return None
+    return INDEX["categories_by_name"].get(name)
 
+@writes
 def create_new_category(name):
     if get_category_by_name(name):
         raise ValueError("این دسته‌بندی قبلاً وجود دارد.")
     new_category = Category(name)
     DB["categories"].append(new_category)
+    repository.index_category(new_category)
+    persistence.record_category(new_category)
+    cache.bump(cache.DIRECTORY)
     return new_category
 
+@writes
 def update_category(category_id, new_name):
     category = get_category_by_id(category_id)
     if not category:
@@ -152,17 +512,31 @@ def update_category(category_id, new_name):
     if new_name and new_name != category.name and get_category_by_name(new_name):
         raise ValueError("نام دسته‌بندی قبلاً وجود دارد.")
     category.name = new_name
+    repository.reindex_category(category)
+    persistence.record_category(category)
+    cache.bump(cache.DIRECTORY)
     return category
 
+@writes
 def delete_category(category_id):
     category_to_delete = get_category_by_id(category_id)
     if category_to_delete:
         DB["categories"].remove(category_to_delete)
+        repository.unindex_category(category_to_delete)
+        persistence.record_category_deleted(category_to_delete)
+        cache.bump(cache.DIRECTORY)
         return True
     return False
 
 # --- تابع داشبورد ---
+@reads
 def get_dashboard_stats():
+    # شمارنده‌ها به صورت افزایشی در stats نگهداری می‌شوند
+    return stats.snapshot(get_all_agents(), DB["tickets"])
+
+@reads
+def compute_dashboard_stats():
+    # محاسبه کامل آمار از روی همه تیکت‌ها؛ برای بررسی سازگاری شمارنده‌های افزایشی
     active_tickets = [t for t in DB.get("tickets", []) if t.status != TicketStatus.DELETED]
     status_counts = defaultdict(int)
     for ticket in active_tickets:
@@ -174,9 +548,7 @@ def get_dashboard_stats():
         if ticket.assigned_to:
             if ticket.assigned_to.username in agent_workload:
                 agent_workload[ticket.assigned_to.username] += 1
-    def get_last_update(t):
-        return max(log.created_at for log in t.logs) if t.logs else t.created_at
-    recently_updated = sorted(active_tickets, key=get_last_update, reverse=True)[:5]
+    recently_updated = sorted(active_tickets, key=lambda t: t.updated_ts, reverse=True)[:5]
     return {
         "total_tickets": len(active_tickets),
         "open_tickets": status_counts.get(TicketStatus.OPEN, 0),
@@ -187,14 +559,285 @@ def get_dashboard_stats():
         "recently_updated_tickets": recently_updated
     }
 
+@reads
+def check_dashboard_stats():
+    return stats.compare(get_dashboard_stats(), compute_dashboard_stats())
+
+# --- ورود و خروج دسته‌ای (ر.ک. transfer.py) ---
+# هر دسته با یک بار گرفتن قفل نوشتن ثبت می‌شود؛ خروجی برای هر ردیف شناسه موجودیت یا خطای آن است
+@writes
+def import_users(rows):
+    # rows: [(نام کاربری، هش رمز، نقش)]؛ هش‌ها بیرون از قفل و به صورت موازی محاسبه شده‌اند
+    results = []
+    for username, password_hash, role in rows:
+        try:
+            results.append(_add_user(User(username, None, role, password_hash)).id)
+        except ValueError as e:
+            results.append(e)
+    return results
+
+@writes
+def import_categories(names):
+    results = []
+    for name in names:
+        try:
+            results.append(create_new_category(name).id)
+        except ValueError as e:
+            results.append(e)
+    return results
+
+@writes
+def import_tickets(rows, importer):
+    # rows: [(عنوان، متن، نام کاربری ایجادکننده، نام دسته‌بندی، نام کاربری کارشناس یا None)]
+    results = []
+    for title, content, creator_name, category_name, assignee_name in rows:
+        try:
+            creator = get_user_by_username(creator_name)
+            if not creator:
+                raise ValueError(f"کاربر '{creator_name}' پیدا نشد.")
+            category = get_category_by_name(category_name)
+            if not category:
+                raise ValueError(f"دسته‌بندی '{category_name}' پیدا نشد.")
+            agent = get_user_by_username(assignee_name) if assignee_name else None
+            if assignee_name and (not agent or agent.role != 'agent'):
+                raise ValueError(f"کارشناس '{assignee_name}' پیدا نشد.")
+            if agent and importer.role not in ['admin', 'supervisor']:
+                raise PermissionError("شما دسترسی لازم برای این کار را ندارید.")
+            ticket = create_new_ticket(title, content, creator, category, route=agent is None)
+            if agent:
+                assign_ticket_to_agent(ticket, agent, importer)
+            results.append(ticket.id)
+        except (ValueError, PermissionError) as e:
+            results.append(e)
+    return results
+
+@reads
+def get_tickets_after(after_id, limit):
+    # صفحه‌ای از تیکت‌ها (همه وضعیت‌ها) به ترتیب شناسه، همراه با پاسخ‌ها؛ برای خروجی جریانی
+    tickets = DB["tickets"]
+    start = bisect_right(tickets, after_id, key=lambda t: t.id)
+    return tickets[start:start + limit]
+
+# --- تخصیص خودکار (ر.ک. routing.py) ---
+# بار کارشناسان در routing.ROUTER همراه با هر تغییر تیکت (_ticket_changed) به‌روز می‌شود
+ROUTING_BATCH_SIZE = 1000
+
+def _agents_changed():
+    routing.ROUTER.set_agents(repository.users_with_role('agent'))
+
+def _route_ticket(ticket, actor, action="تخصیص خودکار"):
+    # تیکت را به کم‌بارترین کارشناس مجاز می‌سپارد؛ actor کاربری است که تخصیص به نام او ثبت می‌شود
+    agent = get_user_by_id(routing.ROUTER.pick(ticket.category.name if ticket.category else None))
+    if agent is None:
+        return None
+    previous = ticket.assigned_to
+    ticket.assign_to(agent)
+    _ticket_changed(ticket)
+    if previous:
+        details = f"تیکت از '{previous.username}' به '{agent.username}' منتقل شد."
+    else:
+        details = f"تیکت به '{agent.username}' تخصیص داده شد."
+    add_log_to_ticket(ticket, actor, action, details)
+    events.publish("assigned", ticket, previous_assignee=previous)
+    return agent
+
+@reads
+def _unassigned_ticket_ids():
+    tickets_by_id = INDEX["tickets_by_id"]
+    return sorted(tid for status in routing.OPEN_STATUSES
+                  for tid in repository.ticket_ids_by("tickets_by_status", status)
+                  if tickets_by_id[tid].assigned_to is None)
+
+@writes
+def _route_batch(ticket_ids, actor):
+    routed = 0
+    for ticket in map(INDEX["tickets_by_id"].get, ticket_ids):
+        # ممکن است از زمان انتخاب تغییر کرده باشد
+        if ticket is None or ticket.assigned_to is not None or ticket.status not in routing.OPEN_STATUSES:
+            continue
+        if _route_ticket(ticket, actor) is None:
+            break
+        routed += 1
+    return routed
+
+@writes
+def _rebalance(actor):
+    # از پربارترین کارشناس‌ها شروع می‌کنیم و تیکت‌هایی را که کار رویشان شروع نشده (در حال انجام و بدون پاسخ)،
+    # جدیدترین اول، به کم‌بارترین کارشناس مجاز منتقل می‌کنیم تا وقتی انتقال اختلاف بار را کم کند
+    router = routing.ROUTER
+    tickets_by_id = INDEX["tickets_by_id"]
+    moved = 0
+    for donor in sorted(router.agents, key=lambda agent_id: router.load.get(agent_id, 0), reverse=True):
+        for tid in reversed(list(repository.ticket_ids_by("tickets_by_assignee", donor))):
+            lightest = router.pick()
+            if lightest is None or router.load.get(lightest, 0) + 1 >= router.load.get(donor, 0):
+                break
+            ticket = tickets_by_id[tid]
+            if ticket.status != TicketStatus.IN_PROGRESS or ticket.replies:
+                continue
+            target = router.pick(ticket.category.name if ticket.category else None)
+            if target is None or target == donor or router.load.get(target, 0) + 1 >= router.load.get(donor, 0):
+                continue
+            _route_ticket(ticket, actor, "توزیع مجدد")
+            moved += 1
+    return moved
+
+def route_tickets(actor, rebalance=False):
+    # همه تیکت‌های باز بدون کارشناس را تخصیص می‌دهد و در صورت درخواست بار را دوباره توزیع می‌کند؛
+    # در دسته‌های ROUTING_BATCH_SIZE تایی تا قفل نوشتن برای مدت طولانی گرفته نشود
+    if actor.role not in ['admin', 'supervisor']:
+        raise PermissionError("شما دسترسی لازم برای این کار را ندارید.")
+    ticket_ids = _unassigned_ticket_ids()
+    assigned = 0
+    for start in range(0, len(ticket_ids), ROUTING_BATCH_SIZE):
+        if not routing.ROUTER.agents:
+            break
+        assigned += _route_batch(ticket_ids[start:start + ROUTING_BATCH_SIZE], actor)
+    return {"assigned": assigned, "moved": _rebalance(actor) if rebalance else 0}
+
+# --- لایه سرد: بایگانی تیکت‌های بسته/حذف‌شده قدیمی (ر.ک. coldstore.py) ---
+# تیکت‌های بایگانی‌شده در DB، ایندکس‌ها، شمارنده‌های داشبورد و ایندکس جستجو نیستند و فقط با شناسه
+# (get_ticket_by_id) در دسترس‌اند؛ تاریخچه آن‌ها در audit می‌ماند. تغییر دوباره تیکت آن را به DB برمی‌گرداند.
+ARCHIVE_BATCH_SIZE = 1000
+
+def _archived_ticket(ticket_id):
+    record = coldstore.read(ticket_id)
+    return coldstore.unpack(record, INDEX["users_by_id"], INDEX["categories_by_id"]) if record else None
+
+def _thaw(ticket):
+    # همه توابع تغییر تیکت از اینجا می‌گذرند؛ برای تیکت‌های DB هزینه‌ای جز یک جستجوی دیکشنری ندارد
+    hot = INDEX["tickets_by_id"].get(ticket.id)
+    if hot is not None:
+        return hot
+    insort(DB["tickets"], ticket, key=lambda t: t.id)
+    for reply in ticket.replies:
+        insort(DB["replies"], reply, key=lambda r: r.id)
+    old_keys = repository.index_ticket(ticket)
+    # تیکت بدون جایگاه در ترتیب «آخرین به‌روزرسانی» در فهرست‌های sort=updated دیده نمی‌شود
+    repository.touch_ticket(ticket)
+    stats.ticket_changed(ticket, old_keys)
+    routing.ticket_changed(ticket, old_keys)
+    search.index_ticket(ticket)
+    for reply in ticket.replies:
+        search.index_reply(reply)
+    analytics.track_responses([ticket])
+    persistence.record_restored(ticket)
+    coldstore.mark_hot(ticket.id)
+    return ticket
+
+@reads
+def _archive_candidates(cutoff):
+    tickets_by_id = INDEX["tickets_by_id"]
+    return [tid for status in coldstore.SETTINGS["statuses"]
+            for tid in repository.ticket_ids_by("tickets_by_status", TicketStatus[status])
+            if tickets_by_id[tid].updated_ts < cutoff]
+
+@writes
+def _archive_batch(ticket_ids, cutoff):
+    # شرط‌ها دوباره بررسی می‌شوند چون تیکت ممکن است از زمان انتخاب تغییر کرده باشد
+    tickets = [ticket for ticket in map(INDEX["tickets_by_id"].get, ticket_ids)
+               if ticket is not None and ticket.status.name in coldstore.SETTINGS["statuses"]
+               and ticket.updated_ts < cutoff]
+    if not tickets:
+        return 0
+    # ابتدا روی دیسک (با fsync) و بعد در ژورنال؛ اگر بین این دو خاموش شود تیکت در DB می‌ماند.
+    # رکوردهای ژورنال پس از حذف از DB نوشته می‌شوند تا اسنپ‌شاتی که وسط آن‌ها گرفته شود وضعیت کامل را ببیند
+    coldstore.write([(ticket.id, coldstore.pack(ticket)) for ticket in tickets])
+    for ticket in tickets:
+        stats.ticket_removed(ticket)
+        routing.ticket_removed(ticket)
+        search.unindex_ticket(ticket)
+        repository.unindex_ticket(ticket)
+    archived = {ticket.id for ticket in tickets}
+    DB["tickets"] = [t for t in DB["tickets"] if t.id not in archived]
+    DB["replies"] = [r for r in DB["replies"] if r.ticket.id not in archived]
+    for ticket in tickets:
+        persistence.record_archived(ticket)
+    cache.bump(*(cache.ticket_key(ticket.id) for ticket in tickets), cache.TICKETS)
+    return len(tickets)
+
+def archive_tickets():
+    # در دسته‌های ARCHIVE_BATCH_SIZE تایی تا قفل نوشتن برای مدت طولانی گرفته نشود
+    if not coldstore.enabled():
+        return 0
+    cutoff = datetime.now().timestamp() - coldstore.SETTINGS["after_days"] * 86400
+    candidates = _archive_candidates(cutoff)
+    archived = sum(_archive_batch(candidates[start:start + ARCHIVE_BATCH_SIZE], cutoff)
+                   for start in range(0, len(candidates), ARCHIVE_BATCH_SIZE))
+    # رکوردهای کهنه تیکت‌هایی که دوباره بایگانی شده‌اند؛ فقط قفل لایه سرد را می‌گیرد
+    coldstore.compact()
+    return archived
+
+def is_archived(ticket):
+    return ticket.id not in INDEX["tickets_by_id"] and coldstore.contains(ticket.id)
+
+# --- آمار تحلیلی (ر.ک. analytics.py) ---
+@reads
+def get_analytics(start, end):
+    # start و end از نوع date (هر دو شامل)
+    return analytics.report(analytics.rows_between(start, end), start, end)
+
+def _analytics_ticket_info(ticket_id):
+    ticket = INDEX["tickets_by_id"].get(ticket_id)
+    if ticket is not None:
+        return (ticket.created_ts, ticket.category.id if ticket.category else None,
+                ticket.assigned_to.id if ticket.assigned_to else None)
+    record = coldstore.read(ticket_id) if coldstore.contains(ticket_id) else None
+    if record is None:
+        return None
+    return (record["created_ts"], record["category"][0] if record["category"] else None,
+            record["assigned_to"][0] if record["assigned_to"] else None)
+
+@writes
+def rebuild_analytics():
+    # خلاصه‌ها را در یک پیمایش از تاریخچه (audit) از نو می‌سازد و در ژورنال (و اسنپ‌شات بعدی) ذخیره می‌کند؛
+    # خروجی تعداد لاگ‌های پیمایش‌شده
+    roles = {user.id: user.role for user in DB["users"]}
+    processed = analytics.rebuild(audit.iter_rows(), roles, _analytics_ticket_info)
+    persistence.record_rollups_rebuilt(list(analytics.all_rows()))
+    persistence.save_snapshot()
+    return processed
+
+def get_versions(keys):
+    # نسخه و زمان آخرین تغییر موجودیت‌ها برای ETag و کش قطعه‌ها (ر.ک. cache.py)
+    return cache.versions(keys)
+
+def store_sizes():
+    # تعداد موجودیت‌های ذخیره‌شده برای /metrics
+    sizes = {kind: len(items) for kind, items in DB.items()}
+    sizes["logs"] = audit.count()
+    sizes["archived_tickets"] = coldstore.count()
+    return sizes
+
+# --- انتخاب backend ذخیره‌سازی ---
+def use_storage_backend(backend):
+    # توابع سرویس این ماژول را با پیاده‌سازی backend (مثلاً sqlite_store) جایگزین می‌کند؛
+    # routes و create_initial_data از همین نام‌ها استفاده می‌کنند
+    globals().update({name: getattr(backend, name) for name in backend.SERVICE_FUNCTIONS})
+
+# --- بازسازی ایندکس‌ها و شمارنده‌ها پس از بارگذاری DB از دیسک ---
+@writes
+def rebuild_derived_state():
+    repository.rebuild_indexes(DB)
+    stats.rebuild(DB["tickets"])
+    routing.rebuild(DB["tickets"], repository.users_with_role('agent'))
+    search.rebuild(DB["tickets"])
+    analytics.rebuild_responses(DB["tickets"])
+    coldstore.reconcile(INDEX["tickets_by_id"])
+    # خلاصه‌های آمار تحلیلی از اسنپ‌شات و ژورنال بارگذاری شده‌اند؛ فقط داده نسخه‌های پیشین یک بار بازسازی می‌شود
+    if persistence.LOAD_STATS.get("rollups_missing"):
+        rebuild_analytics()
+
 # --- ایجاد داده‌های اولیه برای تست ---
+@writes
 def create_initial_data():
-    if DB["users"]: return
-    admin = create_new_user("admin", "123", "admin")
-    supervisor = create_new_user("supervisor", "123", "supervisor")
-    agent1 = create_new_user("agent1", "123", "agent")
-    agent2 = create_new_user("agent2", "123", "agent")
-    customer1 = create_new_user("customer1", "123", "customer")
+    if get_all_users(): return
+    seed_hash = passwords.SEED_PASSWORD_HASH
+    admin = create_new_user("admin", "123", "admin", seed_hash)
+    supervisor = create_new_user("supervisor", "123", "supervisor", seed_hash)
+    agent1 = create_new_user("agent1", "123", "agent", seed_hash)
+    agent2 = create_new_user("agent2", "123", "agent", seed_hash)
+    customer1 = create_new_user("customer1", "123", "customer", seed_hash)
 
     default_categories = [
         "سامانه", "غذا", "سیستم ورود و خروج", "اتوماسیون اداری",
@@ -207,9 +850,7 @@ def create_initial_data():
         create_new_category(name)
 
     cat_software = get_category_by_name("نرم افزاری")
-    t1 = create_new_ticket("مشکل در ورود به نرم‌افزار", "نمی‌توانم وارد سیستم شوم.", customer1, cat_software)
-    t2 = create_new_ticket("عدم دسترسی به اینترنت", "اینترنت قطع شده است.", customer1, get_category_by_name("شبکه"))
+    t1 = create_new_ticket("مشکل در ورود به نرم‌افزار", "نمی‌توانم وارد سیستم شوم.", customer1, cat_software, route=False)
+    t2 = create_new_ticket("عدم دسترسی به اینترنت", "اینترنت قطع شده است.", customer1, get_category_by_name("شبکه"), route=False)
     assign_ticket_to_agent(t1, agent1, supervisor)
     assign_ticket_to_agent(t2, agent2, supervisor)
-
-create_initial_data()
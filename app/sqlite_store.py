@@ -0,0 +1,954 @@
+# ticketing/app/sqlite_store.py
+
+import datetime
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+from .models import User, Ticket, Reply, LogEntry, Category, TicketStatus, SYSTEM_USER
+from . import analytics, audit, cache, events, passwords, routing, search
+# بررسی و اعمال عملیات دسته‌ای روی اشیای مدل بین دو backend مشترک است
+from .services import _bulk_change, _check_bulk_action
+
+# پیاده‌سازی SQLite همان توابع services.py؛ با STORAGE_BACKEND = 'sqlite' فعال می‌شود.
+# داده‌ها لازم نیست در حافظه جا شوند و چند پروسه gunicorn می‌توانند یک فایل مشترک داشته باشند.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username) WHERE deleted = 0;
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role, id) WHERE deleted = 0;
+-- ردیف SYSTEM_USER (شناسه 0) برای کلید خارجی لاگ رویدادهای خودکار؛ حذف‌شده علامت خورده تا در فهرست‌ها نیاید
+INSERT OR IGNORE INTO users (id, username, password_hash, role, created_at, deleted) VALUES (0, 'سیستم', '!', 'system', 0, 1);
+
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_name ON categories(name) WHERE deleted = 0;
+
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_by INTEGER NOT NULL REFERENCES users(id),
+    category_id INTEGER REFERENCES categories(id),
+    status TEXT NOT NULL,
+    assigned_to INTEGER REFERENCES users(id),
+    created_at REAL NOT NULL,
+    last_log_id INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_creator ON tickets(created_by, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_assignee ON tickets(assigned_to, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_category ON tickets(category_id, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets(created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_last_log ON tickets(last_log_id);
+-- بار کارشناسان برای تخصیص خودکار (ر.ک. _router)
+CREATE INDEX IF NOT EXISTS idx_tickets_open_load ON tickets(assigned_to) WHERE status IN ('OPEN', 'IN_PROGRESS', 'ANSWERED');
+
+CREATE TABLE IF NOT EXISTS replies (
+    id INTEGER PRIMARY KEY,
+    ticket_id INTEGER NOT NULL REFERENCES tickets(id),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_replies_ticket ON replies(ticket_id, id);
+
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    ticket_id INTEGER NOT NULL REFERENCES tickets(id),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    action TEXT NOT NULL,
+    details TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_logs_ticket ON logs(ticket_id, id);
+CREATE INDEX IF NOT EXISTS idx_logs_user ON logs(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_logs_created ON logs(created_at);
+
+-- نسخه موجودیت‌ها برای ETag و کش قطعه‌های رندرشده (ر.ک. cache.py)؛ بین همه پروسه‌ها مشترک است
+CREATE TABLE IF NOT EXISTS versions (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+
+-- خلاصه‌های روزانه آمار تحلیلی (ر.ک. analytics.py)؛ در همان تراکنش تغییر تیکت نوشته می‌شوند
+CREATE TABLE IF NOT EXISTS rollups (
+    day TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    key INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (day, metric, key)
+) WITHOUT ROWID;
+
+-- ایندکس متن کامل؛ rowid همان شناسه تیکت است و متن‌ها پیش از ذخیره با search.tokenize یکسان‌سازی می‌شوند
+CREATE VIRTUAL TABLE IF NOT EXISTS ticket_search USING fts5(title, content, replies);
+"""
+
+USER_COLUMNS = "id, username, password_hash, role, created_at"
+TICKET_COLUMNS = "id, title, content, created_by, category_id, status, assigned_to, created_at, last_log_id"
+
+SETTINGS = {"path": None}
+# زمان بررسی بعدی نگهداری تاریخچه (ر.ک. _prune_logs)
+_audit_prune = {"next": 0.0}
+
+# یک اتصال برای هر thread؛ با شناسه پروسه کلید می‌خورد تا بعد از fork اتصال والد استفاده نشود
+_local = threading.local()
+
+
+def init_app(app):
+    SETTINGS["path"] = app.config["SQLITE_PATH"]
+    directory = os.path.dirname(SETTINGS["path"])
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = _connection()
+    conn.executescript(SCHEMA)
+    with conn:
+        _backfill_search(conn)
+        _prune_logs(conn)
+
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(SETTINGS["path"], timeout=5, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+@contextmanager
+def _transaction(immediate=False):
+    # immediate: قفل نوشتن از ابتدای تراکنش (BEGIN IMMEDIATE) گرفته می‌شود تا ردیف‌هایی که درون آن خوانده
+    # می‌شوند تا commit توسط پروسه دیگری تغییر نکنند؛ بدون آن تراکنش با اولین نوشتن شروع می‌شود
+    conn = _connection()
+    with conn:
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+
+def _query(sql, params=()):
+    return _connection().execute(sql, params).fetchall()
+
+def _ts(value):
+    return value.timestamp()
+
+def _search_text(text):
+    return " ".join(search.tokenize(text))
+
+def _backfill_search(conn):
+    # پایگاه داده‌ای که پیش از اضافه شدن جستجو ساخته شده، یک بار ایندکس می‌شود
+    if conn.execute("SELECT 1 FROM ticket_search LIMIT 1").fetchone():
+        return
+    replies = defaultdict(list)
+    for ticket_id, content in conn.execute("SELECT ticket_id, content FROM replies ORDER BY id"):
+        replies[ticket_id].append(_search_text(content))
+    conn.executemany(
+        "INSERT INTO ticket_search (rowid, title, content, replies) VALUES (?, ?, ?, ?)",
+        ((ticket_id, _search_text(title), _search_text(content), " ".join(replies.get(ticket_id, ())))
+         for ticket_id, title, content in conn.execute("SELECT id, title, content FROM tickets").fetchall()),
+    )
+
+def _chunks(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+# --- تبدیل ردیف‌ها به اشیای مدل (بدون __init__ تا شناسه‌ها از پایگاه داده بیایند) ---
+def _user(row):
+    user = User.__new__(User)
+    user.id, user.username, user.password_hash, user.role = row[:4]
+    user.created_ts = row[4]
+    return user
+
+def _category(row):
+    category = Category.__new__(Category)
+    category.id, category.name = row[:2]
+    category.created_ts = row[2]
+    return category
+
+def _load_users(ids):
+    # کاربران حذف‌شده هم بارگذاری می‌شوند چون هنوز در تیکت‌ها و پاسخ‌ها ارجاع دارند
+    users = {}
+    for chunk in _chunks(set(ids) - {None}):
+        rows = _query(f"SELECT {USER_COLUMNS} FROM users WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        users.update((row[0], _user(row)) for row in rows)
+    return users
+
+def _load_categories(ids):
+    categories = {}
+    for chunk in _chunks(set(ids) - {None}):
+        rows = _query(f"SELECT id, name, created_at FROM categories WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        categories.update((row[0], _category(row)) for row in rows)
+    return categories
+
+def _tickets(rows):
+    users = _load_users([r[3] for r in rows] + [r[6] for r in rows])
+    categories = _load_categories(r[4] for r in rows)
+    tickets = []
+    for row in rows:
+        ticket = Ticket.__new__(Ticket)
+        ticket.id, ticket.title, ticket.content = row[:3]
+        ticket.created_by = users.get(row[3])
+        ticket.category = categories.get(row[4])
+        ticket.status = TicketStatus[row[5]]
+        ticket.assigned_to = users.get(row[6])
+        ticket.created_ts = row[7]
+        # رشته پاسخ‌ها و تاریخچه به صورت صفحه‌بندی‌شده از get_replies_page/get_logs_page خوانده می‌شود؛
+        # ترتیب «آخرین به‌روزرسانی» در این backend با ستون last_log_id است و updated_ts بارگذاری نمی‌شود
+        ticket.updated_ts, ticket.replies = ticket.created_ts, []
+        tickets.append(ticket)
+    return tickets
+
+def _thread_items(cls, rows, ticket):
+    users = _load_users(r[1] for r in rows)
+    items = []
+    for row in rows:
+        item = cls.__new__(cls)
+        item.id, item.ticket, item.user = row[0], ticket, users.get(row[1])
+        item.created_ts = row[-1]
+        if cls is Reply:
+            item.content = row[2]
+        else:
+            item.action, item.details = row[2], row[3]
+        items.append(item)
+    return items
+
+
+# --- توابع مدیریت کاربران ---
+def get_user_by_id(user_id):
+    rows = _query(f"SELECT {USER_COLUMNS} FROM users WHERE id = ? AND deleted = 0", (user_id,))
+    return _user(rows[0]) if rows else None
+
+def get_user_by_username(username):
+    rows = _query(f"SELECT {USER_COLUMNS} FROM users WHERE username = ? AND deleted = 0", (username,))
+    return _user(rows[0]) if rows else None
+
+def get_all_users():
+    return [_user(row) for row in _query(f"SELECT {USER_COLUMNS} FROM users WHERE deleted = 0 ORDER BY id")]
+
+def get_all_agents():
+    rows = _query(f"SELECT {USER_COLUMNS} FROM users WHERE role = 'agent' AND deleted = 0 ORDER BY id")
+    return [_user(row) for row in rows]
+
+def create_new_user(username, password, role, password_hash=None):
+    if get_user_by_username(username):
+        raise ValueError(f"نام کاربری '{username}' قبلاً استفاده شده است.")
+    new_user = User(username=username, password=password, role=role, password_hash=password_hash)
+    with _transaction() as conn:
+        _insert_user(conn, new_user)
+    return new_user
+
+def _insert_user(conn, user):
+    try:
+        cursor = conn.execute(
+            "INSERT INTO users (username, password_hash, role, created_at) VALUES (?, ?, ?, ?)",
+            (user.username, user.password_hash, user.role, user.created_ts),
+        )
+    except sqlite3.IntegrityError:
+        raise ValueError(f"نام کاربری '{user.username}' قبلاً استفاده شده است.")
+    user.id = cursor.lastrowid
+    _bump(conn, cache.DIRECTORY)
+
+def update_user(user_id, new_username, new_role, new_password):
+    user_to_update = get_user_by_id(user_id)
+    if not user_to_update:
+        raise ValueError("کاربر پیدا نشد.")
+    existing_user = get_user_by_username(new_username)
+    if existing_user and existing_user.id != user_id:
+        raise ValueError(f"نام کاربری '{new_username}' قبلاً توسط کاربر دیگری استفاده شده است.")
+    user_to_update.username = new_username
+    user_to_update.role = new_role
+    if new_password:
+        user_to_update.password_hash = passwords.hash_password(new_password)
+    with _transaction() as conn:
+        conn.execute("UPDATE users SET username = ?, role = ?, password_hash = ? WHERE id = ?",
+                     (new_username, new_role, user_to_update.password_hash, user_id))
+        _bump(conn, cache.DIRECTORY)
+    return user_to_update
+
+def set_password_hash(user, password_hash):
+    user.password_hash = password_hash
+    with _transaction() as conn:
+        conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user.id))
+
+def delete_user(user_id):
+    # حذف نرم: تیکت‌ها و پاسخ‌های کاربر همچنان به او ارجاع می‌دهند
+    with _transaction() as conn:
+        if conn.execute("UPDATE users SET deleted = 1 WHERE id = ? AND deleted = 0", (user_id,)).rowcount == 0:
+            return False
+        _bump(conn, cache.DIRECTORY)
+        return True
+
+
+# --- توابع مدیریت تیکت ---
+def get_ticket_by_id(ticket_id):
+    rows = _query(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE id = ?", (ticket_id,))
+    return _tickets(rows)[0] if rows else None
+
+def get_tickets_by_ids(ticket_ids):
+    found = {}
+    for chunk in _chunks(set(ticket_ids)):
+        rows = _query(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        found.update((ticket.id, ticket) for ticket in _tickets(rows))
+    return found
+
+def get_tickets_for_user(user):
+    if user.role == 'customer':
+        rows = _query(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE created_by = ? ORDER BY id", (user.id,))
+    elif user.role in ['admin', 'supervisor']:
+        rows = _query(f"SELECT {TICKET_COLUMNS} FROM tickets ORDER BY id")
+    elif user.role == 'agent':
+        rows = _query(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE assigned_to = ? ORDER BY id", (user.id,))
+    else:
+        rows = []
+    return _tickets(rows)
+
+def query_tickets(user, status=None, category_id=None, assignee_id=None, creator_id=None,
+                  created_from=None, created_to=None, sort='id', descending=True, cursor=None, limit=25):
+    # همان قرارداد services.query_tickets؛ نشانگر مرتب‌سازی «به‌روزرسانی» شناسه آخرین لاگ تیکت است
+    where, params = ["status != 'DELETED'"], []
+    if user.role == 'customer':
+        where.append("created_by = ?")
+        params.append(user.id)
+    elif user.role == 'agent':
+        where.append("assigned_to = ?")
+        params.append(user.id)
+    elif user.role not in ['admin', 'supervisor']:
+        return [], None
+    for column, value in (("status", status.name if status else None), ("category_id", category_id),
+                          ("assigned_to", assignee_id), ("created_by", creator_id)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if created_from:
+        where.append("created_at >= ?")
+        params.append(_ts(created_from))
+    if created_to:
+        where.append("created_at < ?")
+        params.append(_ts(created_to))
+    order_column = "last_log_id" if sort == 'updated' else "id"
+    if cursor is not None:
+        where.append(f"{order_column} {'<' if descending else '>'} ?")
+        params.append(cursor)
+    rows = _query(
+        f"SELECT {TICKET_COLUMNS} FROM tickets WHERE {' AND '.join(where)} "
+        f"ORDER BY {order_column} {'DESC' if descending else 'ASC'} LIMIT ?",
+        params + [limit + 1],
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][8] if sort == 'updated' else rows[-1][0]
+    return _tickets(rows), next_cursor
+
+def search_tickets(user, query, limit=20):
+    # همان قرارداد services.search_tickets؛ رتبه‌بندی با bm25 و وزن بیشتر برای عنوان.
+    # FTS5 همه تیکت‌های منطبق را رتبه‌بندی می‌کند و سقف پیمایشی ندارد، پس truncated همیشه False است
+    words = set(search.tokenize(query))
+    if not words:
+        return [], False
+    where, params = ["ticket_search MATCH ?", "t.status != 'DELETED'"], [" ".join(f'"{w}"' for w in words)]
+    if user.role == 'customer':
+        where.append("t.created_by = ?")
+        params.append(user.id)
+    elif user.role == 'agent':
+        where.append("t.assigned_to = ?")
+        params.append(user.id)
+    elif user.role not in ['admin', 'supervisor']:
+        return [], False
+    columns = ", ".join(f"t.{column}" for column in TICKET_COLUMNS.split(", "))
+    rows = _query(
+        f"SELECT {columns} FROM ticket_search JOIN tickets t ON t.id = ticket_search.rowid "
+        f"WHERE {' AND '.join(where)} ORDER BY bm25(ticket_search, {search.TITLE_WEIGHT}.0, 1.0, 1.0) LIMIT ?",
+        params + [limit],
+    )
+    return _tickets(rows), False
+
+def can_view_ticket(user, ticket):
+    if user.role == 'customer':
+        return ticket.created_by.id == user.id
+    elif user.role in ['admin', 'supervisor']:
+        return True
+    elif user.role == 'agent':
+        return ticket.assigned_to is not None and ticket.assigned_to.id == user.id
+    return False
+
+# ستون -> مقدار آن از شیء تیکت. هر عملیات فقط ستون‌هایی را که خودش تغییر داده می‌نویسد؛ شیء تیکت پیش‌تر
+# در درخواست خوانده شده و نوشتن همه ستون‌ها تغییر هم‌زمان پروسه دیگری (مثلاً تخصیص در حین تغییر وضعیت) را برمی‌گرداند
+TICKET_WRITERS = {
+    "title": lambda t: t.title,
+    "content": lambda t: t.content,
+    "category_id": lambda t: t.category.id if t.category else None,
+    "status": lambda t: t.status.name,
+    "assigned_to": lambda t: t.assigned_to.id if t.assigned_to else None,
+}
+
+def _save_ticket(conn, ticket, *columns):
+    conn.execute(f"UPDATE tickets SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                 [TICKET_WRITERS[column](ticket) for column in columns] + [ticket.id])
+
+def create_new_ticket(title, content, creator_user, category, route=True):
+    new_ticket = Ticket(title=title, content=content, created_by_user=creator_user, category=category)
+    routed = None
+    with _transaction() as conn:
+        _insert_ticket(conn, new_ticket)
+        if route and routing.SETTINGS["auto_assign"]:
+            routed = _route_ticket(conn, *_router(conn), new_ticket, SYSTEM_USER)
+    events.publish("created", new_ticket)
+    if routed:
+        events.publish("assigned", new_ticket)
+    return new_ticket
+
+def _insert_ticket(conn, ticket):
+    cursor = conn.execute(
+        "INSERT INTO tickets (title, content, created_by, category_id, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (ticket.title, ticket.content, ticket.created_by.id, ticket.category.id if ticket.category else None,
+         ticket.status.name, ticket.created_ts),
+    )
+    ticket.id = cursor.lastrowid
+    conn.execute("INSERT INTO ticket_search (rowid, title, content, replies) VALUES (?, ?, ?, '')",
+                 (ticket.id, _search_text(ticket.title), _search_text(ticket.content)))
+    _insert_log(conn, ticket, ticket.created_by, "ایجاد تیکت")
+    _rollup(conn, analytics.created_rows(ticket))
+
+def edit_ticket_content(ticket, new_title, new_content, editor_user):
+    details = f"موضوع از '{ticket.title}' به '{new_title}' تغییر کرد."
+    ticket.title = new_title
+    ticket.content = new_content
+    with _transaction() as conn:
+        _save_ticket(conn, ticket, "title", "content")
+        conn.execute("UPDATE ticket_search SET title = ?, content = ? WHERE rowid = ?",
+                     (_search_text(new_title), _search_text(new_content), ticket.id))
+        _insert_log(conn, ticket, editor_user, "ویرایش تیکت", details)
+    return True
+
+def delete_ticket_by_id(ticket, deleter_user):
+    if deleter_user.role not in ['admin', 'supervisor']:
+        raise PermissionError("شما دسترسی لازم برای حذف تیکت را ندارید.")
+    ticket.status = TicketStatus.DELETED
+    with _transaction() as conn:
+        _save_ticket(conn, ticket, "status")
+        _insert_log(conn, ticket, deleter_user, "حذف تیکت")
+    events.publish("status", ticket)
+    return True
+
+def assign_ticket_to_agent(ticket, agent, assigner):
+    if assigner.role not in ['admin', 'supervisor']:
+        raise PermissionError("شما دسترسی لازم برای این کار را ندارید.")
+    previous = ticket.assigned_to
+    with _transaction() as conn:
+        _assign(conn, ticket, agent, assigner)
+    events.publish("assigned", ticket, previous_assignee=previous)
+    return True
+
+def _assign(conn, ticket, agent, assigner):
+    old_agent = ticket.assigned_to.username if ticket.assigned_to else "هیچکس"
+    ticket.assign_to(agent)
+    details = f"تیکت از '{old_agent}' به '{agent.username}' تخصیص داده شد."
+    _save_ticket(conn, ticket, "status", "assigned_to")
+    _insert_log(conn, ticket, assigner, "تخصیص کارشناس", details)
+
+def update_ticket_status(ticket, user, new_status):
+    old_status = ticket.status
+    ticket.status = new_status
+    with _transaction() as conn:
+        _save_ticket(conn, ticket, "status")
+        if analytics.closed(old_status, new_status):
+            _rollup(conn, analytics.closed_rows(ticket, datetime.datetime.now().timestamp()))
+        _insert_log(conn, ticket, user, "تغییر وضعیت تیکت",
+                    f"وضعیت از '{old_status.value}' به '{new_status.value}' تغییر یافت.")
+    events.publish("status", ticket)
+
+def close_ticket(ticket, user):
+    if ticket.status == TicketStatus.CLOSED:
+        return False
+    ticket.status = TicketStatus.CLOSED
+    with _transaction() as conn:
+        # شرط وضعیت در خود UPDATE تا بستن هم‌زمان از پروسه دیگر دو بار شمرده نشود
+        if conn.execute("UPDATE tickets SET status = 'CLOSED' WHERE id = ? AND status != 'CLOSED'",
+                        (ticket.id,)).rowcount == 0:
+            return False
+        _rollup(conn, analytics.closed_rows(ticket, datetime.datetime.now().timestamp()))
+        _insert_log(conn, ticket, user, "بستن تیکت")
+    events.publish("status", ticket)
+    return True
+
+# ستون‌هایی که هر عملیات دسته‌ای (services.BULK_ACTIONS) تغییر می‌دهد
+BULK_COLUMNS = {"close": ("status",), "delete": ("status",), "assign": ("status", "assigned_to"),
+                "category": ("category_id",)}
+
+def bulk_update_tickets(ticket_ids, action, user, agent=None, category=None):
+    # همان قرارداد services.bulk_update_tickets؛ خواندن تیکت‌ها، تغییرات و لاگ‌ها در یک تراکنش IMMEDIATE و با executemany
+    _check_bulk_action(action, user, agent, category)
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    results, changed, logs, rollups = {}, [], [], []
+    now = datetime.datetime.now().timestamp()
+    columns = BULK_COLUMNS[action]
+    with _transaction(immediate=True) as conn:
+        found = get_tickets_by_ids(ticket_ids)
+        for ticket_id in ticket_ids:
+            ticket = found.get(ticket_id)
+            if ticket is None:
+                results[ticket_id] = "not_found"
+                continue
+            if not can_view_ticket(user, ticket):
+                results[ticket_id] = "forbidden"
+                continue
+            previous, old_status = ticket.assigned_to, ticket.status
+            log = _bulk_change(ticket, action, agent, category)
+            if log is None:
+                results[ticket_id] = "unchanged"
+                continue
+            if analytics.closed(old_status, ticket.status):
+                rollups.extend(analytics.closed_rows(ticket, now))
+            results[ticket_id] = "updated"
+            changed.append((ticket, previous))
+            logs.append((ticket, *log))
+        conn.executemany(f"UPDATE tickets SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                         [[TICKET_WRITERS[column](ticket) for column in columns] + [ticket.id] for ticket, _ in changed])
+        _rollup(conn, rollups)
+        _insert_logs(conn, user, logs)
+    for ticket, previous in changed:
+        if action == 'assign':
+            events.publish("assigned", ticket, previous_assignee=previous)
+        else:
+            events.publish("updated" if action == 'category' else "status", ticket)
+    return results
+
+
+# --- توابع مدیریت پاسخ و لاگ ---
+def add_reply_to_ticket(ticket, user, content):
+    new_reply = Reply(ticket=ticket, user=user, content=content)
+    with _transaction() as conn:
+        if user.role != 'customer':
+            first = not conn.execute("SELECT 1 FROM replies JOIN users ON users.id = replies.user_id "
+                                     "WHERE replies.ticket_id = ? AND users.role != 'customer' LIMIT 1",
+                                     (ticket.id,)).fetchone()
+            _rollup(conn, analytics.reply_rows(ticket, new_reply, first))
+        cursor = conn.execute("INSERT INTO replies (ticket_id, user_id, content, created_at) VALUES (?, ?, ?, ?)",
+                              (ticket.id, user.id, content, new_reply.created_ts))
+        new_reply.id = cursor.lastrowid
+        conn.execute("UPDATE ticket_search SET replies = replies || ' ' || ? WHERE rowid = ?",
+                     (_search_text(content), ticket.id))
+        if user.role != 'customer' and ticket.status == TicketStatus.OPEN:
+            ticket.status = TicketStatus.ANSWERED
+            # فقط اگر در پایگاه داده هم هنوز باز باشد؛ بستن هم‌زمان توسط پروسه دیگر برنمی‌گردد
+            conn.execute("UPDATE tickets SET status = 'ANSWERED' WHERE id = ? AND status = 'OPEN'", (ticket.id,))
+        _insert_log(conn, ticket, user, "ثبت پاسخ", f'"{content[:30]}..."')
+    events.publish("reply", ticket, reply=new_reply)
+    return new_reply
+
+def get_replies_for_ticket(ticket_id):
+    ticket = get_ticket_by_id(ticket_id)
+    if not ticket:
+        return []
+    rows = _query("SELECT id, user_id, content, created_at FROM replies WHERE ticket_id = ? ORDER BY id", (ticket_id,))
+    return _thread_items(Reply, rows, ticket)
+
+def _page_before(cls, table, columns, ticket, before, limit):
+    rows = _query(
+        f"SELECT {columns} FROM {table} WHERE ticket_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+        (ticket.id, before if before is not None else 2 ** 63 - 1, limit + 1),
+    )
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = rows[-1][0]
+    return _thread_items(cls, rows[::-1], ticket), cursor
+
+def get_replies_page(ticket, before=None, limit=50):
+    return _page_before(Reply, "replies", "id, user_id, content, created_at", ticket, before, limit)
+
+def get_logs_page(ticket, before=None, limit=50):
+    return _page_before(LogEntry, "logs", "id, user_id, action, details, created_at", ticket, before, limit)
+
+def _insert_log(conn, ticket, user, action, details=""):
+    log = LogEntry(ticket=ticket, user=user, action=action, details=details)
+    cursor = conn.execute("INSERT INTO logs (ticket_id, user_id, action, details, created_at) VALUES (?, ?, ?, ?, ?)",
+                          (ticket.id, user.id, action, details, log.created_ts))
+    log.id = cursor.lastrowid
+    conn.execute("UPDATE tickets SET last_log_id = ? WHERE id = ?", (log.id, ticket.id))
+    _bump(conn, cache.ticket_key(ticket.id), cache.TICKETS)
+    if log.created_ts >= _audit_prune["next"]:
+        _prune_logs(conn)
+    return log
+
+def _insert_logs(conn, user, entries):
+    # نسخه چندتایی _insert_log؛ entries: [(تیکت، عملیات، توضیحات)]
+    if not entries:
+        return
+    now = datetime.datetime.now().timestamp()
+    conn.executemany("INSERT INTO logs (ticket_id, user_id, action, details, created_at) VALUES (?, ?, ?, ?, ?)",
+                     [(ticket.id, user.id, action, details, now) for ticket, action, details in entries])
+    ticket_ids = [ticket.id for ticket, _, _ in entries]
+    for chunk in _chunks(ticket_ids):
+        conn.execute("UPDATE tickets SET last_log_id = (SELECT MAX(id) FROM logs WHERE logs.ticket_id = tickets.id) "
+                     f"WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+    _bump(conn, *(cache.ticket_key(ticket_id) for ticket_id in ticket_ids), cache.TICKETS)
+    if now >= _audit_prune["next"]:
+        _prune_logs(conn)
+
+def _prune_logs(conn):
+    # همان سیاست نگهداری audit: رکوردهای قدیمی‌تر از retention_days به تفکیک بخش زمانی بایگانی و حذف می‌شوند.
+    # حداکثر یک بار در هر بخش زمانی و درون تراکنش رکوردی که آن را به راه انداخته اجرا می‌شود
+    segment_seconds = audit.SETTINGS["segment_seconds"]
+    now = datetime.datetime.now().timestamp()
+    _audit_prune["next"] = now - now % segment_seconds + segment_seconds
+    if not audit.SETTINGS["retention_days"]:
+        return
+    cutoff = now - audit.SETTINGS["retention_days"] * 86400
+    cutoff -= cutoff % segment_seconds
+    if audit.SETTINGS["archive_dir"]:
+        rows = conn.execute("SELECT id, created_at, ticket_id, user_id, action, details FROM logs "
+                            "WHERE created_at < ? ORDER BY id", (cutoff,)).fetchall()
+        segments = defaultdict(list)
+        for row in rows:
+            segments[row[1] - row[1] % segment_seconds].append(row)
+        for start, segment_rows in segments.items():
+            audit.write_archive(start, segment_rows)
+    conn.execute("DELETE FROM logs WHERE created_at < ?", (cutoff,))
+
+def _log_entries(rows):
+    # ردیف‌ها: (شناسه تیکت، شناسه، شناسه کاربر، عملیات، توضیحات، زمان)
+    tickets = {ticket.id: ticket for chunk in _chunks({row[0] for row in rows})
+               for ticket in _tickets(_query(f"SELECT {TICKET_COLUMNS} FROM tickets "
+                                             f"WHERE id IN ({','.join('?' * len(chunk))})", chunk))}
+    users = _load_users(row[2] for row in rows)
+    entries = []
+    for ticket_id, log_id, user_id, action, details, created_ts in rows:
+        log = LogEntry.__new__(LogEntry)
+        log.id, log.created_ts, log.action, log.details = log_id, created_ts, action, details
+        log.ticket, log.user = tickets.get(ticket_id), users.get(user_id)
+        entries.append(log)
+    return entries
+
+def get_logs_for_tickets(tickets):
+    by_id = {ticket.id: ticket for ticket in tickets}
+    grouped = defaultdict(list)
+    for chunk in _chunks(by_id):
+        rows = _query("SELECT ticket_id, id, user_id, action, details, created_at FROM logs "
+                      f"WHERE ticket_id IN ({','.join('?' * len(chunk))}) ORDER BY id", chunk)
+        for row in rows:
+            grouped[row[0]].append(row[1:])
+    return {ticket_id: _thread_items(LogEntry, grouped[ticket_id], ticket) for ticket_id, ticket in by_id.items()}
+
+def query_audit_log(start=None, end=None, actor=None, ticket_id=None, action=None, before=None, limit=100):
+    where, params = [], []
+    for condition, value in (("created_at >= ?", start and _ts(start)), ("created_at <= ?", end and _ts(end)),
+                             ("user_id = ?", actor and actor.id), ("ticket_id = ?", ticket_id),
+                             ("action = ?", action), ("id < ?", before)):
+        if value is not None:
+            where.append(condition)
+            params.append(value)
+    rows = _query("SELECT ticket_id, id, user_id, action, details, created_at FROM logs "
+                  f"{'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY id DESC LIMIT ?", params + [limit + 1])
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = rows[-1][1]
+    return _log_entries(rows), cursor
+
+def get_audit_actions():
+    return [row[0] for row in _query("SELECT DISTINCT action FROM logs ORDER BY action")]
+
+def add_log_to_ticket(ticket, user, action, details=""):
+    with _transaction() as conn:
+        _insert_log(conn, ticket, user, action, details)
+
+
+# --- توابع مدیریت دسته‌بندی‌ها ---
+def get_all_categories():
+    return [_category(row) for row in _query("SELECT id, name, created_at FROM categories WHERE deleted = 0 ORDER BY id")]
+
+def get_category_by_id(category_id):
+    rows = _query("SELECT id, name, created_at FROM categories WHERE id = ? AND deleted = 0", (category_id,))
+    return _category(rows[0]) if rows else None
+
+def get_category_by_name(name):
+    rows = _query("SELECT id, name, created_at FROM categories WHERE name = ? AND deleted = 0", (name,))
+    return _category(rows[0]) if rows else None
+
+def create_new_category(name):
+    if get_category_by_name(name):
+        raise ValueError("این دسته‌بندی قبلاً وجود دارد.")
+    new_category = Category(name)
+    with _transaction() as conn:
+        _insert_category(conn, new_category)
+    return new_category
+
+def _insert_category(conn, category):
+    try:
+        cursor = conn.execute("INSERT INTO categories (name, created_at) VALUES (?, ?)", (category.name, category.created_ts))
+    except sqlite3.IntegrityError:
+        raise ValueError("این دسته‌بندی قبلاً وجود دارد.")
+    category.id = cursor.lastrowid
+    _bump(conn, cache.DIRECTORY)
+
+def update_category(category_id, new_name):
+    category = get_category_by_id(category_id)
+    if not category:
+        raise ValueError("دسته‌بندی یافت نشد.")
+    if new_name and new_name != category.name and get_category_by_name(new_name):
+        raise ValueError("نام دسته‌بندی قبلاً وجود دارد.")
+    category.name = new_name
+    with _transaction() as conn:
+        conn.execute("UPDATE categories SET name = ? WHERE id = ?", (new_name, category_id))
+        _bump(conn, cache.DIRECTORY)
+    return category
+
+def delete_category(category_id):
+    with _transaction() as conn:
+        if conn.execute("UPDATE categories SET deleted = 1 WHERE id = ? AND deleted = 0", (category_id,)).rowcount == 0:
+            return False
+        _bump(conn, cache.DIRECTORY)
+        return True
+
+
+# --- تابع داشبورد ---
+def get_dashboard_stats():
+    status_counts = dict(_query("SELECT status, COUNT(*) FROM tickets WHERE status != 'DELETED' GROUP BY status"))
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    new_tickets_today = _query("SELECT COUNT(*) FROM tickets WHERE created_at >= ? AND status != 'DELETED'",
+                               (_ts(today),))[0][0]
+    workload = dict(_query("SELECT assigned_to, COUNT(*) FROM tickets WHERE assigned_to IS NOT NULL "
+                           "AND status != 'DELETED' GROUP BY assigned_to"))
+    recent_rows = _query(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE status != 'DELETED' "
+                         "ORDER BY last_log_id DESC LIMIT 5")
+    return {
+        "total_tickets": sum(status_counts.values()),
+        "open_tickets": status_counts.get(TicketStatus.OPEN.name, 0),
+        "in_progress_tickets": status_counts.get(TicketStatus.IN_PROGRESS.name, 0),
+        "answered_tickets": status_counts.get(TicketStatus.ANSWERED.name, 0),
+        "new_tickets_today": new_tickets_today,
+        "agent_workload": {agent.username: workload.get(agent.id, 0) for agent in get_all_agents()},
+        "recently_updated_tickets": _tickets(recent_rows),
+    }
+
+
+# --- ورود و خروج دسته‌ای؛ هر دسته در یک تراکنش ---
+def import_users(rows):
+    results = []
+    with _transaction() as conn:
+        for username, password_hash, role in rows:
+            try:
+                user = User(username, None, role, password_hash)
+                _insert_user(conn, user)
+                results.append(user.id)
+            except ValueError as e:
+                results.append(e)
+    return results
+
+def import_categories(names):
+    results = []
+    with _transaction() as conn:
+        for name in names:
+            try:
+                category = Category(name)
+                _insert_category(conn, category)
+                results.append(category.id)
+            except ValueError as e:
+                results.append(e)
+    return results
+
+def import_tickets(rows, importer):
+    results = []
+    router = None
+    with _transaction() as conn:
+        for title, content, creator_name, category_name, assignee_name in rows:
+            try:
+                creator = get_user_by_username(creator_name)
+                if not creator:
+                    raise ValueError(f"کاربر '{creator_name}' پیدا نشد.")
+                category = get_category_by_name(category_name)
+                if not category:
+                    raise ValueError(f"دسته‌بندی '{category_name}' پیدا نشد.")
+                agent = get_user_by_username(assignee_name) if assignee_name else None
+                if assignee_name and (not agent or agent.role != 'agent'):
+                    raise ValueError(f"کارشناس '{assignee_name}' پیدا نشد.")
+                if agent and importer.role not in ['admin', 'supervisor']:
+                    raise PermissionError("شما دسترسی لازم برای این کار را ندارید.")
+                ticket = Ticket(title=title, content=content, created_by_user=creator, category=category)
+                _insert_ticket(conn, ticket)
+                if agent:
+                    _assign(conn, ticket, agent, importer)
+                    if router:
+                        router[0].add_load(agent.id, +1)
+                elif routing.SETTINGS["auto_assign"]:
+                    router = router or _router(conn)
+                    _route_ticket(conn, *router, ticket, SYSTEM_USER)
+                results.append(ticket.id)
+            except (ValueError, PermissionError) as e:
+                results.append(e)
+    return results
+
+def get_tickets_after(after_id, limit):
+    tickets = _tickets(_query(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)))
+    if not tickets:
+        return tickets
+    by_id = {ticket.id: ticket for ticket in tickets}
+    placeholders = ",".join("?" * len(by_id))
+    rows = _query(f"SELECT ticket_id, id, user_id, content, created_at FROM replies WHERE ticket_id IN ({placeholders}) "
+                  "ORDER BY id", list(by_id))
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[0]].append(row[1:])
+    for ticket_id, ticket_rows in grouped.items():
+        by_id[ticket_id].replies = _thread_items(Reply, ticket_rows, by_id[ticket_id])
+    return tickets
+
+def archive_tickets():
+    # لایه سرد برای DB درون‌حافظه‌ای است؛ در SQLite تیکت‌های بسته روی دیسک هستند و ایندکس‌ها کار را محدود می‌کنند
+    return 0
+
+def is_archived(ticket):
+    return False
+
+# --- تخصیص خودکار (ر.ک. routing.py) ---
+# بار کارشناسان بین پروسه‌ها مشترک است، پس به‌جای نگه داشتن در حافظه در هر تراکنش تخصیص از ایندکس
+# جزئی idx_tickets_open_load خوانده و در یک routing.Router موقت قرار می‌گیرد
+def _router(conn):
+    router = routing.Router()
+    placeholders = ",".join("?" * len(routing.OPEN_STATUSES))
+    router.load.update(conn.execute(f"SELECT assigned_to, COUNT(*) FROM tickets WHERE status IN ({placeholders}) "
+                                    "AND assigned_to IS NOT NULL GROUP BY assigned_to",
+                                    [status.name for status in routing.OPEN_STATUSES]).fetchall())
+    agents = {row[0]: _user(row) for row in conn.execute(
+        f"SELECT {USER_COLUMNS} FROM users WHERE role = 'agent' AND deleted = 0 ORDER BY id")}
+    router.set_agents(agents.values())
+    return router, agents
+
+def _route_ticket(conn, router, agents, ticket, actor, action="تخصیص خودکار"):
+    agent_id = router.pick(ticket.category.name if ticket.category else None)
+    if agent_id is None:
+        return None
+    agent, previous = agents[agent_id], ticket.assigned_to
+    ticket.assign_to(agent)
+    _save_ticket(conn, ticket, "status", "assigned_to")
+    if previous:
+        details = f"تیکت از '{previous.username}' به '{agent.username}' منتقل شد."
+        router.add_load(previous.id, -1)
+    else:
+        details = f"تیکت به '{agent.username}' تخصیص داده شد."
+    router.add_load(agent_id, +1)
+    _insert_log(conn, ticket, actor, action, details)
+    return agent
+
+def route_tickets(actor, rebalance=False):
+    # همه در یک تراکنش؛ رویدادها پس از commit منتشر می‌شوند
+    if actor.role not in ['admin', 'supervisor']:
+        raise PermissionError("شما دسترسی لازم برای این کار را ندارید.")
+    open_statuses = [status.name for status in routing.OPEN_STATUSES]
+    placeholders = ",".join("?" * len(open_statuses))
+    changed = []
+    moved = 0
+    with _transaction() as conn:
+        router, agents = _router(conn)
+        if agents:
+            rows = conn.execute(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE assigned_to IS NULL "
+                                f"AND status IN ({placeholders}) ORDER BY id", open_statuses).fetchall()
+            for ticket in _tickets(rows):
+                if _route_ticket(conn, router, agents, ticket, actor) is None:
+                    break
+                changed.append((ticket, None))
+        assigned = len(changed)
+        if rebalance:
+            for donor in sorted(router.agents, key=lambda agent_id: router.load.get(agent_id, 0), reverse=True):
+                rows = conn.execute(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE assigned_to = ? AND status = 'IN_PROGRESS' "
+                                    "AND NOT EXISTS (SELECT 1 FROM replies WHERE replies.ticket_id = tickets.id) "
+                                    "ORDER BY id DESC", (donor,)).fetchall()
+                for ticket in _tickets(rows):
+                    lightest = router.pick()
+                    if lightest is None or router.load.get(lightest, 0) + 1 >= router.load.get(donor, 0):
+                        break
+                    target = router.pick(ticket.category.name if ticket.category else None)
+                    if target is None or target == donor or router.load.get(target, 0) + 1 >= router.load.get(donor, 0):
+                        continue
+                    previous = ticket.assigned_to
+                    _route_ticket(conn, router, agents, ticket, actor, "توزیع مجدد")
+                    changed.append((ticket, previous))
+                    moved += 1
+    for ticket, previous in changed:
+        events.publish("assigned", ticket, previous_assignee=previous)
+    return {"assigned": assigned, "moved": moved}
+
+
+# --- آمار تحلیلی (ر.ک. analytics.py) ---
+def _rollup(conn, rows):
+    if rows:
+        conn.executemany("INSERT INTO rollups (day, metric, key, count, total) VALUES (?, ?, ?, ?, ?) "
+                         "ON CONFLICT(day, metric, key) DO UPDATE SET count = count + excluded.count, "
+                         "total = total + excluded.total", rows)
+
+def get_analytics(start, end):
+    rows = _query("SELECT day, metric, key, count, total FROM rollups WHERE day BETWEEN ? AND ?",
+                  (start.isoformat(), end.isoformat()))
+    return analytics.report(rows, start, end)
+
+def rebuild_analytics():
+    # در یک تراکنش: لاگ‌ها با cursor پیمایش می‌شوند (بدون بارگذاری همه) و نوشتن‌های هم‌زمان تا پایان منتظر می‌مانند
+    rollups = {}
+    with _transaction() as conn:
+        roles = dict(conn.execute("SELECT id, role FROM users"))
+        info = {row[0]: row[1:] for row in conn.execute("SELECT id, created_at, category_id, assigned_to FROM tickets")}
+        logs = conn.execute("SELECT id, created_at, ticket_id, user_id, action, details FROM logs ORDER BY id")
+        processed = analytics.replay(logs, roles, info.get, rollups)
+        conn.execute("DELETE FROM rollups")
+        _rollup(conn, [(day, metric, key, count, total) for day, cells in rollups.items()
+                       for (metric, key), (count, total) in cells.items()])
+    return processed
+
+
+# --- نسخه موجودیت‌ها ---
+def _bump(conn, *keys):
+    # در همان تراکنش تغییر؛ نسخه از ساعت پروسه گرفته می‌شود ولی هرگز از نسخه قبلی کمتر نمی‌شود
+    now = datetime.datetime.now().timestamp()
+    conn.executemany("INSERT INTO versions (key, version, updated_at) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE "
+                     "SET version = MAX(version + 1, excluded.version), updated_at = excluded.updated_at",
+                     [(key, cache.next_version(), now) for key in keys])
+    cache.invalidate(*keys)
+
+def get_versions(keys):
+    found = {}
+    for chunk in _chunks(keys):
+        rows = _query(f"SELECT key, version, updated_at FROM versions WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        found.update((row[0], (row[1], row[2])) for row in rows)
+    return {key: found.get(key, (0, cache.STARTED)) for key in keys}
+
+def store_sizes():
+    sizes = {kind: _query(f"SELECT COUNT(*) FROM {kind} WHERE deleted = 0")[0][0] for kind in ("users", "categories")}
+    sizes.update((kind, _query(f"SELECT COUNT(*) FROM {kind}")[0][0]) for kind in ("tickets", "replies", "logs"))
+    return sizes
+
+
+# توابعی که با انتخاب این backend جایگزین نسخه‌های درون‌حافظه‌ای services.py می‌شوند
+SERVICE_FUNCTIONS = (
+    "get_user_by_id", "get_user_by_username", "get_all_users", "get_all_agents",
+    "create_new_user", "update_user", "set_password_hash", "delete_user",
+    "get_ticket_by_id", "get_tickets_by_ids", "get_tickets_for_user", "query_tickets", "search_tickets", "can_view_ticket",
+    "create_new_ticket", "edit_ticket_content", "delete_ticket_by_id", "assign_ticket_to_agent",
+    "update_ticket_status", "close_ticket", "bulk_update_tickets",
+    "add_reply_to_ticket", "get_replies_for_ticket", "get_replies_page", "get_logs_page", "add_log_to_ticket",
+    "get_logs_for_tickets", "query_audit_log", "get_audit_actions",
+    "get_all_categories", "get_category_by_id", "get_category_by_name",
+    "create_new_category", "update_category", "delete_category",
+    "import_users", "import_categories", "import_tickets", "get_tickets_after",
+    "archive_tickets", "is_archived", "get_versions", "route_tickets", "get_analytics", "rebuild_analytics",
+    "get_dashboard_stats", "store_sizes",
+)
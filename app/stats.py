@@ -0,0 +1,112 @@
+# ticketing/app/stats.py
+
+from collections import Counter, OrderedDict
+from datetime import date
+import heapq
+
+from .models import TicketStatus
+
+# شمارنده‌های داشبورد که همراه با هر تغییر تیکت به‌روز می‌شوند تا خواندن آن‌ها O(1) باشد
+# فقط تیکت‌های حذف‌نشده در شمارش‌ها حساب می‌شوند
+STATS = {
+    "status_counts": Counter(),
+    "agent_workload": Counter(),    # شناسه کارشناس -> تعداد تیکت‌های فعال تخصیص‌یافته
+    "created_per_day": Counter(),   # تاریخ -> تعداد تیکت‌های فعال ایجادشده در آن روز
+    "recent": OrderedDict(),        # شناسه تیکت -> تیکت، به ترتیب آخرین به‌روزرسانی
+}
+
+# حداکثر تعداد تیکت‌هایی که در فهرست «آخرین به‌روزرسانی‌ها» نگه داشته می‌شوند
+RECENT_CAPACITY = 100
+
+
+def _apply(status, assignee_id, created_day, sign):
+    if status is None or status == TicketStatus.DELETED:
+        return
+    STATS["status_counts"][status] += sign
+    STATS["created_per_day"][created_day] += sign
+    if assignee_id is not None:
+        STATS["agent_workload"][assignee_id] += sign
+
+def ticket_changed(ticket, old_keys):
+    # old_keys همان خروجی repository.reindex_ticket است: (سازنده، کارشناس، وضعیت، ...)
+    old_assignee_id, old_status = old_keys[1], old_keys[2]
+    new_assignee_id = ticket.assigned_to.id if ticket.assigned_to else None
+    if (old_status, old_assignee_id) == (ticket.status, new_assignee_id):
+        return
+    created_day = ticket.created_at.date()
+    _apply(old_status, old_assignee_id, created_day, -1)
+    _apply(ticket.status, new_assignee_id, created_day, +1)
+    if ticket.status == TicketStatus.DELETED:
+        STATS["recent"].pop(ticket.id, None)
+
+def ticket_removed(ticket):
+    # تیکتی که از DB بیرون می‌رود (انتقال به لایه سرد)
+    _apply(ticket.status, ticket.assigned_to.id if ticket.assigned_to else None, ticket.created_at.date(), -1)
+    STATS["recent"].pop(ticket.id, None)
+
+def ticket_touched(ticket):
+    recent = STATS["recent"]
+    if ticket.status == TicketStatus.DELETED:
+        recent.pop(ticket.id, None)
+        return
+    recent[ticket.id] = ticket
+    recent.move_to_end(ticket.id)
+    if len(recent) > RECENT_CAPACITY:
+        recent.popitem(last=False)
+
+
+def last_update(ticket):
+    return ticket.updated_ts
+
+def recently_updated(tickets, limit=5):
+    recent = STATS["recent"]
+    if len(recent) < limit and len(recent) < sum(STATS["status_counts"].values()):
+        # حذف تیکت‌ها فهرست را خالی کرده است؛ یک بار از روی همه تیکت‌ها پر می‌کنیم
+        _refill_recent(tickets)
+        recent = STATS["recent"]
+    result = []
+    for ticket in reversed(recent.values()):
+        result.append(ticket)
+        if len(result) == limit:
+            break
+    return result
+
+def _refill_recent(tickets):
+    active = (t for t in tickets if t.status != TicketStatus.DELETED)
+    newest = heapq.nlargest(RECENT_CAPACITY, active, key=last_update)
+    STATS["recent"] = OrderedDict((t.id, t) for t in reversed(newest))
+
+def snapshot(agents, tickets):
+    counts = STATS["status_counts"]
+    workload = STATS["agent_workload"]
+    return {
+        "total_tickets": sum(counts.values()),
+        "open_tickets": counts.get(TicketStatus.OPEN, 0),
+        "in_progress_tickets": counts.get(TicketStatus.IN_PROGRESS, 0),
+        "answered_tickets": counts.get(TicketStatus.ANSWERED, 0),
+        "new_tickets_today": STATS["created_per_day"].get(date.today(), 0),
+        "agent_workload": {agent.username: workload.get(agent.id, 0) for agent in agents},
+        "recently_updated_tickets": recently_updated(tickets),
+    }
+
+
+def rebuild(tickets):
+    for counter in ("status_counts", "agent_workload", "created_per_day"):
+        STATS[counter].clear()
+    for ticket in tickets:
+        _apply(ticket.status, ticket.assigned_to.id if ticket.assigned_to else None, ticket.created_at.date(), +1)
+    _refill_recent(tickets)
+
+def compare(current, expected):
+    # اختلاف‌های شمارنده‌های افزایشی با محاسبه کامل را برمی‌گرداند (لیست خالی یعنی سازگار)
+    mismatches = []
+    for key, value in expected.items():
+        if key == "recently_updated_tickets":
+            # در زمان‌های یکسان ترتیب تیکت‌ها قطعی نیست، پس زمان‌ها مقایسه می‌شوند
+            value = [last_update(t) for t in value]
+            actual = [last_update(t) for t in current[key]]
+        else:
+            actual = current[key]
+        if actual != value:
+            mismatches.append((key, actual, value))
+    return mismatches
@@ -0,0 +1,164 @@
+# ticketing/app/transfer.py
+
+import csv
+import io
+import json
+
+from . import passwords, services
+
+# ورود و خروج جریانی کاربران، دسته‌بندی‌ها و تیکت‌ها (CSV یا JSONL).
+# ورودی ردیف به ردیف خوانده و در دسته‌های BATCH_SIZE تایی ثبت می‌شود؛ هر دسته یک بار قفل نوشتن
+# (یا یک تراکنش sqlite) می‌گیرد. نتیجه یک generator از دیکشنری‌هاست: برای هر ردیف خطادار یکی و در پایان خلاصه.
+# خروجی تیکت‌ها هم تکه به تکه (CHUNK_SIZE تیکت) تولید می‌شود و حافظه آن به تعداد تیکت‌ها بستگی ندارد.
+SETTINGS = {"batch_size": 500, "chunk_size": 200}
+KINDS = ("users", "categories", "tickets")
+ROLES = ('customer', 'agent', 'supervisor', 'admin')
+TICKET_FIELDS = ["id", "title", "content", "status", "created_by", "category", "assigned_to", "created_at", "replies"]
+
+
+def init_app(app):
+    SETTINGS["batch_size"] = app.config["IMPORT_BATCH_SIZE"]
+    SETTINGS["chunk_size"] = app.config["EXPORT_CHUNK_SIZE"]
+
+
+# --- خواندن ورودی ---
+def read_rows(stream, fmt):
+    # stream جریان باینری است (فایل آپلودشده یا باز شده با 'rb')؛ خروجی (شماره ردیف، دیکشنری یا خطا)
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        # شماره ردیف 1 سرستون است
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, {key.strip(): (value or "").strip() for key, value in row.items() if key}
+    elif fmt == "jsonl":
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, ValueError("JSON نامعتبر است.")
+                continue
+            if not isinstance(row, dict):
+                yield number, ValueError("هر خط باید یک شیء JSON باشد.")
+                continue
+            yield number, {key: "" if value is None else str(value).strip() for key, value in row.items()}
+    else:
+        raise ValueError(f"قالب '{fmt}' پشتیبانی نمی‌شود.")
+
+def _required(row, *fields):
+    values = [row.get(field, "") for field in fields]
+    missing = [field for field, value in zip(fields, values) if not value]
+    if missing:
+        raise ValueError(f"ستون‌های {', '.join(missing)} خالی است.")
+    return values
+
+def _parse_user(row):
+    username, role = _required(row, "username", "role")
+    if role not in ROLES:
+        raise ValueError(f"نقش '{role}' نامعتبر است.")
+    if not row.get("password") and not row.get("password_hash"):
+        raise ValueError("ستون password یا password_hash لازم است.")
+    return username, row.get("password") or None, row.get("password_hash") or None, role
+
+def _parse_ticket(row):
+    title, content, creator, category = _required(row, "title", "content", "created_by", "category")
+    return title, content, creator, category, row.get("assigned_to") or None
+
+
+def _import_batch(kind, batch, importer):
+    if kind == "users":
+        # رمزهای ساده این دسته با هم و موازی هش می‌شوند، بیرون از قفل نوشتن
+        plain = [password for _, (_, password, password_hash, _) in batch if not password_hash]
+        hashed = iter(passwords.hash_many(plain))
+        rows = [(username, password_hash or next(hashed), role)
+                for _, (username, password, password_hash, role) in batch]
+        return services.import_users(rows)
+    if kind == "categories":
+        return services.import_categories([name for _, name in batch])
+    return services.import_tickets([row for _, row in batch], importer)
+
+def import_rows(kind, stream, fmt, importer):
+    if kind not in KINDS:
+        raise ValueError(f"نوع '{kind}' پشتیبانی نمی‌شود.")
+    parse = {"users": _parse_user, "categories": lambda row: _required(row, "name")[0],
+             "tickets": _parse_ticket}[kind]
+    summary = {"kind": kind, "imported": 0, "failed": 0}
+    batch = []
+
+    def flush():
+        for (number, _), result in zip(batch, _import_batch(kind, batch, importer)):
+            if isinstance(result, Exception):
+                summary["failed"] += 1
+                yield {"row": number, "error": str(result)}
+            else:
+                summary["imported"] += 1
+        batch.clear()
+
+    for number, row in read_rows(stream, fmt):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            batch.append((number, parse(row)))
+        except ValueError as e:
+            summary["failed"] += 1
+            yield {"row": number, "error": str(e)}
+            continue
+        if len(batch) >= SETTINGS["batch_size"]:
+            yield from flush()
+    yield from flush()
+    yield summary
+
+
+# --- خروجی ---
+def iter_tickets():
+    # پیمایش keyset روی شناسه؛ هر تکه جداگانه و با قفل خواندن کوتاه گرفته می‌شود. خروجی (تیکت، تاریخچه آن)
+    after_id = 0
+    while True:
+        tickets = services.get_tickets_after(after_id, SETTINGS["chunk_size"])
+        if not tickets:
+            return
+        logs = services.get_logs_for_tickets(tickets)
+        for ticket in tickets:
+            yield ticket, logs[ticket.id]
+        after_id = tickets[-1].id
+
+def _name(user):
+    return user.username if user else None
+
+def ticket_record(ticket, logs):
+    return {
+        "id": ticket.id,
+        "title": ticket.title,
+        "content": ticket.content,
+        "status": ticket.status.name,
+        "created_by": _name(ticket.created_by),
+        "category": ticket.category.name if ticket.category else None,
+        "assigned_to": _name(ticket.assigned_to),
+        "created_at": ticket.created_at.isoformat(),
+        "replies": [{"user": _name(reply.user), "content": reply.content, "created_at": reply.created_at.isoformat()}
+                    for reply in ticket.replies],
+        "logs": [{"user": _name(log.user), "action": log.action, "details": log.details,
+                  "created_at": log.created_at.isoformat()} for log in logs],
+    }
+
+def export_tickets(fmt):
+    # تکه‌های متنی؛ مستقیم به Response جریانی یا فایل نوشته می‌شوند
+    if fmt == "jsonl":
+        for ticket, logs in iter_tickets():
+            yield json.dumps(ticket_record(ticket, logs), ensure_ascii=False) + "\n"
+    elif fmt == "csv":
+        # CSV تخت است: به‌جای پاسخ‌ها فقط تعدادشان و بدون تاریخچه
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, TICKET_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for ticket, logs in iter_tickets():
+            record = ticket_record(ticket, logs)
+            record["replies"] = len(record["replies"])
+            writer.writerow(record)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        raise ValueError(f"قالب '{fmt}' پشتیبانی نمی‌شود.")
@@ -0,0 +1,187 @@
+# ticketing/benchmarks/bench.py
+#
+# بنچمارک تکرارپذیر توابع سرویس و روت‌های Flask در اندازه‌های رو به افزایش داده.
+# برای هر اندازه، داده با datagen تا آن اندازه بزرگ می‌شود و هر سناریو چند بار اجرا می‌شود؛
+# خروجی جدول p50/p95/p99 و توان عملیاتی است و با --output به صورت JSON ذخیره می‌شود
+# تا با --compare بین نسخه‌ها مقایسه شود.
+#
+#   python benchmarks/bench.py --sizes 1000,10000,100000 --output bench-main.json
+#   python benchmarks/bench.py --sizes 1000,10000,100000 --compare bench-main.json
+#   python benchmarks/bench.py --backend sqlite --only routes
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, fraction):
+    # nearest-rank: کوچک‌ترین مقداری که دست‌کم fraction از نمونه‌ها کمتر یا مساوی آن هستند
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(func, repeat, warmup=5):
+    for _ in range(min(warmup, repeat)):
+        func()
+    timings = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        begin = time.perf_counter_ns()
+        func()
+        timings.append(time.perf_counter_ns() - begin)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "n": repeat,
+        "p50_ms": percentile(timings, 0.50) / 1e6,
+        "p95_ms": percentile(timings, 0.95) / 1e6,
+        "p99_ms": percentile(timings, 0.99) / 1e6,
+        "mean_ms": sum(timings) / len(timings) / 1e6,
+        "ops_per_sec": repeat / elapsed if elapsed else 0.0,
+    }
+
+
+def service_scenarios(services, load_user, rng, state):
+    admin = services.get_user_by_username("admin")
+    pick_ticket = lambda: rng.choice(state["tickets"])
+    return {
+        "get_tickets_for_user[customer]": lambda: services.get_tickets_for_user(rng.choice(state["customers"])),
+        "get_tickets_for_user[agent]": lambda: services.get_tickets_for_user(rng.choice(state["agents"])),
+        "get_tickets_for_user[admin]": lambda: services.get_tickets_for_user(admin),
+        "query_tickets[admin,updated]": lambda: services.query_tickets(admin, sort='updated', limit=25),
+        "get_dashboard_stats": services.get_dashboard_stats,
+        "get_replies_for_ticket": lambda: services.get_replies_for_ticket(pick_ticket()),
+        "search_tickets[admin]": lambda: services.search_tickets(admin, "synthetic reply"),
+        "load_user": lambda: load_user(str(rng.choice(state["customers"]).id)),
+    }
+
+
+def route_scenarios(app, rng, state, password):
+    def client_for(username, user_password):
+        client = app.test_client()
+        response = client.post("/login", data={"username": username, "password": user_password})
+        if response.status_code != 302:
+            raise RuntimeError(f"login failed for {username}")
+        return client
+
+    admin = client_for("admin", "123")
+    customer = state["customers"][0]
+    customer_client = client_for(customer.username, password)
+
+    def get(client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} -> {response.status_code}")
+
+    def login():
+        response = app.test_client().post("/login", data={"username": customer.username, "password": password})
+        if response.status_code != 302:
+            raise RuntimeError("login failed")
+
+    return {
+        "GET /tickets[admin]": lambda: get(admin, "/tickets"),
+        "GET /tickets[customer]": lambda: get(customer_client, "/tickets"),
+        "GET /ticket/<id>": lambda: get(admin, f"/ticket/{rng.choice(state['tickets'])}"),
+        "GET /dashboard": lambda: get(admin, "/dashboard"),
+        "POST /login": login,
+    }
+
+
+def print_table(rows, baseline=None):
+    header = f"{'size':>8}  {'scenario':<34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}"
+    if baseline:
+        header += f" {'p50 Δ':>8} {'p95 Δ':>8}"
+    print(header)
+    for row in rows:
+        line = (f"{row['size']:>8}  {row['name']:<34} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} "
+                f"{row['p99_ms']:>9.3f} {row['ops_per_sec']:>10.0f}")
+        old = baseline.get((row["size"], row["name"])) if baseline else None
+        if old:
+            line += "".join(f" {(row[key] / old[key] - 1) * 100 if old[key] else 0:>+7.0f}%" for key in ("p50_ms", "p95_ms"))
+        print(line)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بنچمارک سرویس‌ها و روت‌ها")
+    parser.add_argument("--sizes", default="1000,10000", help="تعداد تیکت‌ها در هر مرحله، با کاما")
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--only", choices=["services", "routes"], default=None)
+    parser.add_argument("--repeat", type=int, default=200, help="تعداد اجرای هر سناریو")
+    parser.add_argument("--login-repeat", type=int, default=20, help="تعداد اجرای سناریوی ورود (هش رمز کند است)")
+    parser.add_argument("--replies", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="مسیر فایل JSON نتایج")
+    parser.add_argument("--compare", help="فایل JSON یک اجرای قبلی برای مقایسه")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    # تنظیمات پیش از import برنامه: بدون ژورنال روی دیسک و با پایگاه داده موقت برای sqlite
+    os.environ["TICKETING_DATA_DIR"] = ""
+    os.environ["TICKETING_STORAGE_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["TICKETING_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="ticketing-bench-"), "bench.db")
+    sys.path.insert(0, ROOT)
+    import random
+    import datagen
+    from app import app, load_user, services
+
+    datagen.setup(max(10, sizes[-1] // 20), max(3, sizes[-1] // 500), 20, args.seed)
+    rng = random.Random(args.seed)
+    rows, generated = [], 0
+    for size in sizes:
+        started = time.perf_counter()
+        datagen.add_tickets(size - generated, args.replies)
+        generated = size
+        print(f"# {size} tickets ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        scenarios = []
+        if args.only != "routes":
+            scenarios += [("service", name, func, args.repeat)
+                          for name, func in service_scenarios(services, load_user, rng, datagen.STATE).items()]
+        if args.only != "services":
+            scenarios += [("route", name, func, args.login_repeat if name == "POST /login" else args.repeat)
+                          for name, func in route_scenarios(app, rng, datagen.STATE, datagen.BENCH_PASSWORD).items()]
+        for kind, name, func, repeat in scenarios:
+            rows.append({"size": size, "kind": kind, "name": name, **measure(func, repeat)})
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = {(row["size"], row["name"]): row for row in json.load(baseline_file)["results"]}
+    print_table(rows, baseline)
+
+    if args.output:
+        report = {
+            "meta": {
+                "revision": git_revision(),
+                "backend": args.backend,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+            "results": rows,
+        }
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"# results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# ticketing/benchmarks/datagen.py
+#
+# تولید داده مصنوعی از طریق API خود services.py (با هر backend ذخیره‌سازی):
+# مشتری، کارشناس، دسته‌بندی، تیکت، پاسخ و رویدادهای تاریخچه (تخصیص، تغییر وضعیت، بستن).
+# با seed ثابت، داده تولیدشده در هر اجرا یکسان است. فراخوانی‌های پیاپی add_tickets داده را افزایشی بزرگ می‌کنند.
+#
+#   python benchmarks/datagen.py --tickets 10000      # فقط تولید و گزارش زمان
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TICKETING_DATA_DIR", "")
+
+from app import passwords, services  # noqa: E402
+from app.models import TicketStatus  # noqa: E402
+
+BENCH_PASSWORD = "bench-password"
+
+STATE = {"rng": None, "customers": [], "agents": [], "categories": [], "staff": None, "tickets": []}
+
+
+def setup(customers, agents, categories, seed=1):
+    # کاربران و دسته‌بندی‌ها یک بار ساخته می‌شوند؛ هش رمز یک بار محاسبه و برای همه استفاده می‌شود
+    STATE["rng"] = random.Random(seed)
+    password_hash = passwords.hash_password(BENCH_PASSWORD)
+
+    def user(name, role):
+        return services.get_user_by_username(name) or services.create_new_user(name, BENCH_PASSWORD, role, password_hash)
+
+    STATE["customers"] = [user(f"bench-customer-{i}", "customer") for i in range(customers)]
+    STATE["agents"] = [user(f"bench-agent-{i}", "agent") for i in range(agents)]
+    STATE["staff"] = user("bench-supervisor", "supervisor")
+    for i in range(categories):
+        name = f"bench-category-{i}"
+        if not services.get_category_by_name(name):
+            services.create_new_category(name)
+    STATE["categories"] = services.get_all_categories()
+
+
+def add_tickets(count, replies_per_ticket=3):
+    rng, staff = STATE["rng"], STATE["staff"]
+    for _ in range(count):
+        customer = rng.choice(STATE["customers"])
+        ticket = services.create_new_ticket(f"bench ticket {rng.randrange(10 ** 6)}",
+                                            "synthetic benchmark content", customer, rng.choice(STATE["categories"]),
+                                            route=False)
+        STATE["tickets"].append(ticket.id)
+        agent = None
+        if rng.random() < 0.8:
+            agent = rng.choice(STATE["agents"])
+            services.assign_ticket_to_agent(ticket, agent, staff)
+        for i in range(rng.randint(0, 2 * replies_per_ticket)):
+            author = agent if agent and i % 2 else customer
+            services.add_reply_to_ticket(ticket, author, f"synthetic reply {i}")
+        roll = rng.random()
+        if roll < 0.2:
+            services.close_ticket(ticket, staff)
+        elif roll < 0.25:
+            services.update_ticket_status(ticket, staff, TicketStatus.ANSWERED)
+        elif roll < 0.27:
+            services.delete_ticket_by_id(ticket, staff)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="تولید داده مصنوعی برای بنچمارک")
+    parser.add_argument("--tickets", type=int, default=10000)
+    parser.add_argument("--customers", type=int, default=None)
+    parser.add_argument("--agents", type=int, default=None)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--replies", type=int, default=3, help="میانگین تعداد پاسخ برای هر تیکت")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    setup(args.customers or max(10, args.tickets // 20), args.agents or max(3, args.tickets // 500),
+          args.categories, args.seed)
+    add_tickets(args.tickets, args.replies)
+    elapsed = time.perf_counter() - started
+    print(f"{args.tickets} tickets in {elapsed:.1f}s ({args.tickets / elapsed:.0f} tickets/s)")
+
+
+if __name__ == "__main__":
+    main()
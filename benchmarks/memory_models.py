@@ -0,0 +1,135 @@
+# ticketing/benchmarks/memory_models.py
+#
+# اندازه‌گیری حافظه مدل‌ها: تعداد زیادی تیکت با پاسخ و رکورد تاریخچه ساخته می‌شود و
+# بایت مصرفی برای هر تیکت/پاسخ/رکورد تاریخچه با tracemalloc گزارش می‌شود.
+# رکوردهای تاریخچه در حالت عادی مثل برنامه در بخش‌های audit (app/audit.py) ذخیره می‌شوند.
+# با --legacy همان داده با کلاس‌های قدیمی (__dict__ و datetime برای هر نمونه) ساخته می‌شود
+# تا وضعیت پیش و پس از __slots__ مقایسه شود. متن تیکت‌ها مشترک است تا فقط سربار خود اشیا سنجیده شود؛
+# عنوان عملیات‌ها مثل بازخوانی از ژورنال، برای هر رکورد رشته جدیدی است.
+#
+#   python benchmarks/memory_models.py --tickets 1000000
+#   python benchmarks/memory_models.py --tickets 1000000 --legacy
+
+import argparse
+import datetime
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import audit  # noqa: E402
+from app.models import User, Category, Ticket, Reply, TicketStatus  # noqa: E402
+
+ACTIONS = ["ایجاد تیکت", "ثبت پاسخ", "تخصیص کارشناس", "تغییر وضعیت"]
+
+
+# کلاس‌های مدل به شکل پیش از __slots__، فقط برای مقایسه
+class LegacyTicket:
+    def __init__(self, item_id, title, content, created_by_user, category):
+        self.id = item_id
+        self.created_at = datetime.datetime.now()
+        self.title = title
+        self.content = content
+        self.created_by = created_by_user
+        self.category = category
+        self.status = TicketStatus.OPEN
+        self.assigned_to = None
+        self.logs = []
+        self.replies = []
+
+class LegacyReply:
+    def __init__(self, item_id, ticket, user, content):
+        self.id = item_id
+        self.created_at = datetime.datetime.now()
+        self.ticket = ticket
+        self.user = user
+        self.content = content
+
+class LegacyLogEntry:
+    def __init__(self, item_id, ticket, user, action, details=""):
+        self.id = item_id
+        self.created_at = datetime.datetime.now()
+        self.ticket = ticket
+        self.user = user
+        self.action = action
+        self.details = details
+
+
+def _measure(build):
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    return result, tracemalloc.get_traced_memory()[0] - before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اندازه‌گیری حافظه مدل‌ها")
+    parser.add_argument("--tickets", type=int, default=1_000_000)
+    parser.add_argument("--replies", type=int, default=2, help="تعداد پاسخ برای هر تیکت")
+    parser.add_argument("--logs", type=int, default=3, help="تعداد رکورد تاریخچه برای هر تیکت")
+    parser.add_argument("--legacy", action="store_true", help="ساخت داده با کلاس‌های قدیمی بدون __slots__")
+    args = parser.parse_args()
+
+    user = User("bench", "bench", "agent")
+    category = Category("bench")
+    title, content = "عنوان تیکت", "متن تیکت"
+    tracemalloc.start()
+
+    if args.legacy:
+        new_ticket = lambda i: LegacyTicket(i, title, content, user, category)
+        new_reply = lambda i, t: LegacyReply(i, t, user, content)
+        new_log = lambda i, t, action: t.logs.append(LegacyLogEntry(i, t, user, action))
+    else:
+        new_ticket = lambda i: Ticket(title, content, user, category)
+        new_reply = lambda i, t: Reply(t, user, content)
+        # همه رکوردها در یک بخش می‌مانند و نگهداری محدود (prune) اجرا نمی‌شود
+        audit.clear()
+        audit.SETTINGS.update(segment_seconds=10**9, retention_days=0)
+        now = time.time()
+        new_log = lambda i, t, action: audit.append(i, now, t.id, user.id, action)
+
+    def build_tickets():
+        return [new_ticket(i) for i in range(args.tickets)]
+
+    def build_replies():
+        count = 0
+        for ticket in tickets:
+            for _ in range(args.replies):
+                count += 1
+                ticket.replies.append(new_reply(count, ticket))
+        return count
+
+    def build_logs():
+        count = 0
+        for ticket in tickets:
+            for j in range(args.logs):
+                count += 1
+                # مثل خواندن از ژورنال، هر رکورد نسخه جدیدی از رشته عملیات می‌گیرد
+                action = ACTIONS[j % len(ACTIONS)].encode().decode()
+                new_log(count, ticket, action)
+        return count
+
+    tickets, ticket_bytes, ticket_seconds = _measure(build_tickets)
+    replies, reply_bytes, reply_seconds = _measure(build_replies)
+    logs, log_bytes, log_seconds = _measure(build_logs)
+    tracemalloc.stop()
+
+    print(f"models: {'legacy (__dict__)' if args.legacy else 'slotted'}")
+    for name, count, size, seconds in (("ticket", len(tickets), ticket_bytes, ticket_seconds),
+                                       ("reply", replies, reply_bytes, reply_seconds),
+                                       ("log entry", logs, log_bytes, log_seconds)):
+        if count:
+            print(f"{name:>10}: {count:>9} objects  {size / count:7.1f} bytes each  "
+                  f"{size / 2**20:8.1f} MiB  {seconds:6.2f}s")
+    total = ticket_bytes + reply_bytes + log_bytes
+    print(f"{'total':>10}: {total / 2**20:.1f} MiB ({total / max(len(tickets), 1):.0f} bytes per ticket with its thread)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# ticketing/benchmarks/stress_threads.py
+#
+# تست فشار چندنخی روی سرویس‌های درون‌حافظه‌ای:
+# چند نخ هم‌زمان تیکت و پاسخ ثبت می‌کنند و چند نخ دیگر فهرست‌ها و داشبورد را می‌خوانند؛
+# در پایان تکراری نبودن شناسه‌ها، گم نشدن به‌روزرسانی‌ها و سازگاری ایندکس‌ها بررسی می‌شود.
+#
+#   python benchmarks/stress_threads.py --threads 16 --tickets 200 --replies 5
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TICKETING_DATA_DIR", "")
+
+from app import audit, services  # noqa: E402
+from app.repository import INDEX  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="تست فشار چندنخی سرویس‌های درون‌حافظه‌ای")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--tickets", type=int, default=200, help="تعداد تیکت برای هر نخ نویسنده")
+    parser.add_argument("--replies", type=int, default=5, help="تعداد پاسخ برای هر تیکت")
+    args = parser.parse_args()
+
+    # تعویض مکرر نخ‌ها احتمال بروز شرایط رقابتی را بالا می‌برد
+    sys.setswitchinterval(1e-6)
+    customer = services.get_user_by_username("customer1")
+    agent = services.get_user_by_username("agent1")
+    category = services.get_all_categories()[0]
+    initial_tickets = len(services.DB["tickets"])
+    initial_replies = len(services.DB["replies"])
+
+    start = threading.Barrier(args.threads + args.readers)
+    done = threading.Event()
+    errors = []
+    created = [[] for _ in range(args.threads)]
+
+    def writer(slot):
+        start.wait()
+        try:
+            for i in range(args.tickets):
+                ticket = services.create_new_ticket(f"stress {slot}-{i}", "body", customer, category, route=False)
+                created[slot].append(ticket)
+                for j in range(args.replies):
+                    services.add_reply_to_ticket(ticket, random.choice([customer, agent]), f"reply {j}")
+        except Exception as exc:
+            errors.append(exc)
+
+    def reader():
+        admin = services.get_user_by_username("admin")
+        start.wait()
+        try:
+            while not done.is_set():
+                services.query_tickets(admin, sort=random.choice(services.TICKET_SORTS), limit=20)
+                services.get_dashboard_stats()
+        except Exception as exc:
+            errors.append(exc)
+
+    writers = [threading.Thread(target=writer, args=(slot,)) for slot in range(args.threads)]
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    expected_tickets = args.threads * args.tickets
+    expected_replies = expected_tickets * args.replies
+    problems = [f"exception: {exc!r}" for exc in errors]
+    for kind in ("tickets", "replies", "logs"):
+        if kind == "logs":
+            ids = [log_id for segment in audit.SEGMENTS for log_id in segment.ids]
+        else:
+            ids = [item.id for item in services.DB[kind]]
+        if len(ids) != len(set(ids)):
+            problems.append(f"duplicate {kind} ids: {len(ids) - len(set(ids))}")
+    if len(services.DB["tickets"]) - initial_tickets != expected_tickets:
+        problems.append(f"lost tickets: {len(services.DB['tickets']) - initial_tickets} != {expected_tickets}")
+    if len(services.DB["replies"]) - initial_replies != expected_replies:
+        problems.append(f"lost replies: {len(services.DB['replies']) - initial_replies} != {expected_replies}")
+    for ticket in (t for slot in created for t in slot):
+        logs = services.get_logs_page(ticket, limit=args.replies + 2)[0]
+        if len(ticket.replies) != args.replies or len(logs) != args.replies + 1:
+            problems.append(f"ticket {ticket.id}: {len(ticket.replies)} replies, {len(logs)} logs")
+            break
+    if len(INDEX["tickets_by_id"]) != len(services.DB["tickets"]):
+        problems.append("tickets_by_id index out of sync")
+    mismatches = services.check_dashboard_stats()
+    if mismatches:
+        problems.append(f"dashboard counters out of sync: {mismatches}")
+
+    operations = expected_tickets * (1 + args.replies)
+    print(f"{operations} writes from {args.threads} threads in {elapsed:.2f}s ({operations / elapsed:.0f} ops/s)")
+    for problem in problems:
+        print("FAIL:", problem)
+    if problems:
+        sys.exit(1)
+    print("OK: no duplicate ids or lost updates")
+
+
+if __name__ == "__main__":
+    main()
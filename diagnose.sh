@@ -16,4 +16,7 @@ echo -e "\n=== Python Path ==="
 which python3
 
 echo -e "\n=== Virtual Environment ==="
-ls -la venv/bin/python
\ No newline at end of file
+ls -la venv/bin/python
+echo -e "\n=== Metrics (request counts and store sizes) ==="
+METRICS_TOKEN=$(sudo systemctl show ticketing -p Environment | grep -o 'TICKETING_METRICS_TOKEN=[^ ]*' | cut -d= -f2)
+curl -s -H "Authorization: Bearer $METRICS_TOKEN" http://127.0.0.1:8006/metrics | grep -E '^ticketing_(http_requests_total|slow_requests_total|store_items)'
@@ -0,0 +1,47 @@
+# ticketing/gunicorn.conf.py
+#
+# اجرای تولیدی: gunicorn -c gunicorn.conf.py
+# تنظیمات از متغیرهای محیطی TICKETING_* خوانده می‌شوند.
+
+import multiprocessing
+import os
+import sys
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("TICKETING_BIND", "0.0.0.0:8006")
+
+# برنامه پیش از fork بارگذاری می‌شود (ر.ک. wsgi.py)
+preload_app = True
+worker_class = "gthread"
+# هر اتصال /events یک نخ را تا پایانش نگه می‌دارد؛ نخ‌های اضافه برای سقف این اتصال‌ها کنار گذاشته می‌شوند
+threads = int(os.environ.get("TICKETING_THREADS", 8 + int(os.environ.get("TICKETING_EVENT_STREAMS_MAX", 32))))
+
+# backend درون‌حافظه‌ای در هر پروسه نسخه جداگانه‌ای از داده‌ها و ژورنال دارد، پس با آن فقط
+# یک کارگر (با چند نخ) ممکن است. برای چند کارگر، backend مشترک sqlite لازم است.
+_backend = os.environ.get("TICKETING_STORAGE_BACKEND", "memory")
+_default_workers = multiprocessing.cpu_count() * 2 + 1 if _backend == "sqlite" else 1
+workers = int(os.environ.get("TICKETING_WORKERS", _default_workers))
+if _backend != "sqlite" and workers > 1:
+    print(
+        f"TICKETING_WORKERS={workers} needs TICKETING_STORAGE_BACKEND=sqlite to share state; "
+        "running a single worker with threads instead",
+        file=sys.stderr,
+    )
+    workers = 1
+
+accesslog = os.environ.get("TICKETING_ACCESS_LOG", "-")
+timeout = int(os.environ.get("TICKETING_TIMEOUT", 30))
+graceful_timeout = 30
+
+
+def pre_fork(server, worker):
+    from app import persistence
+    persistence.before_fork()
+
+
+def post_fork(server, worker):
+    # کارگری که پس از خرابی کارگر قبلی دوباره fork شده، تغییرات ثبت‌شده در ژورنال را بارگذاری می‌کند
+    # استخر بررسی رمز پیش از نخ fsync ژورنال ساخته می‌شود تا fork آن از پروسه تک‌نخی باشد
+    from app import passwords, persistence, services
+    passwords.start_pool()
+    persistence.after_fork(services.rebuild_derived_state)
@@ -23,7 +23,10 @@ After=network.target
 User=$USER
 WorkingDirectory=$(pwd)
 Environment=PATH=$(pwd)/venv/bin
-ExecStart=$(pwd)/venv/bin/python run.py
+Environment=TICKETING_DATA_DIR=$(pwd)/instance/data
+Environment=TICKETING_SECRET_KEY=$(python3 -c 'import secrets; print(secrets.token_hex(32))')
+Environment=TICKETING_METRICS_TOKEN=$(python3 -c 'import secrets; print(secrets.token_hex(16))')
+ExecStart=$(pwd)/venv/bin/gunicorn -c gunicorn.conf.py
 Restart=always
 
 [Install]
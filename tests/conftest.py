@@ -0,0 +1,55 @@
+# ticketing/tests/conftest.py
+
+import itertools
+import os
+import tempfile
+
+import pytest
+
+# برنامه هنگام import پیکربندی و داده‌ها را بارگذاری می‌کند، پس محیط آزمون باید پیش از آن تنظیم شود:
+# backend حافظه با ژورنال در یک پوشه موقت، هش رمز سریع و بدون استخر پروسه، و بدون بایگانی خودکار
+DATA_ROOT = tempfile.mkdtemp(prefix="ticketing-tests-")
+os.environ.update(
+    TICKETING_STORAGE_BACKEND="memory",
+    TICKETING_DATA_DIR=os.path.join(DATA_ROOT, "data"),
+    TICKETING_AUDIT_ARCHIVE_DIR=os.path.join(DATA_ROOT, "audit"),
+    TICKETING_JOURNAL_FSYNC_INTERVAL="0",
+    TICKETING_ARCHIVE_AFTER_DAYS="0",
+    TICKETING_ROUTING_AUTO_ASSIGN="0",
+    TICKETING_PASSWORD_HASH_METHOD="pbkdf2:sha256:1000",
+    TICKETING_PASSWORD_HASH_WORKERS="0",
+)
+
+from app import app, services, sqlite_store  # noqa: E402
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def sqlite_backend():
+    app.config['SQLITE_PATH'] = os.path.join(DATA_ROOT, "ticketing.db")
+    sqlite_store.init_app(app)
+    return sqlite_store
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request):
+    # هر دو پیاده‌سازی یک قرارداد دارند؛ در حالت حافظه خود services همان backend است
+    if request.param == "sqlite":
+        return request.getfixturevalue("sqlite_backend")
+    return services
+
+@pytest.fixture
+def unique():
+    # نام یکتا برای کاربر و دسته‌بندی تا آزمون‌ها روی داده‌های یکدیگر اثر نگذارند
+    return lambda prefix: f"test-{prefix}{next(_names)}"
+
+@pytest.fixture
+def make_user(backend, unique):
+    def make(role, password="secret"):
+        return backend.create_new_user(unique(role), password, role)
+    return make
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    return app.test_client()
@@ -0,0 +1,78 @@
+# ticketing/tests/test_api.py
+
+import pytest
+
+from app import api, app, services
+
+
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def customer(unique):
+    return services.create_new_user(unique("api"), "secret", "customer")
+
+@pytest.fixture
+def token(customer):
+    return api.issue_token(customer)
+
+def test_token_endpoint(client, customer):
+    response = client.post('/api/v1/token', json={"username": customer.username, "password": "wrong"})
+    assert response.status_code == 401
+    response = client.post('/api/v1/token', json={"username": customer.username, "password": "secret"})
+    assert response.status_code == 200
+    assert client.get('/api/v1/tickets', headers=_auth(response.get_json()["token"])).status_code == 200
+
+@pytest.mark.parametrize("header", [None, "", "Bearer", "Bearer ", "Basic abc", "Bearer not-a-token"])
+def test_malformed_tokens_rejected(client, header):
+    headers = {"Authorization": header} if header is not None else {}
+    response = client.get('/api/v1/tickets', headers=headers)
+    assert response.status_code == 401
+    assert "error" in response.get_json()
+
+def test_tampered_token_rejected(client, token):
+    tampered = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+    assert client.get('/api/v1/tickets', headers=_auth(tampered)).status_code == 401
+
+def test_token_from_other_key_rejected(client, customer, monkeypatch):
+    monkeypatch.setitem(app.config, 'SECRET_KEY', 'another-deployment')
+    foreign = api.issue_token(customer)
+    monkeypatch.undo()
+    assert client.get('/api/v1/tickets', headers=_auth(foreign)).status_code == 401
+
+def test_expired_token_rejected(client, token, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_TOKEN_MAX_AGE_DAYS', -1)
+    assert client.get('/api/v1/tickets', headers=_auth(token)).status_code == 401
+
+def test_password_change_revokes_token(client, customer, token):
+    assert client.get('/api/v1/tickets', headers=_auth(token)).status_code == 200
+    services.update_user(customer.id, customer.username, customer.role, "changed")
+    assert client.get('/api/v1/tickets', headers=_auth(token)).status_code == 401
+
+def test_deleted_user_token_rejected(client, customer, token):
+    services.delete_user(customer.id)
+    assert client.get('/api/v1/tickets', headers=_auth(token)).status_code == 401
+
+def test_staff_only_endpoints(client, token):
+    assert client.get('/api/v1/stats', headers=_auth(token)).status_code == 403
+    admin_token = api.issue_token(services.get_user_by_username("admin"))
+    assert client.get('/api/v1/stats', headers=_auth(admin_token)).status_code == 200
+
+def test_ticket_pages_follow_cursor(client, customer, token):
+    created = [services.create_new_ticket(f"api {i}", "متن", customer, None, route=False).id for i in range(7)]
+    seen, cursor = [], None
+    while True:
+        url = '/api/v1/tickets?limit=3&fields=id' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(url, headers=_auth(token)).get_json()
+        seen.extend(item["id"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == sorted(created, reverse=True)
+
+def test_other_customers_ticket_hidden(client, customer, token, unique):
+    other = services.create_new_user(unique("api-other"), "secret", "customer")
+    ticket = services.create_new_ticket("خصوصی", "متن", other, None, route=False)
+    assert client.get(f'/api/v1/tickets/{ticket.id}', headers=_auth(token)).status_code == 404
+    body = client.get(f'/api/v1/tickets?ids={ticket.id}', headers=_auth(token)).get_json()
+    assert body == {"items": [], "missing": [ticket.id]}
@@ -0,0 +1,103 @@
+# ticketing/tests/test_bulk.py
+
+import time
+
+import pytest
+
+from app.models import TicketStatus
+
+
+@pytest.fixture
+def setup(backend, make_user):
+    customer, other, admin, agent = make_user("customer"), make_user("customer"), make_user("admin"), make_user("agent")
+    tickets = [backend.create_new_ticket(f"t{i}", "متن", customer, None, route=False) for i in range(4)]
+    foreign = backend.create_new_ticket("دیگری", "متن", other, None, route=False)
+    return customer, admin, agent, tickets, foreign
+
+def _missing_id(backend, tickets):
+    missing = max(t.id for t in tickets) + 10**6
+    assert backend.get_ticket_by_id(missing) is None
+    return missing
+
+def test_result_codes(backend, setup):
+    customer, admin, agent, tickets, foreign = setup
+    backend.close_ticket(tickets[0], customer)
+    missing = _missing_id(backend, tickets)
+    ids = [tickets[0].id, tickets[1].id, tickets[1].id, missing, foreign.id]
+    assert backend.bulk_update_tickets(ids, 'close', customer) == {
+        tickets[0].id: "unchanged",
+        tickets[1].id: "updated",
+        missing: "not_found",
+        foreign.id: "forbidden",
+    }
+    current = backend.get_tickets_by_ids([tickets[1].id, foreign.id])
+    assert current[tickets[1].id].status == TicketStatus.CLOSED
+    assert current[foreign.id].status != TicketStatus.CLOSED
+
+def test_assign_and_category(backend, setup, unique):
+    _, admin, agent, tickets, foreign = setup
+    category = backend.create_new_category(unique("دسته"))
+    ids = [t.id for t in tickets[:2]]
+    assert backend.bulk_update_tickets(ids, 'assign', admin, agent=agent) == dict.fromkeys(ids, "updated")
+    assert backend.bulk_update_tickets(ids, 'assign', admin, agent=agent) == dict.fromkeys(ids, "unchanged")
+    assert backend.bulk_update_tickets(ids + [foreign.id], 'category', admin, category=category) == {
+        **dict.fromkeys(ids, "updated"), foreign.id: "updated"}
+    for ticket in backend.get_tickets_by_ids(ids).values():
+        assert ticket.assigned_to.id == agent.id and ticket.category.id == category.id
+    assert {t.id for t in backend.get_tickets_for_user(agent)} >= set(ids)
+
+def test_delete_hides_tickets(backend, setup):
+    customer, admin, _, tickets, _ = setup
+    ids = [t.id for t in tickets]
+    assert backend.bulk_update_tickets(ids, 'delete', admin) == dict.fromkeys(ids, "updated")
+    assert backend.bulk_update_tickets(ids, 'delete', admin) == dict.fromkeys(ids, "unchanged")
+    page, _ = backend.query_tickets(admin, creator_id=customer.id)
+    assert page == []
+
+@pytest.mark.parametrize("action, options, error", [
+    ('reopen', {}, ValueError),
+    ('delete', {}, PermissionError),
+    ('assign', {}, PermissionError),
+])
+def test_customer_rejected(backend, setup, action, options, error):
+    customer, _, _, tickets, _ = setup
+    with pytest.raises(error):
+        backend.bulk_update_tickets([tickets[0].id], action, customer, **options)
+    assert backend.get_ticket_by_id(tickets[0].id).status == TicketStatus.OPEN
+
+def test_invalid_options_change_nothing(backend, setup):
+    customer, admin, _, tickets, _ = setup
+    with pytest.raises(ValueError):
+        backend.bulk_update_tickets([tickets[0].id], 'assign', admin, agent=customer)
+    with pytest.raises(ValueError):
+        backend.bulk_update_tickets([tickets[0].id], 'category', admin)
+    ticket = backend.get_ticket_by_id(tickets[0].id)
+    assert ticket.assigned_to is None and ticket.category is None
+
+@pytest.fixture
+def archived(make_user, monkeypatch):
+    # لایه سرد فقط در backend حافظه است؛ بایگانی با cutoff آینده بدون انتظار ARCHIVE_AFTER_DAYS انجام می‌شود
+    from app import coldstore, services
+    monkeypatch.setitem(coldstore.SETTINGS, "after_days", 1)
+    customer, admin = make_user("customer"), make_user("admin")
+    tickets = [services.create_new_ticket(f"سرد {i}", "متن", customer, None, route=False) for i in range(3)]
+    for ticket in tickets:
+        services.close_ticket(ticket, admin)
+    assert services._archive_batch([t.id for t in tickets], time.time() + 1) == len(tickets)
+    return customer, admin, tickets
+
+@pytest.mark.parametrize("backend", ["memory"], indirect=True)
+def test_archived_ticket_bulk_then_sort_by_updated(backend, archived, unique):
+    customer, admin, tickets = archived
+    ids = [t.id for t in tickets]
+    assert backend.bulk_update_tickets(ids[:2], 'close', customer) == dict.fromkeys(ids[:2], "unchanged")
+    assert all(backend.is_archived(t) for t in tickets)
+    assert backend.bulk_update_tickets(ids[1:], 'delete', admin) == {ids[1]: "updated", ids[2]: "updated"}
+    assert backend.bulk_update_tickets([ids[0]], 'category', admin,
+                                       category=backend.create_new_category(unique("سرد"))) == {ids[0]: "updated"}
+    page, _ = backend.query_tickets(customer, sort='updated')
+    assert [t.id for t in page] == [ids[0]]
+    page, _ = backend.query_tickets(admin, creator_id=customer.id, sort='updated')
+    assert [t.id for t in page] == [ids[0]]
+    page, _ = backend.query_tickets(admin, creator_id=customer.id, status=TicketStatus.CLOSED, sort='updated')
+    assert [t.id for t in page] == [ids[0]]
@@ -0,0 +1,109 @@
+# ticketing/tests/test_persistence.py
+
+import copy
+import os
+import shutil
+
+import pytest
+
+from app import analytics, audit, persistence, services
+from app.models import TicketStatus
+
+
+def _summary(db):
+    # فقط داده‌هایی که باید پس از راه‌اندازی دوباره یکسان باشند، بدون هویت اشیا
+    ref = lambda obj: obj.id if obj is not None else None
+    return {
+        "users": sorted((u.id, u.username, u.role, u.password_hash) for u in db["users"]),
+        "categories": sorted((c.id, c.name) for c in db["categories"]),
+        "tickets": sorted((t.id, t.title, t.content, t.status.name, ref(t.created_by), ref(t.assigned_to),
+                           ref(t.category), t.created_ts, [r.id for r in t.replies]) for t in db["tickets"]),
+        "replies": sorted((r.id, r.ticket.id, r.user.id, r.content, r.created_ts) for r in db["replies"]),
+    }
+
+def _live_state(ticket_ids):
+    return (_summary(services.DB), copy.deepcopy(analytics.state()),
+            {tid: audit.query(ticket_id=tid)[0] for tid in ticket_ids})
+
+def _reload(directory, ticket_ids):
+    # مثل راه‌اندازی دوباره: بارگذاری اسنپ‌شات و ژورنال‌ها در یک DB تازه
+    db = {key: [] for key in services.DB}
+    persistence.load(directory, db)
+    return (_summary(db), copy.deepcopy(analytics.state()),
+            {tid: audit.query(ticket_id=tid)[0] for tid in ticket_ids})
+
+def _copy_data(tmp_path):
+    # ژورنال آزمون‌ها پس از هر رکورد fsync می‌شود (TICKETING_JOURNAL_FSYNC_INTERVAL=0)
+    return shutil.copytree(persistence._journal.directory, tmp_path / "data")
+
+def _wait_for_snapshot():
+    journal = persistence._journal
+    if journal.snapshot_pid is not None:
+        os.waitpid(journal.snapshot_pid, 0)
+        journal.snapshot_pid = None
+
+@pytest.fixture
+def activity(unique):
+    # همه انواع رکورد ژورنال: کاربر، دسته‌بندی، تیکت، پاسخ، لاگ و خلاصه‌های آمار تحلیلی
+    admin = services.get_user_by_username("admin")
+    customer = services.create_new_user(unique("persist"), "secret", "customer")
+    agent = services.create_new_user(unique("persist-agent"), "secret", "agent")
+    category = services.create_new_category(unique("دسته"))
+    first = services.create_new_ticket("چاپگر", "کاغذ گیر کرده", customer, category, route=False)
+    second = services.create_new_ticket("شبکه", "قطع است", customer, None, route=False)
+    services.assign_ticket_to_agent(first, agent, admin)
+    services.add_reply_to_ticket(first, agent, "بررسی می‌شود")
+    services.add_reply_to_ticket(first, customer, "ممنون")
+    services.edit_ticket_content(second, "شبکه طبقه دوم", "هنوز قطع است", customer)
+    services.close_ticket(first, agent)
+    services.delete_ticket_by_id(second, admin)
+    return [first.id, second.id]
+
+def test_journal_round_trip(tmp_path, activity):
+    expected = _live_state(activity)
+    assert _reload(_copy_data(tmp_path), activity) == expected
+
+def test_snapshot_round_trip(tmp_path, activity):
+    persistence.snapshot()
+    _wait_for_snapshot()
+    customer = services.get_ticket_by_id(activity[0]).created_by
+    later = services.create_new_ticket("پس از اسنپ‌شات", "متن", customer, None, route=False)
+    services.update_ticket_status(later, services.get_user_by_username("admin"), TicketStatus.IN_PROGRESS)
+    expected = _live_state(activity + [later.id])
+    directory = _copy_data(tmp_path)
+    assert any(name.startswith("snapshot-") for name in os.listdir(directory))
+    assert _reload(directory, activity + [later.id]) == expected
+    assert persistence.LOAD_STATS["rollups_missing"] is False
+
+def test_torn_journal_tail_is_ignored(tmp_path, activity):
+    expected = _live_state(activity)
+    directory = _copy_data(tmp_path)
+    last = max(persistence._segments(directory, "journal"))
+    with open(persistence._path(directory, "journal", last), "a", encoding="utf-8") as journal_file:
+        journal_file.write('["T",999999,"نیمه')
+    assert _reload(directory, activity) == expected
+
+@pytest.mark.parametrize("position", range(1, 6))
+def test_snapshot_inside_operation(tmp_path, unique, monkeypatch, position):
+    # اسنپ‌شات (بدون fork، همان‌جا) روی رکورد position-ام ثبت پاسخ، یعنی وسط عملیاتی که چند رکورد می‌نویسد
+    _wait_for_snapshot()
+    monkeypatch.delattr(os, "fork")
+    customer = services.create_new_user(unique("persist"), "secret", "customer")
+    agent = services.create_new_user(unique("persist-agent"), "secret", "agent")
+    ticket = services.create_new_ticket("اسنپ‌شات", "متن", customer, None, route=False)
+    monkeypatch.setitem(persistence.SNAPSHOT_SETTINGS, "every", persistence._journal.records + position)
+    services.add_reply_to_ticket(ticket, agent, "پاسخ")
+    monkeypatch.undo()
+    expected = _live_state([ticket.id])
+    assert _reload(_copy_data(tmp_path), [ticket.id]) == expected
+
+def test_rebuilt_rollups_survive_skipped_snapshot(tmp_path, activity, monkeypatch):
+    # اسنپ‌شات پس از بازسازی ممکن است انجام نشود (اسنپ‌شات قبلی هنوز در حال نوشتن است)؛ ژورنال باید کافی باشد
+    _wait_for_snapshot()
+    monkeypatch.setattr(persistence, "snapshot", lambda: None)
+    persistence.record_rollups(analytics.apply([("2000-01-01", "created", 0, 5, 0.0)]))
+    services.rebuild_analytics()
+    assert "2000-01-01" not in analytics.state()
+    expected = _live_state(activity)
+    assert _reload(_copy_data(tmp_path), activity) == expected
+    assert persistence.LOAD_STATS["rollups_missing"] is False
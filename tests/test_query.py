@@ -0,0 +1,62 @@
+# ticketing/tests/test_query.py
+
+import pytest
+
+from app.models import TicketStatus
+from app.services import TICKET_SORTS
+
+
+def _pages(backend, user, limit, cursor=None, **filters):
+    # همه صفحه‌ها را با دنبال کردن next_cursor می‌خواند
+    seen = []
+    while True:
+        page, cursor = backend.query_tickets(user, cursor=cursor, limit=limit, **filters)
+        assert len(page) <= limit
+        seen.extend(ticket.id for ticket in page)
+        if cursor is None:
+            return seen
+
+@pytest.fixture
+def tickets(backend, make_user):
+    customer, admin, agent = make_user("customer"), make_user("admin"), make_user("agent")
+    created = [backend.create_new_ticket(f"t{i}", "متن", customer, None, route=False) for i in range(23)]
+    for ticket in created[::3]:
+        backend.assign_ticket_to_agent(ticket, agent, admin)
+    for ticket in created[1::4]:
+        backend.update_ticket_status(ticket, admin, TicketStatus.IN_PROGRESS)
+    backend.delete_ticket_by_id(created[5], admin)
+    return customer, admin, agent, created
+
+@pytest.mark.parametrize("sort", TICKET_SORTS)
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("limit", [1, 4, 23, 50])
+def test_cursor_visits_every_ticket_once(backend, tickets, sort, descending, limit):
+    customer, admin, _, created = tickets
+    expected = {t.id for t in created} - {created[5].id}
+    seen = _pages(backend, admin, limit, creator_id=customer.id, sort=sort, descending=descending)
+    assert len(seen) == len(set(seen))
+    assert set(seen) == expected
+    full, _ = backend.query_tickets(admin, creator_id=customer.id, sort=sort, descending=descending, limit=100)
+    assert seen == [t.id for t in full]
+
+@pytest.mark.parametrize("sort", TICKET_SORTS)
+def test_cursor_respects_filters_and_roles(backend, tickets, sort):
+    customer, admin, agent, created = tickets
+    assigned = {t.id for t in created[::3]} - {created[5].id}
+    current = backend.get_tickets_by_ids([t.id for t in created]).values()
+    in_progress = {t.id for t in current if t.status == TicketStatus.IN_PROGRESS}
+    assert in_progress
+    assert set(_pages(backend, agent, 2, sort=sort)) == assigned
+    assert set(_pages(backend, admin, 2, creator_id=customer.id, assignee_id=agent.id, sort=sort)) == assigned
+    assert set(_pages(backend, customer, 3, status=TicketStatus.IN_PROGRESS, sort=sort)) == in_progress
+    assert _pages(backend, admin, 3, creator_id=customer.id, status=TicketStatus.DELETED, sort=sort) == []
+
+def test_updated_cursor_survives_concurrent_update(backend, tickets):
+    # تیکتی که بین دو صفحه تغییر می‌کند به ابتدای ترتیب می‌رود؛ بقیه نباید جا بیفتند یا تکرار شوند
+    customer, admin, _, created = tickets
+    first, cursor = backend.query_tickets(admin, creator_id=customer.id, sort='updated', limit=5)
+    backend.update_ticket_status(created[-1], admin, TicketStatus.CLOSED)
+    rest = _pages(backend, admin, 5, creator_id=customer.id, sort='updated', cursor=cursor)
+    seen = [t.id for t in first] + rest
+    assert len(seen) == len(set(seen))
+    assert set(seen) >= {t.id for t in created} - {created[5].id, created[-1].id}
@@ -0,0 +1,23 @@
+# ticketing/wsgi.py
+#
+# نقطه ورود تولیدی برای gunicorn (ر.ک. gunicorn.conf.py).
+# با preload_app این ماژول یک بار در پروسه master بارگذاری می‌شود: داده‌ها بارگذاری یا ساخته می‌شوند،
+# همه قالب‌ها از پیش کامپایل می‌شوند و سپس کارگرها fork می‌شوند و این حافظه را copy-on-write به اشتراک می‌گذارند.
+
+import gc
+
+from app import app
+
+
+def precompile_templates(flask_app):
+    # قالب‌های کامپایل‌شده در کش محیط Jinja می‌مانند و کارگرها دوباره کامپایلشان نمی‌کنند
+    env = flask_app.jinja_env
+    for name in env.list_templates():
+        env.get_template(name)
+
+
+precompile_templates(app)
+
+# اشیای بارگذاری‌شده تا اینجا از دید GC منجمد می‌شوند تا شمارش‌های GC در کارگرها
+# صفحه‌های حافظه مشترک را کثیف نکنند و کپی نشوند
+gc.freeze()